@@ -131,6 +131,25 @@ REDIS_HOST = 'redis'
 REDIS_PORT = 6379
 REDIS_DB = 0
 
+# Game server configuration
+GAME_PHYSICS_ENGINE = os.getenv('GAME_PHYSICS_ENGINE', 'python')  # 'python' or 'numpy' (vectorized, for busy workers)
+GAME_TICK_RATE = int(os.getenv('GAME_TICK_RATE', 120))  # physics simulation ticks per second
+GAME_SNAPSHOT_RATE = int(os.getenv('GAME_SNAPSHOT_RATE', 30))  # game state broadcasts per second
+GAME_CHECKPOINT_INTERVAL = float(os.getenv('GAME_CHECKPOINT_INTERVAL', 1))  # seconds between two checkpoints of a match
+GAME_RECORDING_ENABLED = os.getenv('GAME_RECORDING_ENABLED', 'true').lower() == 'true'  # match logs, replayable
+GAME_RECORDINGS_DIR = os.getenv('GAME_RECORDINGS_DIR', str(BASE_DIR / 'recordings'))
+GAME_RECORDING_FLUSH_INTERVAL = float(os.getenv('GAME_RECORDING_FLUSH_INTERVAL', 5))  # seconds between two writes of a log
+GAME_SPECTATOR_RATE = int(os.getenv('GAME_SPECTATOR_RATE', 10))  # game state snapshots per second sent to the spectators
+GAME_SPECTATOR_DELAY = float(os.getenv('GAME_SPECTATOR_DELAY', 2))  # seconds spectators are behind the players
+
+# Internal API calls of the game server (match and round creation, results)
+GAME_API_TRANSPORT = os.getenv('GAME_API_TRANSPORT', 'direct')  # 'direct' (ORM, same process) or 'http' (through nginx)
+INTERNAL_API_URL = os.getenv('INTERNAL_API_URL', 'https://nginx')
+INTERNAL_API_TIMEOUT = float(os.getenv('INTERNAL_API_TIMEOUT', 10))  # seconds, whole request
+INTERNAL_API_CONNECT_TIMEOUT = float(os.getenv('INTERNAL_API_CONNECT_TIMEOUT', 3))  # seconds
+INTERNAL_API_RETRIES = int(os.getenv('INTERNAL_API_RETRIES', 3))  # retries of a request which didn't reach the API
+INTERNAL_API_POOL_SIZE = int(os.getenv('INTERNAL_API_POOL_SIZE', 50))  # kept-alive connections per process
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
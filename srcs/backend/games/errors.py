@@ -0,0 +1,11 @@
+class ServiceError(ValueError):
+    """
+    Request rejected by the service layer (games.services). The API answers with status_code and {"detail": detail},
+    and the internal API client raises it again from such a response, so both transports fail the same way.
+    Defined apart from the services, so the game logic can catch it without loading the models.
+    """
+
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
@@ -1,15 +1,14 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth.models import AnonymousUser
 from .matchmaking_queue import MatchmakingQueue
-from .api_calls import create_match_api
-from .channel_handling import remove_player_from_group, send_group_message, disconnect_user, send_error_to_players, add_player_to_group
-from .utils import check_active_match, is_player_online, check_players_online_statuses
-from .match_handler import MatchHandler
+from .channel_handling import (remove_player_from_group, send_group_message, disconnect_user,
+                               join_match_group, leave_match_group)
+from .utils import check_active_match, get_player_rating
 from .recovery_key_manager import RecoveryKeyManager
-from .match_event_queue import MatchEventQueueManager
+from .game_worker import GameWorker, send_match_event
+from .game_state_protocol import get_wire_format, WIRE_FORMAT_BINARY
 import json
 import logging
-import asyncio
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +31,8 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
             await self.accept()
             self.player_id = None
             self.match_group = None
-            self.eventQueue = None
+            self.wire_format = get_wire_format(self.scope)
+            GameWorker.start()
             await self.channel_layer.group_add(f"player_{self.user.id}", self.channel_name)
         except Exception as e:
             logger.error(f"Error during {self.user} connection: {e}")
@@ -51,12 +51,12 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
             logger.error(f"Failed to remove user {self.user} from group: {e}")
 
         if self.player_id:
-            self.queue.remove_player(self.player_id)
+            await self.queue.remove_player(self.player_id)
             if self.match_group:
                 try:
                     await send_group_message(self.match_group, {"event": "disconnection", "message": "User disconnected"})
                     await remove_player_from_group(f"player_{self.user.id}", self.channel_name)
-                    await remove_player_from_group(self.match_group, self.channel_name)
+                    await leave_match_group(self, self.match_group)
                 except Exception as e:
                     logger.error(f"Failed to remove user {self.user} from match group: {e}")
 
@@ -73,12 +73,13 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
         
         elif event == "player_action":
             direction = data.get("direction")
-            if not self.eventQueue:
-                self.eventQueue = MatchEventQueueManager.get_queue(self.match_group)
-            await self.eventQueue.put({
+            if not self.match_group:
+                return
+            await send_match_event(self.match_group, {
                 "event": "player_action",
                 "player_id": self.player_id,
                 "direction": direction,
+                "seq": data.get("seq"),
             })
 
         elif event == "recover_match":
@@ -93,7 +94,7 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
         """
         Handle start search event.
         """
-        if self.queue.is_player_in_queue(str(self.user.id)):
+        if await self.queue.is_player_in_queue(str(self.user.id)):
             await self.send_json_message("error", "Already in matchmaking")
             await self.close()
             return
@@ -108,8 +109,9 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
         
         self.player_id = str(self.user.id)
         await self.send_json_message("player_id", self.player_id)
-        self.queue.add_player(self.player_id)
-        await self.find_match()
+        # Players are paired by the matchmaker process (run_matchmaker), which is woken up by the insert
+        await self.queue.add_player(self.player_id, await get_player_rating(self.player_id))
+        await self.send_json_message("searching")
 
     async def recover_match(self, match_group):
         """
@@ -131,73 +133,13 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
                 "player2_avatar": match_data["player2_avatar"],
                 'opponent_username': match_data["player2_username"] if str(self.player_id) == match_data["player1_id"] else match_data["player1_username"],
             }))
-            await self.channel_layer.group_add(match_group, self.channel_name)
+            await join_match_group(self, match_group)
 
         else:
             logger.warning(f"User {self.user.id} failed to recover match {match_group}")
             await self.send_json_message("error", "Failed to recover match")
             await disconnect_user(self.player_id)
 
-    async def find_match(self):
-        match = self.queue.get_next_match()
-        if match:
-            player1, player2 = match
-            player1_online = await is_player_online(player1)
-            player2_online = await is_player_online(player2)
-
-            if player1_online and player2_online:
-                await self.start_match(player1, player2)
-            else:
-                logger.error("Match canceled. Re-adding online player to the queue.")
-
-                # Re-add online players to the queue
-                if self.player_id == str(player1): 
-                    player1, player2 = player2, player1
-                
-                if player1_online:
-                    self.queue.add_player(player1)
-                else:
-                    logger.info("Player %s is offline. Closing connection.", player1)
-                    await disconnect_user(player1)
-                
-                if player2_online:
-                    self.queue.add_player(player2)
-                else:
-                    logger.info("Player %s is offline. Closing connection.", player2)
-                    await disconnect_user(player2)
-
-                await self.send_json_message("searching")
-        else:
-                await self.send_json_message("searching")
-
-    async def start_match(self, player1, player2):
-        """
-        Initialize the match and start the handler.
-        """
-        try:
-            logger.info("Starting match: %s vs %s", player1, player2)
-            match_data = await create_match_api(player1, player2, match_type="1v1")
-
-            self.match_group = f"match_{match_data['id']}"
-            self.eventQueue = MatchEventQueueManager.get_queue(self.match_group)
-            
-            await add_player_to_group(player1, self.match_group, match_data)
-            await add_player_to_group(player2, self.match_group, match_data)
-
-            await RecoveryKeyManager.create_recovery_key(self.match_group, player1, match_data['player1_username'], 
-                                                         player2, match_data['player2_username'], 
-                                                         match_data['player1_avatar'], match_data['player2_avatar'])
-
-            match_handler = MatchHandler(player1, player2, self.match_group, match_data, self.eventQueue)
-            asyncio.create_task(match_handler.start_match())
-            asyncio.create_task(check_players_online_statuses(player1, player2, self.eventQueue, self.match_group))
-        
-        except Exception as e:
-            await send_error_to_players(player1, player2, "Failed to start the match. Please try again.")
-            logger.error(f"Error during match handling: {e}")
-            await disconnect_user(player1)
-            await disconnect_user(player2)
-
 ##################################################################################################
 #                                   UTILS                                                        #
 ##################################################################################################
@@ -220,7 +162,7 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
         if match_group and match_data:
             if not self.match_group:
                 self.match_group = match_group
-            await self.channel_layer.group_add(match_group, self.channel_name)
+            await join_match_group(self, match_group)
             
             logger.info("User %s added to match channel group %s", self.user, match_group)
             await self.send(json.dumps(
@@ -238,8 +180,11 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
     async def websocket_message(self, event):
         """
         Handle messages sent to the WebSocket from the group.
+        Frames are encoded once by the sender and forwarded as is.
         """
-        message = event.get("message")
-
-        await self.send(text_data=json.dumps(message))
+        binary = event.get("bytes")
+        if binary and self.wire_format == WIRE_FORMAT_BINARY:
+            await self.send(bytes_data=binary)
+        else:
+            await self.send(text_data=event["text"])
 
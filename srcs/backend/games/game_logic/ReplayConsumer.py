@@ -0,0 +1,76 @@
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth.models import AnonymousUser
+from .game_state_protocol import get_wire_format, WIRE_FORMAT_BINARY
+from .match_recorder import read_recording
+from .match_replay import ReplayHandler
+
+logger = logging.getLogger(__name__)
+
+MAX_REPLAY_SPEED = 16
+
+class ReplayConsumer(AsyncWebsocketConsumer):
+    """
+    Streams the replay of a recorded match with the game_state frames of a live match
+    (e.g. /ws/replay/42/?token=...&format=binary&speed=2), then closes the connection.
+    """
+
+    async def connect(self):
+        """
+        Handle authenticated connection.
+        Close the connection if the user is anonymous (token isn't provided or is invalid)
+        """
+        self.user = self.scope.get("user")
+        if not self.user or isinstance(self.user, AnonymousUser):
+            await self.close()
+            return
+
+        self.replay_task = None
+        self.wire_format = get_wire_format(self.scope)
+        query_string = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            speed = float(query_string.get("speed", [1])[0])
+        except ValueError:
+            speed = 1
+        speed = min(max(speed, 0.1), MAX_REPLAY_SPEED)
+
+        await self.accept()
+        match_id = int(self.scope["url_route"]["kwargs"]["match_id"])
+        try:
+            header, records = await asyncio.to_thread(read_recording, match_id)
+            replay = ReplayHandler(header, records, self.send_frame)
+        except FileNotFoundError:
+            await self.send_error(f"Match {match_id} wasn't recorded.")
+            return
+        except ValueError as e:
+            logger.error(f"Error loading the replay of match {match_id}: {e}")
+            await self.send_error("This match can't be replayed.")
+            return
+        self.replay_task = asyncio.create_task(self.play(replay, speed))
+
+    async def disconnect(self, close_code):
+        if getattr(self, "replay_task", None):
+            self.replay_task.cancel()
+
+    async def play(self, replay, speed):
+        try:
+            await replay.play(speed)
+        except Exception as e:
+            logger.error(f"Error during the replay of match {replay.match_data['id']}: {e}")
+        await self.close()
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({"event": "error", "message": message}))
+        await self.close()
+
+    async def send_frame(self, text, binary=None):
+        """
+        Frames are encoded once by the replay, the binary encoding is sent to the clients which negotiated it.
+        """
+        if binary and self.wire_format == WIRE_FORMAT_BINARY:
+            await self.send(bytes_data=binary)
+        else:
+            await self.send(text_data=text)
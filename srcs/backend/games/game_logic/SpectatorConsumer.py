@@ -0,0 +1,58 @@
+import json
+import logging
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth.models import AnonymousUser
+from .game_state_protocol import get_wire_format, WIRE_FORMAT_BINARY
+from .game_worker import GameWorker, send_match_event
+from .spectator_relay import SpectatorRelay
+
+logger = logging.getLogger(__name__)
+
+class SpectatorConsumer(AsyncWebsocketConsumer):
+    """
+    Streams a live match to a spectator (e.g. /ws/spectate/42/?token=...&format=binary),
+    GAME_SPECTATOR_DELAY seconds behind the players, until the match is over.
+    """
+
+    async def connect(self):
+        """
+        Handle authenticated connection.
+        Close the connection if the user is anonymous (token isn't provided or is invalid)
+        """
+        self.user = self.scope.get("user")
+        if not self.user or isinstance(self.user, AnonymousUser):
+            await self.close()
+            return
+
+        self.match_id = int(self.scope["url_route"]["kwargs"]["match_id"])
+        self.watching = False
+        self.wire_format = get_wire_format(self.scope)
+        await self.accept()
+        try:
+            if not await GameWorker.get_owner(f"match_{self.match_id}"):
+                await self.send(text_data=json.dumps({"event": "error", "message": "This match isn't live."}))
+                await self.close()
+                return
+            await SpectatorRelay.add_spectator(self.match_id, self)
+            self.watching = True
+            # A match nobody watched stopped publishing its spectator snapshots
+            await send_match_event(f"match_{self.match_id}", {"event": "spectator_joined"})
+        except Exception as e:
+            logger.error(f"Error adding spectator {self.user} to match {self.match_id}: {e}")
+            await self.close()
+
+    async def disconnect(self, close_code):
+        if getattr(self, "watching", False):
+            try:
+                await SpectatorRelay.remove_spectator(self.match_id, self)
+            except Exception as e:
+                logger.error(f"Error removing spectator {self.user} from match {self.match_id}: {e}")
+
+    async def send_frame(self, text, binary=None):
+        """
+        Frames are encoded once by the match, the binary encoding is sent to the clients which negotiated it.
+        """
+        if binary and self.wire_format == WIRE_FORMAT_BINARY:
+            await self.send(bytes_data=binary)
+        else:
+            await self.send(text_data=text)
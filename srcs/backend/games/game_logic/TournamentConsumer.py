@@ -1,12 +1,13 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth.models import AnonymousUser
 from channels.db import database_sync_to_async
-from .channel_handling import send_group_message
+from .channel_handling import send_group_message, join_match_group, leave_match_group
 from .utils import (check_active_match, is_participant, get_tournament_data, get_tournament_participants)
 from .tournament_handler import TournamentHandler
 from .recovery_key_manager import RecoveryKeyManager
 from games.models import Tournament
-from .match_event_queue import MatchEventQueueManager
+from .game_worker import GameWorker, send_match_event
+from .game_state_protocol import get_wire_format, WIRE_FORMAT_BINARY
 import json, logging, asyncio
 
 logger = logging.getLogger(__name__)
@@ -31,9 +32,11 @@ class TournamentConsumer(AsyncWebsocketConsumer):
             return
         
         await self.accept()
+        GameWorker.start()
 
         logger.info("User connected (id: %s) to tournament %s", str(self.user.id), self.tournament_id)
 
+        self.wire_format = get_wire_format(self.scope)
         self.group_name = f"tournament_{self.tournament_id}"
         self.user_group_name = f"player_{self.user.id}"
         await self.channel_layer.group_add(self.group_name, self.channel_name)
@@ -48,14 +51,7 @@ class TournamentConsumer(AsyncWebsocketConsumer):
                 "is_admin": self.is_admin
             }))
         if self.status == "pending" or self.status == "Pending":
-            # TODO: change to send_group_message
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    "type": "participant_update",
-                    "participants": participants,
-                },
-            )
+            await send_group_message(self.group_name, {"event": "participant_list", "participants": participants})
         else:
             tournamentBracketEvent = await RecoveryKeyManager.get_tournament_bracket_recovery_key(self.tournament_id)
             await self.send(tournamentBracketEvent)
@@ -97,6 +93,8 @@ class TournamentConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
         if hasattr(self, "user_group_name"):
             await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+        if getattr(self, "match_group", None):
+            await leave_match_group(self, self.match_group)
 
     async def receive(self, text_data):
         """
@@ -140,9 +138,7 @@ class TournamentConsumer(AsyncWebsocketConsumer):
         elif event == "ready":
             match_id = data.get("matchId")
             if match_id:
-                match_group = f"match_{match_id}"
-                self.eventQueue = MatchEventQueueManager.get_queue(match_group)
-                await self.eventQueue.put({
+                await send_match_event(f"match_{match_id}", {
                     "event": "player_ready",
                     "playerId": self.user.id,
                     "matchId": match_id,
@@ -152,12 +148,13 @@ class TournamentConsumer(AsyncWebsocketConsumer):
 
         elif event == "player_action":
             direction = data.get("direction")
-            if not self.eventQueue:
-                self.eventQueue = MatchEventQueueManager.get_queue(self.match_group)
-            await self.eventQueue.put({
+            if not getattr(self, "match_group", None):
+                return
+            await send_match_event(self.match_group, {
                 "event": "player_action",
                 "player_id": str(self.user.id),
                 "direction": direction,
+                "seq": data.get("seq"),
             })
           
         else:
@@ -185,7 +182,7 @@ class TournamentConsumer(AsyncWebsocketConsumer):
         
         if match_group and match_data:
             self.match_group = match_group
-            await self.channel_layer.group_add(match_group, self.channel_name)
+            await join_match_group(self, match_group)
             await self.send(json.dumps(
                 {
                 "event": "match_start",
@@ -215,12 +212,10 @@ class TournamentConsumer(AsyncWebsocketConsumer):
     async def websocket_message(self, event):
         """
         Handle messages sent to the WebSocket from the group.
+        Frames are encoded once by the sender and forwarded as is.
         """
-        message = event.get("message")
-        await self.send(text_data=json.dumps(message))
-
-    async def participant_update(self, event):
-        """
-        Handle participant updates and send to all users.
-        """
-        await self.send(text_data=json.dumps({"event": "participant_list", "participants": event["participants"]}))
\ No newline at end of file
+        binary = event.get("bytes")
+        if binary and self.wire_format == WIRE_FORMAT_BINARY:
+            await self.send(bytes_data=binary)
+        else:
+            await self.send(text_data=event["text"])
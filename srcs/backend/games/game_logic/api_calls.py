@@ -1,10 +1,166 @@
+import asyncio
+import random
+import time
 import aiohttp
 from aiohttp import TCPConnector
+from channels.db import database_sync_to_async
 from django.conf import settings
+from games.errors import ServiceError
+from .tick_metrics import TickHistogram
 import logging
 
 logger = logging.getLogger(__name__)
 
+API_LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+RETRY_BACKOFF = 0.1  # seconds before the first retry, doubled on each retry
+RETRY_STATUSES = (502, 503, 504)  # nginx couldn't reach the API: the request wasn't processed
+METRICS_LOG_INTERVAL = 100  # calls between two logs of the metrics of an endpoint
+
+class EndpointMetrics:
+    """
+    Latency histogram and failure counters of an internal API endpoint.
+    """
+
+    def __init__(self):
+        self.latencies = TickHistogram(API_LATENCY_BUCKETS_MS)
+        self.retries = 0
+        self.errors = 0
+
+    def snapshot(self):
+        return {
+            "latencies": self.latencies.snapshot(),
+            "retries": self.retries,
+            "errors": self.errors,
+        }
+
+class InternalAPIClient:
+    """
+    Process-wide client of the game server for the internal API.
+    With the "direct" transport (GAME_API_TRANSPORT), the game server shares the Django project of the API
+    and calls the service layer (games.services) through the ORM, without any HTTP request.
+    With the "http" transport, a single session keeps its connections alive, so match starts and results
+    don't pay a TCP and TLS handshake each.
+    Requests which didn't reach the API (connection failures, 502/503/504) are retried with exponential backoff;
+    errors once connected (disconnections, timeouts) aren't, since the API may have processed the request.
+    """
+
+    _session = None
+    _loop = None
+    _metrics = {}  # endpoint -> EndpointMetrics
+
+    @classmethod
+    def get_session(cls):
+        """
+        Returns the shared session, created on first use (and again if the event loop changed, e.g. in a command).
+        """
+        loop = asyncio.get_running_loop()
+        if cls._session is None or cls._session.closed or cls._loop is not loop:
+            # SSL verification disabled because of self-signed certificate
+            connector = TCPConnector(ssl=False, limit=settings.INTERNAL_API_POOL_SIZE, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(total=settings.INTERNAL_API_TIMEOUT,
+                                            connect=settings.INTERNAL_API_CONNECT_TIMEOUT)
+            cls._session = aiohttp.ClientSession(
+                base_url=settings.INTERNAL_API_URL,
+                connector=connector,
+                timeout=timeout,
+                headers={"X-WebSocket-Token": settings.WEBSOCKET_API_TOKEN},
+            )
+            cls._loop = loop
+        return cls._session
+
+    @classmethod
+    async def close(cls):
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+
+    @classmethod
+    def get_metrics(cls):
+        return {endpoint: metrics.snapshot() for endpoint, metrics in cls._metrics.items()}
+
+    @classmethod
+    async def call(cls, endpoint, payload, expected_status, description, service, *args, parse=None):
+        """
+        Calls an endpoint of the internal API with the configured transport.
+        Both transports return the same data (the body of the response) and raise the same errors:
+        ServiceError when the request is rejected.
+        :param service: name of the function of games.services behind the endpoint, called with args.
+        :param parse: applied to the result of the call, whatever the transport.
+        """
+        if settings.GAME_API_TRANSPORT == "direct":
+            result = await cls.call_service(endpoint, service, *args)
+        else:
+            result = await cls.post(endpoint, payload, expected_status, description)
+        return parse(result) if parse else result
+
+    @classmethod
+    async def call_service(cls, endpoint, service, *args):
+        # Imported on first call: the game logic can run without the models loaded (e.g. simulate_matches)
+        from games import services
+        metrics = cls._metrics.setdefault(endpoint, EndpointMetrics())
+        started = time.perf_counter()
+        try:
+            return await database_sync_to_async(getattr(services, service))(*args)
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.latencies.observe((time.perf_counter() - started) * 1000)
+            if metrics.latencies.count % METRICS_LOG_INTERVAL == 0:
+                logger.info(f"Internal API metrics of {endpoint}: {metrics.snapshot()}")
+
+    @classmethod
+    async def post(cls, endpoint, payload, expected_status, description):
+        """
+        Posts a JSON payload to an endpoint of the internal API.
+        :param expected_status: status of a successful response.
+        :param description: what the call does, for the error messages (e.g. "creating match").
+        :return: JSON body of the response.
+        """
+        metrics = cls._metrics.setdefault(endpoint, EndpointMetrics())
+        started = time.perf_counter()
+        try:
+            for attempt in range(settings.INTERNAL_API_RETRIES + 1):
+                last_attempt = attempt == settings.INTERNAL_API_RETRIES
+                try:
+                    async with cls.get_session().post(endpoint, json=payload) as response:
+                        if response.status in RETRY_STATUSES and not last_attempt:
+                            raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                              status=response.status)
+                        return await cls.handle_response(response, expected_status, description)
+                except (aiohttp.ClientConnectorError, aiohttp.ClientResponseError) as e:
+                    # Only failures to connect and gateway errors: the request may have been processed
+                    # if the connection broke later, or if the body of a response couldn't be read
+                    if last_attempt or (isinstance(e, aiohttp.ClientResponseError) and e.status not in RETRY_STATUSES):
+                        raise
+                    metrics.retries += 1
+                    delay = RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+                    reason = f"status {e.status}" if isinstance(e, aiohttp.ClientResponseError) else repr(e)
+                    logger.warning(f"Internal API call {endpoint} failed ({reason}), retrying in {delay:.2f}s.")
+                    await asyncio.sleep(delay)
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.latencies.observe((time.perf_counter() - started) * 1000)
+            if metrics.latencies.count % METRICS_LOG_INTERVAL == 0:
+                logger.info(f"Internal API metrics of {endpoint}: {metrics.snapshot()}")
+
+    @staticmethod
+    async def handle_response(response, expected_status, description):
+        if response.status == expected_status:
+            return await response.json()
+        elif response.status in (400, 404):
+            # Rejected by the service layer, raised like with the direct transport
+            error_data = await response.json()
+            raise ServiceError(error_data.get("detail", error_data), status_code=response.status)
+        elif response.status == 403:
+            raise PermissionError(f"Unauthorized access to the API while {description}.")
+        elif response.status == 500:
+            raise Exception(f"Server error occurred while {description}.")
+        else:
+            raise Exception(f"Unexpected error: {response.status}, {await response.text()}")
+
 async def create_match_api(player1, player2, match_type):
     """
     Creates a match entry using MatchStartAPIView with WebSocket authentication token.
@@ -14,135 +170,62 @@ async def create_match_api(player1, player2, match_type):
     :param match_type: Type of the match ("1v1" or "tournament")
     :return: Match data as returned by the serializer
     """
-    url = "https://nginx/api/games/match/start/"
-    headers = {
-        "X-WebSocket-Token": settings.WEBSOCKET_API_TOKEN,
-        "Content-Type": "application/json",
-    }
     payload = {
         "first_player_id": player1,
         "second_player_id": player2,
         "match_type": match_type,
     }
-
-    # Create session with SSL verification disabled because of self-signed certificate
-    connector = TCPConnector(ssl=False)
-    async with aiohttp.ClientSession(connector=connector) as session:
-        async with session.post(url, json=payload, headers=headers) as response:
-            if response.status == 201:
-                match_data = await response.json()
-                return match_data
-            elif response.status == 400:
-                error_data = await response.json()
-                raise ValueError(f"Invalid request: {error_data}")
-            elif response.status == 403:
-                raise PermissionError("Unauthorized access to match creation API.")
-            elif response.status == 500:
-                raise Exception("Server error occurred while creating match.")
-            else:
-                raise Exception(f"Unexpected error: {response.status}, {await response.text()}")
+    return await InternalAPIClient.call("/api/games/match/start/", payload, 201, "creating match",
+                                        "create_match", player1, player2, match_type)
 
 async def finish_match_api(match_data):
     """
     Finish a match using MatchFinishAPIView.
-    
+
     match_data: match_id, score_player1, score_player2, winner_id,
         player1_total_hits, player2_total_hits, player1_serves,
         player2_serves, player1_successful_serves, player2_successful_serves,
         player1_longest_rally, player2_longest_rally, player1_overtime_points,
         player2_overtime_points
     """
-    
-    url = "https://nginx/api/games/match/finish/"
-
-    headers = {
-        "X-WebSocket-Token": settings.WEBSOCKET_API_TOKEN,
-        "Content-Type": "application/json",
-    }
+    return await InternalAPIClient.call("/api/games/match/finish/", match_data, 200, "finishing match",
+                                        "finish_match", match_data)
 
-    # Create session with SSL verification disabled because of self-signed certificate
-    connector = TCPConnector(ssl=False)
-    async with aiohttp.ClientSession(connector=connector) as session:
-        async with session.post(url, json=match_data, headers=headers) as response:
-            if response.status == 200:
-                return await response.json()
-            elif response.status == 400:
-                error_data = await response.json()
-                raise ValueError(f"Invalid request: {error_data}")
-            elif response.status == 403:
-                raise PermissionError("Unauthorized access to match creation API.")
-            elif response.status == 500:
-                raise Exception("Server error occurred while creating match.")
-            else:
-                raise Exception(f"Unexpected error: {response.status}, {await response.text()}")
-       
-async def create_round_api(match_id, tournament_id, round_number):
+async def create_round_matches_api(tournament_id, round_number, pairs):
     """
-    Create a round entry via API.
+    Create all the matches of a tournament round via API, in one request.
 
-    :param match_id: ID of the created match
-    :param tournament_id: ID of the tournament
-    :param round_number: Current round number
-    :return Data of the created round
+    :param pairs: list of (first player ID, second player ID)
+    :return: one result per pair, in order: {"match": match data} or {"error": reason}
     """
-    
-    url = "https://nginx/api/games/tournament/round/create-match/"
-    headers = {
-        "X-WebSocket-Token": settings.WEBSOCKET_API_TOKEN,
-        "Content-Type": "application/json",
-    }
     payload = {
-        "match_id": match_id,
         "tournament_id": tournament_id,
         "round_number": round_number,
+        "pairs": [list(pair) for pair in pairs],
     }
-
-    # Create session with SSL verification disabled because of self-signed certificate
-    connector = TCPConnector(ssl=False)
-    async with aiohttp.ClientSession(connector=connector) as session:
-        async with session.post(url, json=payload, headers=headers) as response:
-            if response.status == 201:
-                round_data = await response.json()
-                return round_data
-            elif response.status == 400:
-                error_data = await response.json()
-                raise ValueError(f"Invalid request: {error_data}")
-            elif response.status == 403:
-                raise PermissionError("Unauthorized access to round creation API.")
-            elif response.status == 500:
-                raise Exception("Server error occurred while creating round.")
-            else:
-                raise Exception(f"Unexpected error: {response.status}, {await response.text()}")
+    return await InternalAPIClient.call("/api/games/tournament/round/create-matches/", payload, 201,
+                                        "creating round matches", "create_round_matches",
+                                        tournament_id, round_number, pairs, parse=lambda result: result["results"])
 
 async def update_tournament_status_api(tournament_id, tournament_status, winner_id=None):
     """
     Update the status of the tournament round via API.
     """
-    
-    url = "https://nginx/api/games/tournament/update-status/"
-    headers = {
-        "X-WebSocket-Token": settings.WEBSOCKET_API_TOKEN,
-        "Content-Type": "application/json",
-    }
     payload = {
         "tournament_id": tournament_id,
         "status": tournament_status,
         "winner_id": winner_id,
     }
+    return await InternalAPIClient.call("/api/games/tournament/update-status/", payload, 200,
+                                        "updating tournament status", "update_tournament_status",
+                                        tournament_id, tournament_status, winner_id)
 
-    # Create session with SSL verification disabled because of self-signed certificate
-    connector = TCPConnector(ssl=False)
-    async with aiohttp.ClientSession(connector=connector) as session:
-        async with session.post(url, json=payload, headers=headers) as response:
-            if response.status == 200:
-                data = await response.json()
-                return data
-            elif response.status == 400:
-                error_data = await response.json()
-                raise ValueError(f"Invalid request: {error_data}")
-            elif response.status == 403:
-                raise PermissionError("Unauthorized access to round creation API.")
-            elif response.status == 500:
-                raise Exception("Server error occurred while creating round.")
-            else:
-                raise Exception(f"Unexpected error: {response.status}, {await response.text()}")       
+async def abandon_tournament_api(tournament_id):
+    """
+    Close a tournament whose game worker died, with its unfinished matches, via API.
+
+    :return: IDs of the matches which were abandoned
+    """
+    return await InternalAPIClient.call("/api/games/tournament/abandon/", {"tournament_id": tournament_id}, 200,
+                                        "abandoning tournament", "abandon_tournament", tournament_id,
+                                        parse=lambda result: result["abandoned_matches"])
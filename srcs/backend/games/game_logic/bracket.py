@@ -0,0 +1,113 @@
+class BracketMatch:
+    """
+    Node of the bracket: a match of a round, fed by two matches of the previous round.
+    players: participants (dicts from get_tournament_participants) playing the match, None while unknown
+    or for a bye. winner: participant advancing to the next round once the match is resolved,
+    None if nobody advances (e.g. the match couldn't be created).
+    entry: data of the match sent to the clients (match card of the bracket page).
+    """
+    __slots__ = ("round_number", "position", "bracket_index", "players", "match_id", "entry", "resolved", "winner")
+
+    def __init__(self, round_number, position, bracket_index):
+        self.round_number = round_number
+        self.position = position
+        self.bracket_index = bracket_index
+        self.players = [None, None]
+        self.match_id = None
+        self.entry = None
+        self.resolved = False
+        self.winner = None
+
+class TournamentBracket:
+    """
+    Single elimination bracket, modeled as a tree: match `position` of a round is fed by the matches
+    2 * position and 2 * position + 1 of the previous round, the winner of the first one is its player1.
+    A match can start as soon as both its feeders are resolved, whatever the other matches of their round.
+    Matches are numbered (bracket_index) round after round, like the match cards of the bracket page.
+    """
+
+    def __init__(self, total_participants_including_bye):
+        self.rounds = []
+        self._matches = {}  # match id -> BracketMatch
+        size = total_participants_including_bye // 2
+        bracket_index = 0
+        while size >= 1:
+            round_number = len(self.rounds) + 1
+            self.rounds.append([BracketMatch(round_number, position, bracket_index + position)
+                                for position in range(size)])
+            bracket_index += size
+            size //= 2
+
+    @property
+    def final(self):
+        return self.rounds[-1][0]
+
+    def get(self, match_id):
+        return self._matches.get(match_id)
+
+    def next_match(self, match):
+        """
+        Returns the match fed by a match, None for the final.
+        """
+        if match is self.final:
+            return None
+        return self.rounds[match.round_number][match.position // 2]
+
+    def set_match(self, match, match_data):
+        """
+        Attaches a created match (as returned by create_tournament_matches) to its node.
+        """
+        match.match_id = match_data["id"]
+        if match.match_id is not None:
+            self._matches[match.match_id] = match
+        match.entry = self.make_entry(match, match_data["match_status"])
+
+    def resolve(self, match, winner, score=None):
+        """
+        Records the winner of a match and advances it to the next match.
+        :param winner: participant, None if nobody advances.
+        :param score: final score of the match (e.g. "11-5").
+        :return: next match if both its players are now known, None otherwise (or for the final).
+        """
+        match.resolved = True
+        match.winner = winner
+        if match.entry:
+            match.entry["status"] = "completed"
+            match.entry["winner"] = winner["id"] if winner else None
+            if score:
+                match.entry["score_player1"], match.entry["score_player2"] = score.split("-")
+        next_match = self.next_match(match)
+        if next_match is None:
+            return None
+        next_match.players[match.position % 2] = winner
+        sibling = self.rounds[match.round_number - 1][match.position ^ 1]
+        if sibling.resolved:
+            return next_match
+        next_match.entry = self.make_entry(next_match, "pending")
+        return None
+
+    def to_list(self):
+        """
+        Returns the bracket sent in the tournament_bracket event: the known matches of every round.
+        """
+        return [{"round": index + 1, "matches": [match.entry for match in matches if match.entry]}
+                for index, matches in enumerate(self.rounds)]
+
+    @staticmethod
+    def make_entry(match, status):
+        entry = {
+            "match_id": match.match_id,
+            "bracket_index": match.bracket_index,
+            "status": status,
+            "winner": match.winner["id"] if match.winner else None,
+            "score_player1": "0",
+            "score_player2": "0",
+        }
+        # Players of a pending match are "TBD" until known, the missing player of a created match is a bye
+        missing = "TBD" if status == "pending" else "BYE"
+        for number, player in enumerate(match.players, start=1):
+            entry[f"player{number}_id"] = player["id"] if player else None
+            entry[f"player{number}_username"] = player["username"] if player else missing
+            entry[f"player{number}_alias"] = player["alias"] if player else missing
+            entry[f"player{number}_avatar"] = player["avatar"] if player else None
+        return entry
@@ -1,5 +1,7 @@
 from channels.layers import get_channel_layer
+import json
 import logging
+from .local_delivery import LocalGroupDelivery
 
 logger = logging.getLogger(__name__)
 
@@ -44,15 +46,54 @@ async def remove_player_from_group(group_name, channel_name):
     except Exception as e:
         logger.error(f"Error removing player from group {group_name}: {e}")
 
+async def join_match_group(consumer, match_group):
+    """
+    Adds a consumer's WebSocket to a match group, in the channel layer
+    and in the in-process fast path used for the match frames.
+    """
+    await consumer.channel_layer.group_add(match_group, consumer.channel_name)
+    await LocalGroupDelivery.attach(match_group, consumer)
+
+async def leave_match_group(consumer, match_group):
+    """
+    Removes a consumer's WebSocket from a match group.
+    """
+    await remove_player_from_group(match_group, consumer.channel_name)
+    try:
+        await LocalGroupDelivery.detach(match_group, consumer)
+    except Exception as e:
+        logger.error(f"Error detaching player from group {match_group}: {e}")
+
+async def send_match_frame(match_group, text, binary=None):
+    """
+    Send a pre-encoded frame to the members of a match group.
+    Members attached to this process get it directly, the others through the channel layer.
+    """
+    try:
+        await LocalGroupDelivery.send(match_group, text, binary)
+    except Exception as e:
+        logger.error(f"Error sending frame to match group {match_group}: {e}")
+
 async def send_group_message(group_name, message):
     """
     Send a message to all WebSocket connections in a group.
+    The message is JSON-encoded once here, consumers forward the text unchanged.
+    """
+    await send_group_frame(group_name, json.dumps(message))
+
+async def send_group_frame(group_name, text, binary=None):
+    """
+    Send a pre-encoded frame to all WebSocket connections in a group.
+    :param text: JSON text of the frame.
+    :param binary: optional binary encoding of the same frame, forwarded instead of the text
+                   to the sockets which negotiated the binary wire format.
     """
     try:
         channel_layer = get_channel_layer()
         await channel_layer.group_send(group_name, {
             "type": "websocket_message",
-            "message": message
+            "text": text,
+            "bytes": binary,
         })
     except Exception as e:
         logger.error(f"Error sending message to group {group_name}: {e}")
@@ -62,14 +103,8 @@ async def send_error_to_players(player1, player2, error_message):
     Notify players about an error during match creation.
     """
     try:
-        channel_layer = get_channel_layer()
+        text = json.dumps({"event": "error", "message": error_message})
         for player in [player1, player2]:
-            await channel_layer.group_send(
-                f"player_{player}",
-                {
-                    "type": "websocket.message",
-                    "message": {"event": "error", "message": error_message},
-                },
-            )
+            await send_group_frame(f"player_{player}", text)
     except Exception as e:
         logger.error(f"Error sending error message to players: {e}")
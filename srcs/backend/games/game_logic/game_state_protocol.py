@@ -0,0 +1,45 @@
+import struct
+from urllib.parse import parse_qs
+
+WIRE_FORMAT_JSON = "json"
+WIRE_FORMAT_BINARY = "binary"
+
+# Binary game_state frames (little endian), sent as WebSocket binary messages:
+#   header: frame type (uint8), tick (uint32), server timestamp in ms (float64)
+#   ball:   x (float32), z (float32), flags (uint8, bit 0 = kick off)
+#   full frames only: paddle1 (float32), paddle2 (float32), score1 (uint16), score2 (uint16),
+#                     player1 id (uint32), player2 id (uint32),
+#                     last input seq of player1 (uint32), last input seq of player2 (uint32)
+# Ball frames are deltas against the last full frame: paddles and scores didn't change since.
+FRAME_FULL_STATE = 1
+FRAME_BALL_STATE = 2
+FLAG_KICK_OFF = 1
+
+BALL_FRAME = struct.Struct("<BIdffB")
+FULL_FRAME = struct.Struct("<BIdffBffHHIIII")
+
+def get_wire_format(scope):
+    """
+    Returns the game state format negotiated by the client at connect time
+    with the "format" query parameter (e.g. /ws/matchmaking/?token=...&format=binary).
+    JSON is the fallback for clients that don't ask for anything.
+    """
+    query_string = parse_qs(scope.get("query_string", b"").decode())
+    wire_format = query_string.get("format", [WIRE_FORMAT_JSON])[0]
+    return WIRE_FORMAT_BINARY if wire_format == WIRE_FORMAT_BINARY else WIRE_FORMAT_JSON
+
+def encode_game_state(message):
+    """
+    Packs a game_state message (as built by MatchHandler.broadcast_state) in a binary frame.
+    """
+    ball = message["ball"]
+    flags = FLAG_KICK_OFF if ball.get("kick_off") else 0
+    if "player1" in message:
+        player1, player2 = message["player1"], message["player2"]
+        return FULL_FRAME.pack(FRAME_FULL_STATE, message["tick"], message["timestamp"],
+                               ball["position"][0], ball["position"][1], flags,
+                               player1["position"], player2["position"], player1["score"], player2["score"],
+                               int(player1["id"]), int(player2["id"]),
+                               player1["last_input_seq"], player2["last_input_seq"])
+    return BALL_FRAME.pack(FRAME_BALL_STATE, message["tick"], message["timestamp"],
+                           ball["position"][0], ball["position"][1], flags)
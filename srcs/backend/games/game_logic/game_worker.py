@@ -0,0 +1,458 @@
+import asyncio
+import json
+import logging
+import time
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .api_calls import create_match_api, abandon_tournament_api
+from .channel_handling import add_player_to_group, send_error_to_players, disconnect_user, send_group_message
+from .match_event_queue import MatchEventQueueManager
+from .match_handler import MatchHandler
+from .recovery_key_manager import RecoveryKeyManager
+from .utils import check_players_online_statuses
+
+logger = logging.getLogger(__name__)
+
+WORKER_LOAD_KEY = "game_workers:load"  # sorted set: worker channel -> number of live matches
+WORKER_HEARTBEAT_TTL = 10  # seconds without heartbeat before a worker is considered dead
+WORKER_HEARTBEAT_INTERVAL = 3
+MATCH_LEASE_TTL = 2 * WORKER_HEARTBEAT_INTERVAL  # match leases are renewed with the heartbeat of their worker
+OWNER_CACHE_TTL = 1  # seconds an owner lookup is reused when routing events
+RESUMABLE_MATCHES_KEY = "game_workers:matches"  # set of the live matches which can be resumed by another worker
+LIVE_TOURNAMENTS_KEY = "game_workers:tournaments"  # set of the live tournaments, closed by another worker if theirs dies
+CHECKPOINT_TTL = 3600  # same as the recovery keys
+
+# Renews the leases of the matches hosted by a worker, returns the matches whose lease was lost.
+# KEYS: match owner keys. ARGV: worker channel, lease TTL (ms).
+RENEW_LEASES_SCRIPT = """
+local lost = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[1] then
+        redis.call('pexpire', key, ARGV[2])
+    else
+        table.insert(lost, key)
+    end
+end
+return lost
+"""
+
+# Releases a lease, unless another worker took it over.
+# KEYS: match owner key. ARGV: worker channel.
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+def worker_heartbeat_key(channel_name):
+    return f"game_worker:{channel_name}:alive"
+
+def match_owner_key(match_group):
+    return f"match:{match_group}:owner"
+
+def match_checkpoint_key(match_group):
+    return f"match:{match_group}:checkpoint"
+
+def tournament_owner_key(tournament_id):
+    return f"tournament:{tournament_id}:owner"
+
+class GameWorker:
+    """
+    Hosts the matches of this process.
+    Every process serving the game WebSockets is a game worker with its own channel on the channel layer:
+    the matchmaker sends it the matches to start ("match.start") and consumers living in other processes
+    forward it the events of its matches ("match.event").
+    The worker hosting a match holds a lease on it in Redis (match:<group>:owner), renewed with its heartbeat,
+    which is how events are routed to it from any process.
+    Workers publish their load (live matches) in Redis, the matchmaker picks the least loaded one.
+    The 1v1 matches are checkpointed every GAME_CHECKPOINT_INTERVAL: when a worker dies, its leases expire
+    and the first worker noticing it resumes its matches from their last checkpoint.
+    Tournaments hold a lease too (tournament:<id>:owner), but their bracket lives in the worker: when it dies,
+    the first worker noticing it closes the tournament and its unfinished matches, which can't go on.
+    """
+
+    channel_name = None
+    _task = None
+    _ready = None
+    _matches = set()  # match groups hosted by this process
+    _handlers = {}  # match group -> MatchHandler of the resumable matches hosted by this process
+    _tournaments = set()  # IDs of the tournaments run by this process
+    _owners = {}  # match group -> (owner channel, lookup time), owners of the matches hosted elsewhere
+    _scripts = {}
+
+    @classmethod
+    def start(cls):
+        """
+        Starts listening on the worker channel, if not done yet.
+        """
+        if cls._task is None or cls._task.done():
+            cls._ready = asyncio.Event()
+            cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def get_channel_name(cls):
+        """
+        Returns the channel of this worker, once it listens on it.
+        """
+        cls.start()
+        await cls._ready.wait()
+        return cls.channel_name
+
+    @classmethod
+    async def _run(cls):
+        channel_layer = get_channel_layer()
+        cls.channel_name = await channel_layer.new_channel("game_worker.")
+        cls._ready.set()
+        heartbeat = asyncio.create_task(cls._heartbeat())
+        checkpoints = asyncio.create_task(cls._checkpoint())
+        logger.info(f"Game worker listening on {cls.channel_name}")
+        try:
+            while True:
+                message = await channel_layer.receive(cls.channel_name)
+                try:
+                    await cls.handle_message(message)
+                except Exception as e:
+                    logger.error(f"Error handling game worker message {message}: {e}")
+        finally:
+            heartbeat.cancel()
+            checkpoints.cancel()
+
+    @classmethod
+    async def _heartbeat(cls):
+        """
+        Keeps the worker registered, its match leases alive and its load up to date,
+        even if the matchmaker's estimate drifted.
+        """
+        while True:
+            try:
+                await cls.renew_leases()
+                await cls.publish_load()
+                await cls.resume_orphaned_matches()
+                await cls.abandon_orphaned_tournaments()
+            except Exception as e:
+                logger.error(f"Error publishing game worker heartbeat: {e}")
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+    @classmethod
+    async def _checkpoint(cls):
+        """
+        Saves the state of every resumable match hosted by this worker, with a single round trip.
+        """
+        while True:
+            await asyncio.sleep(settings.GAME_CHECKPOINT_INTERVAL)
+            try:
+                running = [handler for handler in cls._handlers.values() if handler.running]
+                if not running:
+                    continue
+                redis = await RecoveryKeyManager.get_redis()
+                pipe = redis.pipeline(transaction=False)
+                for handler in running:
+                    pipe.set(match_checkpoint_key(handler.group_name), json.dumps(handler.checkpoint()),
+                             ex=CHECKPOINT_TTL)
+                await pipe.execute()
+            except Exception as e:
+                logger.error(f"Error checkpointing matches: {e}")
+
+    @classmethod
+    async def resume_orphaned_matches(cls):
+        """
+        Takes over the resumable matches whose lease expired (their worker died).
+        """
+        redis = await RecoveryKeyManager.get_redis()
+        match_groups = [match_group for match_group in await redis.smembers(RESUMABLE_MATCHES_KEY)
+                        if match_group not in cls._matches]
+        if not match_groups:
+            return
+        owners = await redis.mget([match_owner_key(match_group) for match_group in match_groups])
+        for match_group, owner in zip(match_groups, owners):
+            if owner is None and await cls.host_match(match_group, quiet=True):
+                asyncio.create_task(cls.resume_match(match_group))
+
+    @classmethod
+    async def abandon_orphaned_tournaments(cls):
+        """
+        Closes the live tournaments whose lease expired (their worker died).
+        """
+        redis = await RecoveryKeyManager.get_redis()
+        tournament_ids = [tournament_id for tournament_id in await redis.smembers(LIVE_TOURNAMENTS_KEY)
+                          if tournament_id not in cls._tournaments]
+        if not tournament_ids:
+            return
+        owners = await redis.mget([tournament_owner_key(tournament_id) for tournament_id in tournament_ids])
+        for tournament_id, owner in zip(tournament_ids, owners):
+            if owner is None and await cls.host_tournament(tournament_id, quiet=True):
+                asyncio.create_task(cls.abandon_tournament(tournament_id))
+
+    @classmethod
+    async def get_script(cls, name, script):
+        if name not in cls._scripts:
+            redis = await RecoveryKeyManager.get_redis()
+            cls._scripts[name] = redis.register_script(script)
+        return cls._scripts[name]
+
+    @classmethod
+    async def publish_load(cls):
+        if cls.channel_name is None:
+            return
+        redis = await RecoveryKeyManager.get_redis()
+        pipe = redis.pipeline()
+        pipe.set(worker_heartbeat_key(cls.channel_name), len(cls._matches), ex=WORKER_HEARTBEAT_TTL)
+        pipe.zadd(WORKER_LOAD_KEY, {cls.channel_name: len(cls._matches)})
+        await pipe.execute()
+
+    @classmethod
+    async def renew_leases(cls):
+        if cls.channel_name is None or not (cls._matches or cls._tournaments):
+            return
+        renew = await cls.get_script("renew", RENEW_LEASES_SCRIPT)
+        keys = [match_owner_key(match_group) for match_group in cls._matches]
+        keys += [tournament_owner_key(tournament_id) for tournament_id in cls._tournaments]
+        lost = await renew(keys=keys, args=[cls.channel_name, MATCH_LEASE_TTL * 1000])
+        for key in lost:
+            if key.startswith("tournament:"):
+                # Another worker closed the tournament while this one was stalled, its results will be rejected
+                logger.error(f"Game worker {cls.channel_name} lost its lease {key}, the tournament was closed.")
+                continue
+            match_group = key[len("match:"):-len(":owner")]
+            match_handler = cls._handlers.pop(match_group, None)
+            if match_handler is not None:
+                # Another worker resumed the match while this one was stalled
+                logger.error(f"Game worker {cls.channel_name} lost match {match_group} to another worker.")
+                match_handler.abandon()
+            else:
+                logger.error(f"Game worker {cls.channel_name} lost its lease {key}, events of the match can't reach it.")
+
+    @classmethod
+    async def host_match(cls, match_group, quiet=False):
+        """
+        Takes the lease of a match, so its events are routed to this worker.
+        :param quiet: don't log when another worker owns the match (e.g. took over an orphaned match first).
+        :return: True if the lease was taken, False if another worker owns the match.
+        """
+        channel_name = await cls.get_channel_name()
+        redis = await RecoveryKeyManager.get_redis()
+        if not await redis.set(match_owner_key(match_group), channel_name, nx=True, ex=MATCH_LEASE_TTL):
+            if await redis.get(match_owner_key(match_group)) != channel_name:
+                if not quiet:
+                    logger.error(f"Match {match_group} is already hosted by another worker.")
+                return False
+        cls._matches.add(match_group)
+        await cls.publish_load()
+        return True
+
+    @classmethod
+    async def release_match(cls, match_group):
+        cls._matches.discard(match_group)
+        try:
+            if cls._handlers.pop(match_group, None) is not None:
+                redis = await RecoveryKeyManager.get_redis()
+                pipe = redis.pipeline()
+                pipe.srem(RESUMABLE_MATCHES_KEY, match_group)
+                pipe.delete(match_checkpoint_key(match_group))
+                await pipe.execute()
+            release = await cls.get_script("release", RELEASE_LEASE_SCRIPT)
+            await release(keys=[match_owner_key(match_group)], args=[cls.channel_name])
+            await cls.publish_load()
+        except Exception as e:
+            logger.error(f"Error releasing match {match_group}: {e}")
+
+    @classmethod
+    async def host_tournament(cls, tournament_id, quiet=False):
+        """
+        Takes the lease of a tournament: if this worker dies, another one closes the tournament.
+        :param quiet: don't log when another worker owns the tournament (e.g. closed an orphaned tournament first).
+        :return: True if the lease was taken, False if another worker owns the tournament.
+        """
+        tournament_id = str(tournament_id)
+        channel_name = await cls.get_channel_name()
+        redis = await RecoveryKeyManager.get_redis()
+        if not await redis.set(tournament_owner_key(tournament_id), channel_name, nx=True, ex=MATCH_LEASE_TTL):
+            if await redis.get(tournament_owner_key(tournament_id)) != channel_name:
+                if not quiet:
+                    logger.error(f"Tournament {tournament_id} is already run by another worker.")
+                return False
+        cls._tournaments.add(tournament_id)
+        await redis.sadd(LIVE_TOURNAMENTS_KEY, tournament_id)
+        return True
+
+    @classmethod
+    async def release_tournament(cls, tournament_id):
+        tournament_id = str(tournament_id)
+        cls._tournaments.discard(tournament_id)
+        try:
+            redis = await RecoveryKeyManager.get_redis()
+            await redis.srem(LIVE_TOURNAMENTS_KEY, tournament_id)
+            release = await cls.get_script("release", RELEASE_LEASE_SCRIPT)
+            await release(keys=[tournament_owner_key(tournament_id)], args=[cls.channel_name])
+        except Exception as e:
+            logger.error(f"Error releasing tournament {tournament_id}: {e}")
+
+    @classmethod
+    async def abandon_tournament(cls, tournament_id):
+        """
+        Closes an orphaned tournament once its lease is taken: its unfinished matches died with its worker.
+        The players of those matches lose their recovery keys and every participant is told the tournament is over.
+        """
+        try:
+            abandoned_matches = await abandon_tournament_api(tournament_id)
+            logger.warning(f"Orphaned tournament {tournament_id} closed, {len(abandoned_matches)} unfinished "
+                           f"matches abandoned.")
+            for match_id in abandoned_matches:
+                await RecoveryKeyManager.delete_recovery_key(f"match_{match_id}")
+            await RecoveryKeyManager.delete_tournament_bracket_recovery_key(tournament_id)
+            await send_group_message(f"tournament_{tournament_id}", {"event": "tournament_cancelled"})
+        except Exception as e:
+            logger.error(f"Error closing orphaned tournament {tournament_id}: {e}")
+        finally:
+            await cls.release_tournament(tournament_id)
+
+    @classmethod
+    async def get_owner(cls, match_group):
+        """
+        Returns the channel of the worker hosting a match, None if no worker hosts it.
+        Lookups are cached for OWNER_CACHE_TTL, so a stream of inputs costs one Redis read per second at most.
+        """
+        if match_group in cls._matches:
+            return cls.channel_name
+        cached = cls._owners.get(match_group)
+        now = time.monotonic()
+        if cached and now - cached[1] < OWNER_CACHE_TTL:
+            return cached[0]
+        redis = await RecoveryKeyManager.get_redis()
+        owner = await redis.get(match_owner_key(match_group))
+        if owner:
+            cls._owners[match_group] = (owner, now)
+        else:
+            cls._owners.pop(match_group, None)
+        return owner
+
+    @classmethod
+    async def handle_message(cls, message):
+        if message["type"] == "match.start":
+            asyncio.create_task(cls.start_match(message["player1"], message["player2"]))
+        elif message["type"] == "match.event":
+            cls.put_event(message["match_group"], message["event"])
+
+    @classmethod
+    def put_event(cls, match_group, event):
+        """
+        Queues an event for a match hosted by this process.
+        """
+        if match_group not in cls._matches:
+            logger.warning(f"Dropping event for match {match_group} not hosted by this worker: {event}")
+            return
+        MatchEventQueueManager.get_queue(match_group).put_nowait(event)
+
+    @classmethod
+    async def start_match(cls, player1, player2):
+        """
+        Creates the match and runs its handler in this process.
+        The players join the match group through matchchannel_message.
+        """
+        try:
+            logger.info("Starting match: %s vs %s", player1, player2)
+            match_data = await create_match_api(player1, player2, match_type="1v1")
+
+            match_group = f"match_{match_data['id']}"
+            event_queue = MatchEventQueueManager.get_queue(match_group)
+            if not await cls.host_match(match_group):
+                raise Exception(f"Match {match_group} can't be hosted by this worker.")
+
+            await RecoveryKeyManager.create_recovery_key(match_group, player1, match_data['player1_username'],
+                                                         player2, match_data['player2_username'],
+                                                         match_data['player1_avatar'], match_data['player2_avatar'])
+
+            match_handler = MatchHandler(player1, player2, match_group, match_data, event_queue)
+            await cls.make_resumable(match_handler)
+
+            await add_player_to_group(player1, match_group, match_data)
+            await add_player_to_group(player2, match_group, match_data)
+
+            asyncio.create_task(check_players_online_statuses(player1, player2, event_queue, match_group))
+            try:
+                await match_handler.start_match()
+            finally:
+                await cls.release_match(match_group)
+
+        except Exception as e:
+            await send_error_to_players(player1, player2, "Failed to start the match. Please try again.")
+            logger.error(f"Error during match handling: {e}")
+            await disconnect_user(player1)
+            await disconnect_user(player2)
+
+    @classmethod
+    async def make_resumable(cls, match_handler):
+        """
+        Checkpoints the match from now on, so another worker can resume it if this one dies.
+        The first checkpoint is saved at once: a resumable match without a checkpoint lost its state.
+        """
+        cls._handlers[match_handler.group_name] = match_handler
+        redis = await RecoveryKeyManager.get_redis()
+        pipe = redis.pipeline()
+        pipe.set(match_checkpoint_key(match_handler.group_name), json.dumps(match_handler.checkpoint()),
+                 ex=CHECKPOINT_TTL)
+        pipe.sadd(RESUMABLE_MATCHES_KEY, match_handler.group_name)
+        await pipe.execute()
+
+    @classmethod
+    async def resume_match(cls, match_group):
+        """
+        Resumes an orphaned match from its recovery key and last checkpoint, once its lease is taken.
+        The players stay in the match group, only the handler moves to this worker.
+        """
+        try:
+            match_data = await RecoveryKeyManager.get_recovery_key(match_group)
+            redis = await RecoveryKeyManager.get_redis()
+            checkpoint = await redis.get(match_checkpoint_key(match_group))
+            if not match_data:
+                logger.warning(f"Orphaned match {match_group} has no recovery key anymore, it can't be resumed.")
+                await redis.srem(RESUMABLE_MATCHES_KEY, match_group)
+                await cls.release_match(match_group)
+                return
+            if not checkpoint:
+                # Restarting from the kick-off would replay a match the players already played a part of
+                logger.warning(f"Orphaned match {match_group} has no checkpoint anymore, it can't be resumed.")
+                await redis.srem(RESUMABLE_MATCHES_KEY, match_group)
+                await RecoveryKeyManager.delete_recovery_key(match_group)
+                await cls.release_match(match_group)
+                await send_error_to_players(match_data["player1_id"], match_data["player2_id"],
+                                            "Your match was interrupted and can't be resumed.")
+                return
+        except Exception as e:
+            logger.error(f"Error loading orphaned match {match_group}: {e}")
+            await cls.release_match(match_group)
+            return
+
+        player1, player2 = match_data["player1_id"], match_data["player2_id"]
+        match_data = {
+            "id": int(match_group.split("_")[-1]),
+            "player1_username": match_data["player1_username"],
+            "player2_username": match_data["player2_username"],
+            "player1_avatar": match_data["player1_avatar"],
+            "player2_avatar": match_data["player2_avatar"],
+        }
+        event_queue = MatchEventQueueManager.get_queue(match_group)
+        match_handler = MatchHandler(player1, player2, match_group, match_data, event_queue)
+        match_handler.restore(json.loads(checkpoint))
+        logger.info(f"Resuming orphaned match {match_group} at tick {match_handler.tick} on {cls.channel_name}.")
+        await cls.make_resumable(match_handler)
+
+        asyncio.create_task(check_players_online_statuses(player1, player2, event_queue, match_group))
+        try:
+            await match_handler.start_match()
+        finally:
+            await cls.release_match(match_group)
+
+async def send_match_event(match_group, event):
+    """
+    Sends an event to the handler of a match, wherever it runs: directly to its queue if this process
+    hosts the match, otherwise to the channel of the worker holding the lease of the match.
+    """
+    owner = await GameWorker.get_owner(match_group)
+    if owner is None:
+        logger.warning(f"Dropping event for match {match_group} hosted by no worker: {event}")
+    elif owner == GameWorker.channel_name:
+        await MatchEventQueueManager.get_queue(match_group).put(event)
+    else:
+        await get_channel_layer().send(owner, {"type": "match.event", "match_group": match_group, "event": event})
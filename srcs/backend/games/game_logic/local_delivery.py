@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from channels.layers import get_channel_layer
+from .recovery_key_manager import RecoveryKeyManager
+
+logger = logging.getLogger(__name__)
+
+MEMBERS_TTL = 3600  # seconds, same lifetime as the match recovery key
+MEMBERS_REFRESH_INTERVAL = 1  # seconds between two reads of the group members from Redis
+
+class LocalGroupDelivery:
+    """
+    Fast path for match group frames.
+    Consumers attached to a group in this process get the frames handed directly,
+    only the members living in other processes are reached through the channel layer.
+    Group members (channel names) are registered in Redis so every process knows
+    which members are remote.
+    """
+
+    _local = {}    # group -> {channel_name: consumer}
+    _members = {}  # group -> (refresh time, set of channel names) read from Redis
+
+    @staticmethod
+    def members_key(group_name):
+        return f"group:{group_name}:members"
+
+    @classmethod
+    async def attach(cls, group_name, consumer):
+        """
+        Registers a consumer of this process as member of the group.
+        """
+        cls._local.setdefault(group_name, {})[consumer.channel_name] = consumer
+        cls._members.pop(group_name, None)
+        redis = await RecoveryKeyManager.get_redis()
+        key = cls.members_key(group_name)
+        await redis.sadd(key, consumer.channel_name)
+        await redis.expire(key, MEMBERS_TTL)
+
+    @classmethod
+    async def detach(cls, group_name, consumer):
+        """
+        Removes a consumer from the members of the group.
+        """
+        local = cls._local.get(group_name)
+        if local is not None:
+            local.pop(consumer.channel_name, None)
+            if not local:
+                del cls._local[group_name]
+        cls._members.pop(group_name, None)
+        redis = await RecoveryKeyManager.get_redis()
+        await redis.srem(cls.members_key(group_name), consumer.channel_name)
+
+    @classmethod
+    async def clear(cls, group_name):
+        """
+        Forgets every member of the group (e.g. when the match is over).
+        """
+        cls._local.pop(group_name, None)
+        cls._members.pop(group_name, None)
+        redis = await RecoveryKeyManager.get_redis()
+        await redis.delete(cls.members_key(group_name))
+
+    @classmethod
+    def forget(cls, group_name):
+        """
+        Drops the cached members of the group, so they are read again from Redis on next use.
+        """
+        cls._members.pop(group_name, None)
+
+    @classmethod
+    async def has_members(cls, group_name):
+        """
+        Whether the group has any member, e.g. to skip encoding frames nobody would receive.
+        """
+        return bool(cls._local.get(group_name)) or bool(await cls._get_members(group_name))
+
+    @classmethod
+    async def send(cls, group_name, text, binary=None):
+        """
+        Delivers a pre-encoded frame to every member of the group.
+        """
+        message = {"type": "websocket_message", "text": text, "bytes": binary}
+        local = cls._local.get(group_name, {})
+
+        sends = [consumer.websocket_message(message) for consumer in local.values()]
+        remote = [channel for channel in await cls._get_members(group_name) if channel not in local]
+        if remote:
+            channel_layer = get_channel_layer()
+            sends.extend(channel_layer.send(channel, message) for channel in remote)
+
+        for result in await asyncio.gather(*sends, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"Error delivering frame to group {group_name}: {result}")
+
+    @classmethod
+    async def _get_members(cls, group_name):
+        """
+        Members of the group, cached for MEMBERS_REFRESH_INTERVAL seconds.
+        """
+        now = asyncio.get_event_loop().time()
+        cached = cls._members.get(group_name)
+        if cached and now - cached[0] < MEMBERS_REFRESH_INTERVAL:
+            return cached[1]
+
+        redis = await RecoveryKeyManager.get_redis()
+        members = await redis.smembers(cls.members_key(group_name))
+        cls._members[group_name] = (now, members)
+        return members
@@ -1,281 +1,427 @@
 import asyncio
-from .channel_handling import remove_player_from_group, send_group_message
-import random
+import json
+import time
+from django.conf import settings
+from .channel_handling import remove_player_from_group, send_match_frame
+from .local_delivery import LocalGroupDelivery
+from .spectator_relay import SpectatorRelay
 import logging
 from .recovery_key_manager import RecoveryKeyManager
 from .api_calls import finish_match_api
 from .match_event_queue import MatchEventQueueManager
+from .tick_scheduler import MatchTickScheduler, TICK_RATE
+from .physics_engine import get_physics_engine, PADDLE_SPEED_PER_SECOND, LEFT, RIGHT
+from .game_state_protocol import encode_game_state
+from .tick_metrics import TickMetrics
+from .match_recorder import (MatchRecorder, encode_serve, RECORD_INPUT, RECORD_SERVE, RECORD_GOAL, RECORD_HIT,
+                             RECORD_END, END_BY_SCORE)
 
 logger = logging.getLogger(__name__)
 
-FIELD_WIDTH = 10.0  # Horizontal field (x)
-FIELD_HEIGHT = 6.0  # Vertical field (z)
-PADDLE_HEIGHT = 1.0
-PADDLE_WIDTH = 0.2
-PADDLE_SPEED = 0.12
-BALL_RADIUS = FIELD_HEIGHT / 30
-BALL_INITIAL_VELOCITY = 0.03
-VELOCITY_MULTIPLIER = 1.3
 KICK_OFF_DELAY = 2 # kickoff time delay between points
 START_KICK_OFF = 5 # kickoff time delay at the start of the match
 MAX_SCORE = 11
 WINNING_MARGIN = 2
-RATE = 1 / 120  # 120 FPS
 MAX_INACTIVITY_TIME = 20
+TICKS_PER_SNAPSHOT = max(1, round(TICK_RATE / settings.GAME_SNAPSHOT_RATE)) # physics ticks between two broadcasts
+TICKS_PER_SPECTATOR_SNAPSHOT = max(1, round(TICK_RATE / settings.GAME_SPECTATOR_RATE))
+# Kick-off delays counted in ticks, so they follow the simulation clock rather than the wall clock
+KICK_OFF_TICKS = round(KICK_OFF_DELAY * TICK_RATE)
+START_KICK_OFF_TICKS = round(START_KICK_OFF * TICK_RATE)
+INACTIVITY_CHECK_TICKS = TICK_RATE # inactivity is checked about once per second
+PADDLE_STEP = PADDLE_SPEED_PER_SECOND / TICK_RATE # paddle move per tick while a direction is held
+DIRECTIONS = {"up": 1, "down": -1, "none": 0}
+RECORDING_FLUSH_TICKS = max(1, round(settings.GAME_RECORDING_FLUSH_INTERVAL * TICK_RATE))
+
+class Player:
+    """
+    direction: direction held by the player (1 up, -1 down, 0 released), applied on every tick.
+    last_input_seq: sequence number of the last input processed, echoed in the snapshots
+    so the client can reconcile its predicted paddle.
+    """
+    __slots__ = ("id", "last_active", "direction", "last_input_seq")
+
+    def __init__(self, player_id):
+        self.id = player_id
+        self.last_active = asyncio.get_event_loop().time()
+        self.direction = 0
+        self.last_input_seq = 0
 
 class MatchHandler:
-    def __init__(self, player1, player2, group_name, match_data, event_queue):
-        self.player1 = self.init_player(player1)
-        self.player2 = self.init_player(player2)
-        self.ball = self.init_ball()
+    def __init__(self, player1, player2, group_name, match_data, event_queue, engine=None, record=None):
+        """
+        :param engine: physics engine of the match, the engine shared by the process by default.
+            A match on a private engine must be stepped by its owner (see ReplayHandler): start_match refuses it.
+        :param record: whether the match is recorded (see MatchRecorder), GAME_RECORDING_ENABLED by default.
+        """
+        self.player1 = Player(player1)
+        self.player2 = Player(player2)
+        self.engine = engine or get_physics_engine()
+        self.slot = self.engine.add_match()
         self.group_name = group_name
         self.match_data = match_data
         self.running = False
         self.event_queue = event_queue
-        self.event_processing_task = None
-        self.max_event_processing_rate = RATE
         self.kick_off = True
+        self.ball_kick_off_end = None
+        self.tick = 0
+        self.tick_cost = 0.0
+        self.metrics = TickMetrics()
+        self.match_over = None
         self.result = None
-        asyncio.create_task(self.end_kick_off())
+        self.spectated = True  # whether the match may have spectators, checked on the first spectator snapshot
+        if record is None:
+            record = settings.GAME_RECORDING_ENABLED
+        self.recorder = MatchRecorder(int(match_data["id"]), int(player1), int(player2), TICK_RATE) if record else None
+        self.recorded_hits = (0, 0)
     
-    def init_player(self, player_id):
-        return {
-            "id": player_id,
-            "position": 0.0,
-            "score": 0,
-            "total_hits": 0,
-            "serves": 0,
-            "successful_serves": 0,
-            "longest_rally": 0,
-            "last_active": asyncio.get_event_loop().time()
-        }
+    def player_state(self, side):
+        """
+        Returns the full state of a player: identity and activity plus position, score and stats from the engine.
+        """
+        player = self.player1 if side == LEFT else self.player2
+        return {"id": player.id, "last_active": player.last_active, **self.engine.player_state(self.slot, side)}
 
-    def init_ball(self):
+    def checkpoint(self):
+        """
+        Compact state of the match, enough to resume it on another worker (see restore).
+        """
         return {
-            "position": [0.0, 0.0],
-            "velocity": [BALL_INITIAL_VELOCITY, BALL_INITIAL_VELOCITY],
-            "direction": [random.choice([-1, 1]), random.choice([-1, 1])],
-            "timesHit": 0,
-            "kick_off": True
+            "tick": self.tick,
+            "kick_off": self.kick_off,
+            "ball_kick_off_end": self.ball_kick_off_end,
+            "ball": self.engine.ball_state(self.slot),
+            "players": [
+                {**self.engine.player_state(self.slot, side), "last_input_seq": player.last_input_seq}
+                for side, player in ((LEFT, self.player1), (RIGHT, self.player2))
+            ],
         }
 
+    def restore(self, checkpoint):
+        """
+        Resumes the match from a checkpoint, before start_match.
+        A match resumed after its start kick-off starts again with a kick-off of the ball where it was.
+        The beginning of the match was recorded by another worker: a resumed match isn't recorded.
+        """
+        self.recorder = None
+        self.tick = checkpoint["tick"]
+        self.kick_off = checkpoint["kick_off"]
+        self.ball_kick_off_end = checkpoint["ball_kick_off_end"]
+        ball = checkpoint["ball"]
+        if not self.kick_off:
+            ball = {**ball, "kick_off": True}
+            self.ball_kick_off_end = self.tick + KICK_OFF_TICKS
+            self.engine.set_running(self.slot, True)
+        self.engine.restore_match(self.slot, ball, checkpoint["players"])
+        for player, state in zip((self.player1, self.player2), checkpoint["players"]):
+            player.last_input_seq = state["last_input_seq"]
+
     async def start_match(self):
+        """
+        Registers the match on the shared tick scheduler and waits until it is over.
+        """
+        loop = asyncio.get_event_loop()
         self.running = True
-        self.event_processing_task = asyncio.create_task(self.process_events())
-        await asyncio.sleep(START_KICK_OFF)
-        self.kick_off = False
-        await self.game_loop()
+        self.match_over = loop.create_future()
+        if self.recorder:
+            self.recorder.record(self.tick, RECORD_SERVE, value=encode_serve(self.engine.ball_state(self.slot)["direction"]))
+        MatchTickScheduler.register(self)
+        await self.match_over
         return self.result
 
-    async def game_loop(self):
-        while self.running:
-            self.update_ball()
-            self.check_collisions()
-            self.check_goal()
-            if self.check_match_over():
-                await self.end_match()
-                break
+    async def prepare_tick(self):
+        """
+        First phase of a frame, before the physics step of the engine:
+        processes the pending events and ends the kick-offs when their tick is reached.
+        """
+        if not self.running:
+            return
+
+        started = time.perf_counter()
+        try:
+            self.tick += 1
+            await self.process_events()
+            if not self.running:
+                return
+
+            if self.kick_off:
+                if self.tick >= START_KICK_OFF_TICKS:
+                    self.kick_off = False
+                    self.engine.end_kick_off(self.slot)
+                    self.engine.set_running(self.slot, True)
+            elif self.tick == self.ball_kick_off_end:
+                self.engine.end_kick_off(self.slot)
+        finally:
+            self.tick_cost = time.perf_counter() - started
+
+    async def finish_tick(self):
+        """
+        Last phase of a frame, after the physics step of the engine:
+        broadcasts a snapshot every TICKS_PER_SNAPSHOT ticks (every TICKS_PER_SPECTATOR_SNAPSHOT ticks to the
+        spectators) and records the tick duration of the match.
+        Recorded events are only written to disk every RECORDING_FLUSH_TICKS ticks, in the background.
+        """
+        if not self.running or self.kick_off:
+            return
+
+        started = time.perf_counter()
+        if self.recorder:
+            self.record_hits()
+            if self.tick % RECORDING_FLUSH_TICKS == 0:
+                self.recorder.flush()
+        if self.tick % TICKS_PER_SNAPSHOT == 0:
             await self.broadcast_state()
-            await asyncio.sleep(RATE)
+        if self.tick % TICKS_PER_SPECTATOR_SNAPSHOT == 0:
+            await self.publish_spectator_state()
+        self.metrics.durations.observe((self.tick_cost + time.perf_counter() - started) * 1000)
+
+    def on_goal(self, side):
+        """
+        Called by the scheduler when the engine reports a goal for this match.
+        """
+        if self.recorder:
+            self.recorder.record(self.tick, RECORD_GOAL, side)
+        if self.check_match_over():
+            self.finish()
+        else:
+            self.ball_kick_off_end = self.tick + KICK_OFF_TICKS
+            if self.recorder:
+                self.recorder.record(self.tick, RECORD_SERVE,
+                                     value=encode_serve(self.engine.ball_state(self.slot)["direction"]))
+
+    def record_hits(self):
+        hits = self.engine.hits(self.slot)
+        if hits != self.recorded_hits:
+            for side in (LEFT, RIGHT):
+                if hits[side] != self.recorded_hits[side]:
+                    self.recorder.record(self.tick, RECORD_HIT, side, extra=hits[side])
+            self.recorded_hits = hits
 
     async def process_events(self):
         """
-        Listens to the event queue.
-        Wait for new events in the queue and process them at a fixed rate.
+        Drains every pending event of the queue in one batch, then moves the paddles
+        in the direction held by their player. Only the last input of a player matters,
+        so a client spamming inputs can't build a backlog. Players inactivity is checked
+        every INACTIVITY_CHECK_TICKS ticks.
         """
-        last_processed_time = asyncio.get_event_loop().time()
+        while not self.event_queue.empty():
+            event = self.event_queue.get_nowait()
+            await self.handle_event(event)
+            self.event_queue.task_done()
 
-        while self.running:
-            if not self.event_queue.empty():
-                event = await self.event_queue.get()
-                await self.handle_event(event)
-                self.event_queue.task_done()
+        if self.running:
+            if not self.kick_off:
+                self.move_paddles()
 
-            await self.check_inactivity()
-            await self.sleep_until_next_event(last_processed_time)
-            last_processed_time = asyncio.get_event_loop().time()
+            if self.tick % INACTIVITY_CHECK_TICKS == 0:
+                self.check_inactivity()
 
     async def handle_event(self, event):
         try:
             if event["event"] == "player_disconnected":
                 await self.handle_player_disconnected(event)
             elif event["event"] == "player_action":
-                await self.handle_player_action(event["player_id"], event["direction"])
+                await self.handle_player_action(event["player_id"], event["direction"], event.get("seq"))
+            elif event["event"] == "spectator_joined":
+                self.spectated = True
+                SpectatorRelay.spectator_joined(self.match_data["id"])
         except Exception as e:
             logger.error(f"Error processing event {event}: {e}")
 
     async def handle_player_disconnected(self, event):
         logger.info(f"Processing event: {event}")
         disconnected_player_id = event.get("player_id")
-        winner = self.player2["id"] if disconnected_player_id == self.player1["id"] else self.player1["id"]
-        await self.end_match(winner)
-
-    async def handle_player_action(self, player_id, direction):
-        if self.kick_off:
-            return
+        winner = self.player2.id if disconnected_player_id == self.player1.id else self.player1.id
+        self.finish(winner)
 
-        player = self.player1 if player_id == self.player1["id"] else self.player2
-        if direction == "up" and player["position"] + PADDLE_HEIGHT / 2 < FIELD_HEIGHT / 2:
-            player["position"] += PADDLE_SPEED
-        elif direction == "down" and player["position"] - PADDLE_HEIGHT / 2 > -FIELD_HEIGHT / 2:
-            player["position"] -= PADDLE_SPEED
-
-        player["last_active"] = asyncio.get_event_loop().time()
-        await self.broadcast_state()
-    
-    async def check_inactivity(self):
-        current_time = asyncio.get_event_loop().time()
-        if current_time - self.player1["last_active"] > MAX_INACTIVITY_TIME:
-            logger.info(f"Player {self.player1['id']} inactive for {MAX_INACTIVITY_TIME} seconds. Ending match.")
-            await self.end_match(self.player2["id"])
-        elif current_time - self.player2["last_active"] > MAX_INACTIVITY_TIME:
-            logger.info(f"Player {self.player2['id']} inactive for {MAX_INACTIVITY_TIME} seconds. Ending match.")
-            await self.end_match(self.player1["id"])
+    async def handle_player_action(self, player_id, direction, seq=None):
+        """
+        Updates the direction held by a player.
+        :param direction: "up", "down" or "none" (released).
+        :param seq: input sequence number of the client, increasing.
+        """
+        side = LEFT if player_id == self.player1.id else RIGHT
+        player = self.player1 if side == LEFT else self.player2
+        player.direction = DIRECTIONS.get(direction, 0)
+        if isinstance(seq, int) and seq > player.last_input_seq:
+            player.last_input_seq = seq
+        player.last_active = asyncio.get_event_loop().time()
+        if self.recorder:
+            self.recorder.record(self.tick, RECORD_INPUT, side, player.direction, player.last_input_seq)
+
+    def move_paddles(self):
+        for side, player in ((LEFT, self.player1), (RIGHT, self.player2)):
+            if player.direction:
+                self.engine.move_paddle(self.slot, side, "up" if player.direction > 0 else "down", PADDLE_STEP)
     
-    async def sleep_until_next_event(self, last_processed_time):
+    def check_inactivity(self):
         current_time = asyncio.get_event_loop().time()
-        time_since_last_process = current_time - last_processed_time
-        if time_since_last_process < RATE:
-            await asyncio.sleep(RATE - time_since_last_process)
+        # Holding a direction doesn't send any message but is an activity
+        for player in (self.player1, self.player2):
+            if player.direction:
+                player.last_active = current_time
+        if current_time - self.player1.last_active > MAX_INACTIVITY_TIME:
+            logger.info(f"Player {self.player1.id} inactive for {MAX_INACTIVITY_TIME} seconds. Ending match.")
+            self.finish(self.player2.id)
+        elif current_time - self.player2.last_active > MAX_INACTIVITY_TIME:
+            logger.info(f"Player {self.player2.id} inactive for {MAX_INACTIVITY_TIME} seconds. Ending match.")
+            self.finish(self.player1.id)
+
+    def game_state(self):
+        """
+        Returns a full snapshot of the match. Snapshots carry the simulation tick and the
+        server timestamp (ms) so clients can interpolate between them.
+        Only what the clients render is sent: positions, scores and the kick-off flag,
+        plus the last input processed for each player, used by the clients to reconcile their prediction.
+        """
+        player1 = self.engine.player_state(self.slot, LEFT)
+        player2 = self.engine.player_state(self.slot, RIGHT)
+        ball = self.engine.ball_state(self.slot)
+        return {
+            "event": "game_state",
+            "tick": self.tick,
+            "timestamp": int(time.time() * 1000),
+            "ball": {
+                "position": ball["position"],
+                "direction": ball["direction"],
+                "kick_off": ball["kick_off"],
+            },
+            "player1": {"id": self.player1.id, "position": player1["position"], "score": player1["score"],
+                        "last_input_seq": self.player1.last_input_seq},
+            "player2": {"id": self.player2.id, "position": player2["position"], "score": player2["score"],
+                        "last_input_seq": self.player2.last_input_seq},
+        }
 
-    def update_ball(self):
-        if self.ball.get("kick_off", False):
-            return
+    async def broadcast_state(self):
+        """
+        Sends a snapshot of the match to the players.
+        """
+        state = self.game_state()
+        static_state = {"player1": state.pop("player1"), "player2": state.pop("player2")}
 
-        self.ball["position"][0] += self.ball["velocity"][0] * self.ball["direction"][0]
-        self.ball["position"][1] += self.ball["velocity"][1] * self.ball["direction"][1]
+        # Paddles and scores are only sent when they changed since the previous snapshot
+        if static_state != getattr(self, "previous_static_state", None):
+            state.update(static_state)
+            self.previous_static_state = static_state
 
-    def check_collisions(self):
-        if abs(self.ball["position"][1]) + BALL_RADIUS >= FIELD_HEIGHT / 2:
-            self.ball["direction"][1] *= -1
+        # Encoded once for the whole group, in both wire formats
+        await self.send_frame(json.dumps(state), encode_game_state(state))
 
-        if self.check_paddle_collision(self.player1, left=True):
-            self.handle_paddle_hit(left=True)
-        elif self.check_paddle_collision(self.player2, left=False):
-            self.handle_paddle_hit(left=False)
+    async def publish_spectator_state(self):
+        """
+        Sends a snapshot of the match to its spectators, if any.
+        Spectator snapshots are always full, so spectators can join at any time.
+        Once nobody watches, nothing is looked up until a spectator joins.
+        """
+        if not self.spectated:
+            return
 
-    def check_paddle_collision(self, player, left):
-        paddle_x = -FIELD_WIDTH / 2 + PADDLE_WIDTH if left else FIELD_WIDTH / 2 - PADDLE_WIDTH
-        paddle_z_min = player["position"] - PADDLE_HEIGHT / 2
-        paddle_z_max = player["position"] + PADDLE_HEIGHT / 2
-        ball_x = self.ball["position"][0]
-        ball_z = self.ball["position"][1]
+        def encode():
+            state = self.game_state()
+            return json.dumps(state), encode_game_state(state)
 
-        if (left and self.ball["direction"][0] > 0) or (not left and self.ball["direction"][0] < 0):
-            return False
+        try:
+            self.spectated = await SpectatorRelay.publish(self.match_data["id"], encode)
+        except Exception as e:
+            logger.error(f"Error sending snapshot to the spectators of match {self.match_data['id']}: {e}")
 
-        if (abs(ball_x - paddle_x) <= BALL_RADIUS and paddle_z_min <= ball_z <= paddle_z_max):
+    def check_match_over(self):
+        score1 = self.engine.player_state(self.slot, LEFT)["score"]
+        score2 = self.engine.player_state(self.slot, RIGHT)["score"]
+        if score1 >= MAX_SCORE and (score1 - score2) >= WINNING_MARGIN:
+            return True
+        if score2 >= MAX_SCORE and (score2 - score1) >= WINNING_MARGIN:
             return True
-            
         return False
 
-    def handle_paddle_hit(self, left):
-        self.ball["direction"][0] *= -1
-        paddle = self.player1 if left else self.player2
-        distance_from_center = self.ball["position"][1] - paddle["position"]
-
-        # Update ball velocity based on distance from paddle center
-        self.ball["velocity"][1] += distance_from_center * 0.02
-        self.ball["timesHit"] = self.ball.get("timesHit", 0) + 1
-
-        # Increment total hits for the paddle
-        paddle["total_hits"] += 1
-
-        # Count serve attempts and successful serves
-        if self.ball["timesHit"] == 1:  # First hit in rally
-            paddle["serves"] += 1
-            if (left and self.ball["direction"][0] > 0) or (not left and self.ball["direction"][0] < 0):
-                paddle["successful_serves"] += 1
-
-        # Update rally length
-        if self.ball["timesHit"] > paddle["longest_rally"]:
-            paddle["longest_rally"] = self.ball["timesHit"]
-
-        # Increase ball velocity every 3 hits
-        if self.ball["timesHit"] % 3 == 0:
-            self.ball["velocity"][0] *= VELOCITY_MULTIPLIER
-            self.ball["velocity"][1] *= VELOCITY_MULTIPLIER
-
-    def check_goal(self):
-        if abs(self.ball["position"][0]) > FIELD_WIDTH / 2:
-            if self.ball["position"][0] > 0:
-                self.player1["score"] += 1
+    def finish(self, winner=None):
+        """
+        Stops the simulation and ends the match in the background,
+        so the shared tick is never blocked by the API calls of end_match.
+        """
+        if not self.running:
+            return
+        self.running = False
+        self.engine.set_running(self.slot, False)
+        MatchTickScheduler.unregister(self)
+        if self.recorder:
+            self.record_hits()
+            if winner is None:
+                outcome = END_BY_SCORE
             else:
-                self.player2["score"] += 1
-            self.reset_ball()
-
-    def reset_ball(self):
-        self.ball = self.init_ball()
-        asyncio.create_task(self.end_kick_off())
+                outcome = LEFT if winner == self.player1.id else RIGHT
+            self.recorder.record(self.tick, RECORD_END, value=outcome)
+        logger.info(f"Match {self.group_name} tick metrics: {self.metrics.snapshot()}")
+        asyncio.create_task(self.end_match(winner))
 
-    async def end_kick_off(self):
-        await asyncio.sleep(KICK_OFF_DELAY)
-        self.ball["kick_off"] = False
-
-    async def broadcast_state(self):
-        static_state = {
-            "player1": {"position": self.player1["position"], "score": self.player1["score"]},
-            "player2": {"position": self.player2["position"], "score": self.player2["score"]},
-        }
-
-        if static_state != getattr(self, "previous_static_state", None):
-            full_state = {
-                "event": "game_state",
-                "player1": self.player1,
-                "player2": self.player2,
-                "ball": self.ball,
-            }
-            await self.send_group_message(full_state)
-            self.previous_static_state = static_state
-        
-        else:
-            partial_state = {"event": "game_state", "ball": self.ball}
-            await self.send_group_message(partial_state)
-
-    def check_match_over(self):
-        if self.player1["score"] >= MAX_SCORE and (self.player1["score"] - self.player2["score"]) >= WINNING_MARGIN:
-            return True
-        if self.player2["score"] >= MAX_SCORE and (self.player2["score"] - self.player1["score"]) >= WINNING_MARGIN:
-            return True
-        return False
+    def abandon(self):
+        """
+        Stops the simulation without ending the match, once another worker took it over.
+        """
+        if not self.running:
+            return
+        self.running = False
+        MatchTickScheduler.unregister(self)
+        self.engine.remove_match(self.slot)
+        if self.recorder:
+            self.recorder.flush()
+        if self.match_over and not self.match_over.done():
+            self.match_over.set_result(None)
 
     async def end_match(self, winner=None):
         """
         End the match.
         """
+        try:
+            await self._end_match(winner)
+        finally:
+            self.engine.remove_match(self.slot)
+            if self.recorder:
+                await self.recorder.close()
+            if self.match_over and not self.match_over.done():
+                self.match_over.set_result(self.result)
+
+    async def _end_match(self, winner):
+        player1 = self.player_state(LEFT)
+        player2 = self.player_state(RIGHT)
         if not winner:
-            if self.player1["score"] > self.player2["score"]:
-                winner = self.player1["id"]
+            if player1["score"] > player2["score"]:
+                winner = player1["id"]
             else:
-                winner = self.player2["id"]
+                winner = player2["id"]
         
-        await self.send_group_message({
+        match_over = {
             "event": "match_over",
             "winner": winner,
-            "player1_score": self.player1["score"],
-            "player2_score": self.player2["score"],
-        })
+            "player1_score": player1["score"],
+            "player2_score": player2["score"],
+        }
+        await self.send_group_message(match_over)
+        try:
+            if self.spectated:
+                await SpectatorRelay.publish(self.match_data["id"], lambda: (json.dumps(match_over), None))
+            await SpectatorRelay.end(self.match_data["id"])
+        except Exception as e:
+            logger.error(f"Failed to notify the spectators of match {self.match_data['id']}: {e}")
 
         self.result = {
             "winner": int(winner),
-            "score": "{}-{}".format(self.player1["score"], self.player2["score"]),
+            "score": "{}-{}".format(player1["score"], player2["score"]),
         }
 
-        self.running = False
-                
         finish_data = ({
         "match_id": self.match_data["id"],
-        "score_player1": self.player1.get("score", 0),
-        "score_player2": self.player2.get("score", 0),
+        "score_player1": player1.get("score", 0),
+        "score_player2": player2.get("score", 0),
         "winner_id": winner,
-        "player1_total_hits": self.player1.get("total_hits", 0),
-        "player2_total_hits": self.player2.get("total_hits", 0),
-        "player1_serves": self.player1.get("serves", 0),
-        "player2_serves": self.player2.get("serves", 0),
-        "player1_successful_serves": self.player1.get("successful_serves", 0),
-        "player2_successful_serves": self.player2.get("successful_serves", 0),
-        "player1_longest_rally": self.player1.get("longest_rally", 0),
-        "player2_longest_rally": self.player2.get("longest_rally", 0),
+        "player1_total_hits": player1.get("total_hits", 0),
+        "player2_total_hits": player2.get("total_hits", 0),
+        "player1_serves": player1.get("serves", 0),
+        "player2_serves": player2.get("serves", 0),
+        "player1_successful_serves": player1.get("successful_serves", 0),
+        "player2_successful_serves": player2.get("successful_serves", 0),
+        "player1_longest_rally": player1.get("longest_rally", 0),
+        "player2_longest_rally": player2.get("longest_rally", 0),
         })
         
         await finish_match_api(finish_data)
@@ -293,11 +439,15 @@ class MatchHandler:
         # Remove players from the channel
         match_group = f"match_{self.match_data['id']}"
         try:
-            await remove_player_from_group(match_group, f"player_{self.player1['id']}")
-            await remove_player_from_group(match_group, f"player_{self.player2['id']}")
+            await remove_player_from_group(match_group, f"player_{self.player1.id}")
+            await remove_player_from_group(match_group, f"player_{self.player2.id}")
+            await LocalGroupDelivery.clear(match_group)
             logger.info(f"Players removed from match channel {match_group}.")
         except Exception as e:
             logger.error(f"Error removing players from match channel {match_group}: {e}")
 
     async def send_group_message(self, message):
-        await send_group_message(self.group_name, message)
+        await self.send_frame(json.dumps(message))
+
+    async def send_frame(self, text, binary=None):
+        await send_match_frame(self.group_name, text, binary)
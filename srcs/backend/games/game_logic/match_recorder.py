@@ -0,0 +1,112 @@
+import asyncio
+import gzip
+import os
+import struct
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Match logs (little endian), appended as gzip members to GAME_RECORDINGS_DIR/match_{id}.rec.gz:
+#   header: magic (4 bytes), version (uint8), tick rate (uint16), match id (uint32),
+#           player1 id (uint32), player2 id (uint32)
+#   then one record per event: tick (uint32), kind (uint8), side (uint8), value (int8), extra (uint32)
+# Everything the simulation depends on is recorded (inputs and serves), so a match can be replayed
+# through the physics step; goals and paddle hits are recorded to check the replay against the match.
+RECORDING_MAGIC = b"PONG"
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct("<4sBHIII")
+RECORD = struct.Struct("<IBBbI")
+
+RECORD_INPUT = 1  # value: direction held (1 up, -1 down, 0 released), extra: input seq
+RECORD_SERVE = 2  # value: bit 0 set when the ball is served to the right, bit 1 when served upwards
+RECORD_GOAL = 3   # side: scoring side
+RECORD_HIT = 4    # side: side of the paddle, extra: total hits of the side
+RECORD_END = 5    # value: side of the winner, or END_BY_SCORE
+
+END_BY_SCORE = 2
+SERVE_RIGHT = 1
+SERVE_UP = 2
+
+def recording_path(match_id):
+    return os.path.join(settings.GAME_RECORDINGS_DIR, f"match_{match_id}.rec.gz")
+
+def encode_serve(direction):
+    dx, dz = direction
+    return (SERVE_RIGHT if dx > 0 else 0) | (SERVE_UP if dz > 0 else 0)
+
+def decode_serve(value):
+    return [1 if value & SERVE_RIGHT else -1, 1 if value & SERVE_UP else -1]
+
+class MatchRecorder:
+    """
+    Append-only log of a match.
+    Records are packed in a memory buffer on the tick; flush() hands the buffer to a thread
+    which compresses it and appends it to the log file, so the tick never waits for the disk.
+    """
+
+    def __init__(self, match_id, player1, player2, tick_rate):
+        self.path = recording_path(match_id)
+        self.buffer = bytearray(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, tick_rate,
+                                                      match_id, player1, player2))
+        self._writer = None
+        self._created = False
+
+    def record(self, tick, kind, side=0, value=0, extra=0):
+        self.buffer += RECORD.pack(tick, kind, side, value, extra)
+
+    def flush(self):
+        """
+        Writes the buffered records in the background. Writes are chained, so they land in order.
+        """
+        if not self.buffer:
+            return
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        self._writer = asyncio.create_task(self._write(data, self._writer))
+
+    async def close(self):
+        """
+        Flushes the remaining records and waits until everything is on disk.
+        """
+        self.flush()
+        if self._writer:
+            await self._writer
+
+    async def _write(self, data, previous):
+        if previous:
+            await previous
+        try:
+            await asyncio.to_thread(self._append, data)
+        except OSError as e:
+            logger.error(f"Error writing match recording {self.path}: {e}")
+
+    def _append(self, data):
+        if not self._created:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # The first write replaces any previous log of the match, concatenated gzip members are read back
+        # as a single stream
+        with open(self.path, "ab" if self._created else "wb") as file:
+            file.write(gzip.compress(data, compresslevel=6))
+        self._created = True
+
+def read_recording(match_id):
+    """
+    Reads the log of a match.
+    :return: header (dict) and the list of records, as (tick, kind, side, value, extra) tuples.
+    :raises FileNotFoundError: if the match wasn't recorded.
+    :raises ValueError: if the file isn't a match log.
+    """
+    try:
+        with gzip.open(recording_path(match_id), "rb") as file:
+            data = file.read()
+    except (EOFError, gzip.BadGzipFile) as e:
+        raise ValueError(f"Recording of match {match_id} is corrupted: {e}")
+    if len(data) < RECORDING_HEADER.size or (len(data) - RECORDING_HEADER.size) % RECORD.size:
+        raise ValueError(f"Recording of match {match_id} is truncated.")
+    magic, version, tick_rate, recorded_id, player1, player2 = RECORDING_HEADER.unpack_from(data)
+    if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+        raise ValueError(f"Recording of match {match_id} has an unknown format.")
+
+    header = {"match_id": recorded_id, "tick_rate": tick_rate, "player1": player1, "player2": player2}
+    return header, list(RECORD.iter_unpack(memoryview(data)[RECORDING_HEADER.size:]))
@@ -0,0 +1,135 @@
+import asyncio
+from django.conf import settings
+import logging
+from .match_handler import MatchHandler
+from .tick_scheduler import TICK_RATE
+from .physics_engine import create_physics_engine, LEFT, RIGHT
+from .match_recorder import decode_serve, RECORD_INPUT, RECORD_SERVE, RECORD_GOAL, RECORD_HIT, RECORD_END, END_BY_SCORE
+
+logger = logging.getLogger(__name__)
+
+INPUT_DIRECTIONS = {1: "up", -1: "down", 0: "none"}
+YIELD_TICKS = TICK_RATE  # ticks replayed between two yields to the event loop when replaying at full speed
+
+class ReplayHandler(MatchHandler):
+    """
+    Replays a recorded match (see MatchRecorder) through the physics step, on a private engine.
+    The recorded inputs are fed to the match on their tick and the recorded serves replace the random ones,
+    so the replay follows the match exactly; its snapshots are sent with send instead of the match group.
+    """
+
+    def __init__(self, header, records, send, engine_name=None):
+        """
+        :param header, records: recording, as returned by read_recording.
+        :param send: coroutine function called with the text and binary encoding of each frame.
+        :param engine_name: physics engine of the replay ("python" or "numpy"), GAME_PHYSICS_ENGINE by default.
+        """
+        if header["tick_rate"] != TICK_RATE:
+            raise ValueError(f"Match {header['match_id']} was recorded at {header['tick_rate']} ticks/s, "
+                             f"it can't be replayed at {TICK_RATE} ticks/s.")
+        engine = create_physics_engine(engine_name or settings.GAME_PHYSICS_ENGINE)
+        super().__init__(header["player1"], header["player2"], f"replay_{header['match_id']}",
+                         {"id": header["match_id"]}, asyncio.Queue(), engine=engine, record=False)
+        self.send = send
+        self.records = records
+        self.serves = {tick: value for tick, kind, _, value, _ in records if kind == RECORD_SERVE}
+        self.expected_scores = [0, 0]
+        self.expected_hits = [0, 0]
+        self.diverged = False
+
+    async def play(self, speed=None):
+        """
+        Replays the match until its recorded end.
+        :param speed: playback speed (1 for real time), as fast as possible if None.
+        :return: result of the match, with "diverged" set if the replay didn't match the recording.
+        """
+        loop = asyncio.get_running_loop()
+        self.running = True
+        self.match_over = loop.create_future()
+        if 0 in self.serves:
+            self.engine.set_serve(self.slot, decode_serve(self.serves[0]))
+
+        started = loop.time()
+        last_tick = self.records[-1][0] if self.records else 0
+        index = 0
+        while self.running:
+            tick = self.tick + 1
+            while index < len(self.records) and self.records[index][0] <= tick:
+                self.feed(self.records[index])
+                index += 1
+
+            await self.prepare_tick()
+            for _, side in self.engine.step():
+                self.on_goal(side)
+            await self.finish_tick()
+
+            if self.running and self.tick >= last_tick:
+                # Match ended by the server, or abandoned by its worker
+                self.finish()
+            elif speed:
+                await asyncio.sleep(max(0, started + self.tick / (TICK_RATE * speed) - loop.time()))
+            elif self.tick % YIELD_TICKS == 0:
+                await asyncio.sleep(0)
+
+        await self.match_over
+        return {**self.result, "diverged": self.diverged}
+
+    def feed(self, record):
+        """
+        Queues the events of a record for the tick it was recorded on.
+        """
+        tick, kind, side, value, extra = record
+        player = self.player1 if side == LEFT else self.player2
+        if kind == RECORD_INPUT:
+            self.event_queue.put_nowait({"event": "player_action", "player_id": player.id,
+                                         "direction": INPUT_DIRECTIONS.get(value, "none"), "seq": extra})
+        elif kind == RECORD_GOAL:
+            self.expected_scores[side] += 1
+        elif kind == RECORD_HIT:
+            self.expected_hits[side] = extra
+        elif kind == RECORD_END and value != END_BY_SCORE:
+            loser = self.player2 if value == LEFT else self.player1
+            self.event_queue.put_nowait({"event": "player_disconnected", "player_id": loser.id})
+
+    def on_goal(self, side):
+        serve = self.serves.get(self.tick)
+        if serve is not None:
+            self.engine.set_serve(self.slot, decode_serve(serve))
+        elif not self.check_match_over():
+            self.diverged = True
+        super().on_goal(side)
+
+    async def publish_spectator_state(self):
+        """
+        Replays have no spectators.
+        """
+
+    def check_inactivity(self):
+        """
+        Inactivity was checked during the match: forfeits are replayed from the recorded end.
+        """
+
+    async def _end_match(self, winner):
+        player1 = self.player_state(LEFT)
+        player2 = self.player_state(RIGHT)
+        if not winner:
+            winner = player1["id"] if player1["score"] > player2["score"] else player2["id"]
+        if ([player1["score"], player2["score"]] != self.expected_scores
+                or [player1["total_hits"], player2["total_hits"]] != self.expected_hits):
+            self.diverged = True
+        if self.diverged:
+            logger.warning(f"Replay of match {self.match_data['id']} diverged from its recording.")
+
+        await self.send_group_message({
+            "event": "match_over",
+            "winner": winner,
+            "player1_score": player1["score"],
+            "player2_score": player2["score"],
+        })
+        self.result = {
+            "winner": int(winner),
+            "score": "{}-{}".format(player1["score"], player2["score"]),
+        }
+
+    async def send_frame(self, text, binary=None):
+        await self.send(text, binary)
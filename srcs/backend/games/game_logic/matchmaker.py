@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from channels.layers import get_channel_layer
+from users.presence import UserPresence
+from .channel_handling import disconnect_user
+from .game_worker import WORKER_LOAD_KEY, worker_heartbeat_key
+from .matchmaking_queue import MatchmakingQueue, NOTIFY_CHANNEL
+from .recovery_key_manager import RecoveryKeyManager
+
+logger = logging.getLogger(__name__)
+
+MATCHMAKER_INTERVAL = 1  # seconds between two passes when no player joins, rating windows widen meanwhile
+MAX_PAIRS_PER_PASS = 100
+
+class Matchmaker:
+    """
+    Standalone matchmaker (see the run_matchmaker command).
+    Each pass pops every pair the queue can make, checks the players are online with a single query,
+    and sends each match to the least loaded game worker, which creates it and notifies the players.
+    Passes run every MATCHMAKER_INTERVAL seconds, or as soon as a player joins the queue.
+    """
+
+    def __init__(self, interval=MATCHMAKER_INTERVAL, max_pairs=MAX_PAIRS_PER_PASS):
+        self.interval = interval
+        self.max_pairs = max_pairs
+        self.queue = MatchmakingQueue()
+
+    async def run(self):
+        redis = await RecoveryKeyManager.get_redis()
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(NOTIFY_CHANNEL)
+        logger.info("Matchmaker started.")
+        while True:
+            try:
+                await self.match_players()
+            except Exception as e:
+                logger.error(f"Error during matchmaking pass: {e}")
+            await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.interval)
+            # Players joining together are matched in the same pass
+            while await pubsub.get_message(ignore_subscribe_messages=True, timeout=0):
+                pass
+
+    async def match_players(self):
+        """
+        One matchmaking pass.
+        :return: number of matches sent to the game workers.
+        """
+        pairs = []
+        while len(pairs) < self.max_pairs:
+            pair = await self.queue.get_next_match()
+            if not pair:
+                break
+            pairs.append(pair)
+        if not pairs:
+            return 0
+
+        online = await UserPresence.are_online([player.player_id for pair in pairs for player in pair])
+        started = 0
+        requeued = []
+        for player1, player2 in pairs:
+            if player1.player_id in online and player2.player_id in online:
+                if await self.dispatch_match(player1.player_id, player2.player_id):
+                    started += 1
+                    continue
+                requeued.extend((player1, player2))
+                continue
+
+            logger.error("Match canceled. Re-adding online player to the queue.")
+            for player in (player1, player2):
+                if player.player_id in online:
+                    requeued.append(player)
+                else:
+                    logger.info("Player %s is offline. Closing connection.", player.player_id)
+                    await disconnect_user(player.player_id)
+
+        # Players put back keep their waiting time, and so their place in the queue
+        for player in requeued:
+            await self.queue.add_player(player.player_id, player.rating, player.enqueued_at)
+
+        logger.info(f"Matchmaking pass: {started} matches started. Metrics: {await self.queue.get_metrics()}")
+        return started
+
+    async def dispatch_match(self, player1, player2):
+        worker = await self.pick_worker()
+        if worker is None:
+            logger.error("No game worker alive, matches can't be started.")
+            return False
+        await get_channel_layer().send(worker, {"type": "match.start", "player1": player1, "player2": player2})
+        return True
+
+    async def pick_worker(self):
+        """
+        Returns the channel of the least loaded live game worker and counts the new match in its load,
+        so the matches of a pass are spread over the workers until they publish their real load.
+        """
+        redis = await RecoveryKeyManager.get_redis()
+        workers = await redis.zrange(WORKER_LOAD_KEY, 0, -1)
+        if not workers:
+            return None
+        alive = await redis.mget([worker_heartbeat_key(worker) for worker in workers])
+        dead = [worker for worker, heartbeat in zip(workers, alive) if heartbeat is None]
+        if dead:
+            await redis.zrem(WORKER_LOAD_KEY, *dead)
+        for worker, heartbeat in zip(workers, alive):
+            if heartbeat is not None:
+                await redis.zincrby(WORKER_LOAD_KEY, 1, worker)
+                return worker
+        return None
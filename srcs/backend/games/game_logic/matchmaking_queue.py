@@ -1,117 +1,163 @@
-import redis
-from django.conf import settings
+import time
+from collections import namedtuple
 import logging
+from .recovery_key_manager import RecoveryKeyManager
 
 logger = logging.getLogger(__name__)
 
+# Rating window of a searcher: BASE_RATING_WINDOW around its rating, widened by
+# RATING_WINDOW_GROWTH per second of wait, up to MAX_RATING_WINDOW.
+BASE_RATING_WINDOW = 100
+RATING_WINDOW_GROWTH = 20
+MAX_RATING_WINDOW = 1000
+SEARCHERS_PER_ATTEMPT = 16 # longest waiting players for which a match is looked for on each attempt
+
+# Tries to pair the longest waiting players, oldest first, with the closest rated player within their window.
+# The closest players are found with two range queries on the rating index, so an attempt stays logarithmic.
+# Runs atomically in Redis, so two workers can never get the same player.
+# KEYS: enqueue times, ratings, metrics. ARGV: now, base window, window growth, max window, searchers.
+POP_PAIR_SCRIPT = """
+local now = tonumber(ARGV[1])
+local waiting = redis.call('zrange', KEYS[1], 0, tonumber(ARGV[5]) - 1, 'WITHSCORES')
+for i = 1, #waiting, 2 do
+    local player, enqueued_at = waiting[i], tonumber(waiting[i + 1])
+    local rating = tonumber(redis.call('zscore', KEYS[2], player))
+    if rating then
+        local window = math.min(tonumber(ARGV[2]) + tonumber(ARGV[3]) * (now - enqueued_at), tonumber(ARGV[4]))
+        local below = redis.call('zrevrangebyscore', KEYS[2], rating, rating - window, 'WITHSCORES', 'LIMIT', 0, 2)
+        local above = redis.call('zrangebyscore', KEYS[2], '(' .. rating, rating + window, 'WITHSCORES', 'LIMIT', 0, 1)
+        local opponent, opponent_rating, difference = nil, nil, nil
+        for _, candidates in ipairs({below, above}) do
+            for j = 1, #candidates, 2 do
+                local candidate_difference = math.abs(tonumber(candidates[j + 1]) - rating)
+                if candidates[j] ~= player and (not difference or candidate_difference < difference) then
+                    opponent, opponent_rating, difference = candidates[j], candidates[j + 1], candidate_difference
+                end
+            end
+        end
+        if opponent then
+            local opponent_enqueued_at = redis.call('zscore', KEYS[1], opponent)
+            redis.call('zrem', KEYS[1], player, opponent)
+            redis.call('zrem', KEYS[2], player, opponent)
+            redis.call('hincrby', KEYS[3], 'matches', 1)
+            redis.call('hincrbyfloat', KEYS[3], 'total_wait', (now - enqueued_at) + (now - tonumber(opponent_enqueued_at)))
+            redis.call('hincrbyfloat', KEYS[3], 'total_rating_difference', difference)
+            return {player, waiting[i + 1], tostring(rating), opponent, opponent_enqueued_at, opponent_rating}
+        end
+    end
+end
+return nil
+"""
+
+NOTIFY_CHANNEL = "matchmaking:notify" # pub/sub channel waking up the matchmaker when players join
+
+QueueEntry = namedtuple("QueueEntry", ["player_id", "enqueued_at", "rating"])
+
 class MatchmakingQueue:
+    """
+    Skill-rated matchmaking queue stored in two Redis sorted sets with the player ids as members:
+    one scored by enqueue time (waiting order), one scored by rating (search index).
+    Insert, removal and membership checks never scan the queue.
+    Uses the shared asyncio Redis client, so queue operations never block the event loop running the matches.
+    """
+
     def __init__(self):
-        self.redis = redis.StrictRedis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=0,
-            decode_responses=True
-        )
-        self.queue_key = "matchmaking_queue"
+        self.queue_key = "matchmaking:queue"
+        self.ratings_key = "matchmaking:ratings"
+        self.metrics_key = "matchmaking:metrics"
+        self._pop_pair = None
+
+    async def get_redis(self):
+        redis = await RecoveryKeyManager.get_redis()
+        if self._pop_pair is None:
+            self._pop_pair = redis.register_script(POP_PAIR_SCRIPT)
+        return redis
 
-    def add_player(self, player_id):
+    async def add_player(self, player_id, rating, enqueued_at=None):
         """
         Add a player to the queue. Prevent duplicates.
-        """
-        if not self.redis.lpos(self.queue_key, player_id):
-            self.redis.rpush(self.queue_key, player_id)
-            logger.info(f"Player {player_id} added to the queue.")
+        :param enqueued_at: enqueue time to keep the waiting time of a player put back in the queue.
+        """
+        pipe = (await self.get_redis()).pipeline()
+        pipe.zadd(self.queue_key, {player_id: enqueued_at or time.time()}, nx=True)
+        pipe.zadd(self.ratings_key, {player_id: rating})
+        pipe.publish(NOTIFY_CHANNEL, player_id)
+        added, _, _ = await pipe.execute()
+        if added:
+            logger.info(f"Player {player_id} ({rating}) added to the queue.")
         else:
             logger.info(f"Player {player_id} is already in the queue.")
 
-    def remove_player(self, player_id):
+    async def remove_player(self, player_id):
         """
         Remove a player from the queue atomically.
         """
-        lua_script = """
-        local index = redis.call('lpos', KEYS[1], ARGV[1])
-        if index then
-            redis.call('lrem', KEYS[1], 1, ARGV[1])
-            return true
-        else
-            return false
-        end
-        """
         try:
-            result = self.redis.eval(lua_script, 1, self.queue_key, player_id)
-            if result:
+            pipe = (await self.get_redis()).pipeline()
+            pipe.zrem(self.queue_key, player_id)
+            pipe.zrem(self.ratings_key, player_id)
+            removed, _ = await pipe.execute()
+            if removed:
                 logger.info(f"Player {player_id} removed from the queue.")
             else:
                 logger.info(f"Player {player_id} not found in the queue.")
         except Exception as e:
             logger.error(f"Error removing player {player_id} from the queue: {e}")
 
-    def is_player_in_queue(self, player_id):
+    async def is_player_in_queue(self, player_id):
         """
         Check if a player is already in the queue.
         """
         try:
-            # Use Redis LPOS command to check if the player exists in the queue
-            return self.redis.lpos(self.queue_key, player_id) is not None
+            return await (await self.get_redis()).zscore(self.queue_key, player_id) is not None
         except Exception as e:
             logger.error(f"Error checking if player {player_id} is in the queue: {e}")
             return False
-    
-    def get_queue(self):
-        """
-        Returns the current queue as a list.
-        """
-        queue = self.redis.lrange(self.queue_key, 0, -1)
-        return queue if queue else []
 
-    def get_next_match(self):
+    async def get_queue(self):
         """
-        Finds a pair of players atomically using Lua script.
+        Returns the current queue as a list, longest waiting players first.
         """
+        return await (await self.get_redis()).zrange(self.queue_key, 0, -1)
 
-        if self.redis.llen(self.queue_key) < 2:
-            return None
-        
-        lua_script = """
-        local player1 = redis.call('lpop', KEYS[1])
-        local player2 = redis.call('lpop', KEYS[1])
-        if player1 and player2 then
-            redis.call('srem', KEYS[2], player1, player2)
-            return {player1, player2}
-        else
-            if player1 then
-                redis.call('lpush', KEYS[1], player1)
-            end
-            return nil
-        end
+    async def get_next_match(self):
+        """
+        Pops a pair of players with close ratings atomically using a Lua script.
+        :return: pair of QueueEntry, None if no player has an opponent within its rating window.
         """
         try:
-            result = self.redis.eval(lua_script, 2, self.queue_key, f"{self.queue_key}_set")
+            await self.get_redis()
+            result = await self._pop_pair(keys=[self.queue_key, self.ratings_key, self.metrics_key],
+                                   args=[time.time(), BASE_RATING_WINDOW, RATING_WINDOW_GROWTH,
+                                         MAX_RATING_WINDOW, SEARCHERS_PER_ATTEMPT])
             if result:
-                logger.info(f"Match found: {result[0]} vs {result[1]}")
-                return result[0], result[1]
+                player1 = QueueEntry(result[0], float(result[1]), round(float(result[2])))
+                player2 = QueueEntry(result[3], float(result[4]), round(float(result[5])))
+                now = time.time()
+                logger.info(f"Match found: {player1.player_id} ({player1.rating}, waited {now - player1.enqueued_at:.1f}s) "
+                            f"vs {player2.player_id} ({player2.rating}, waited {now - player2.enqueued_at:.1f}s)")
+                return player1, player2
         except Exception as e:
             logger.error(f"Error finding next match: {e}")
         return None
 
-    def _update_queue(self, new_queue):
-        """
-        Updates the queue in Redis atomically.
-        """
-        try:
-            self.redis.delete(self.queue_key)
-            self.redis.delete(f"{self.queue_key}_set")
-            if new_queue:  # Ensure queue is not empty
-                self.redis.rpush(self.queue_key, *new_queue)
-                self.redis.sadd(f"{self.queue_key}_set", *new_queue)
-            logger.info(f"Queue updated successfully. New queue: {new_queue}")
-        except Exception as e:
-            logger.info(f"Error updating queue: {e}")
+    async def get_metrics(self):
+        """
+        Time-to-match and match quality since the metrics were last cleared.
+        """
+        redis = await self.get_redis()
+        metrics = await redis.hgetall(self.metrics_key)
+        matches = int(metrics.get("matches", 0))
+        return {
+            "matches": matches,
+            "waiting": await redis.zcard(self.queue_key),
+            "avg_time_to_match": float(metrics.get("total_wait", 0)) / (2 * matches) if matches else 0.0,
+            "avg_rating_difference": float(metrics.get("total_rating_difference", 0)) / matches if matches else 0.0,
+        }
 
-    def clear(self):
+    async def clear(self):
         """
         Clears the queue (e.g., after a reload).
         """
-        self.redis.delete(self.queue_key)
-        self.redis.delete(f"{self.queue_key}_set")
+        await (await self.get_redis()).delete(self.queue_key, self.ratings_key)
         logger.info("Queue cleared.")
@@ -0,0 +1,245 @@
+import random
+import numpy as np
+from django.conf import settings
+from .physics_engine import (FIELD_WIDTH, FIELD_HEIGHT, PADDLE_HEIGHT, PADDLE_SPEED,
+                             BALL_RADIUS, BALL_INITIAL_VELOCITY, VELOCITY_MULTIPLIER, SPIN_FACTOR,
+                             PHYSICS_REFERENCE_RATE, BALL_Z_LIMIT, LEFT_PADDLE_X, RIGHT_PADDLE_X,
+                             LEFT, RIGHT)
+
+INITIAL_CAPACITY = 64
+
+class NumpyPhysicsEngine:
+    """
+    Struct-of-arrays physics backend: the state of every match hosted by the process
+    lives in NumPy arrays (one row per match) and all matches are stepped with a
+    handful of vectorized operations.
+    Produces the same scores, hits and rally stats as PythonPhysicsEngine.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.capacity = 0
+        self.free_slots = []
+        self.used = 0
+        self.time_scale = PHYSICS_REFERENCE_RATE / getattr(settings, "GAME_TICK_RATE", PHYSICS_REFERENCE_RATE)
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """
+        Grows every array to the given number of rows, keeping the existing matches.
+        """
+        def grow(array, shape, dtype):
+            new_array = np.zeros(shape, dtype=dtype)
+            if array is not None:
+                new_array[:self.capacity] = array
+            return new_array
+
+        first = self.capacity == 0
+        self.position = grow(None if first else self.position, (capacity, 2), np.float64)
+        self.velocity = grow(None if first else self.velocity, (capacity, 2), np.float64)
+        self.direction = grow(None if first else self.direction, (capacity, 2), np.float64)
+        self.times_hit = grow(None if first else self.times_hit, capacity, np.int64)
+        self.kick_off = grow(None if first else self.kick_off, capacity, bool)
+        self.running = grow(None if first else self.running, capacity, bool)
+        self.paddles = grow(None if first else self.paddles, (capacity, 2), np.float64)
+        self.score = grow(None if first else self.score, (capacity, 2), np.int64)
+        self.total_hits = grow(None if first else self.total_hits, (capacity, 2), np.int64)
+        self.serves = grow(None if first else self.serves, (capacity, 2), np.int64)
+        self.successful_serves = grow(None if first else self.successful_serves, (capacity, 2), np.int64)
+        self.longest_rally = grow(None if first else self.longest_rally, (capacity, 2), np.int64)
+        self.free_slots.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def add_match(self):
+        """
+        Allocates a row for a new match.
+        :return: slot (row index) of the match.
+        """
+        if not self.free_slots:
+            self.allocate(self.capacity * 2)
+        slot = self.free_slots.pop()
+        self.used = max(self.used, slot + 1)
+
+        self.running[slot] = False
+        self.paddles[slot] = 0.0
+        self.score[slot] = 0
+        self.total_hits[slot] = 0
+        self.serves[slot] = 0
+        self.successful_serves[slot] = 0
+        self.longest_rally[slot] = 0
+        self.reset_ball(slot)
+        return slot
+
+    def remove_match(self, slot):
+        self.running[slot] = False
+        self.free_slots.append(slot)
+
+    def restore_match(self, slot, ball, players):
+        """
+        Restores the state of a match (e.g. from a checkpoint).
+        :param ball: state returned by ball_state().
+        :param players: states returned by player_state() for each side.
+        """
+        self.position[slot] = ball["position"]
+        self.velocity[slot] = ball["velocity"]
+        self.direction[slot] = ball["direction"]
+        self.times_hit[slot] = ball["timesHit"]
+        self.kick_off[slot] = ball["kick_off"]
+        for side, player in enumerate(players):
+            self.paddles[slot, side] = player["position"]
+            self.score[slot, side] = player["score"]
+            self.total_hits[slot, side] = player["total_hits"]
+            self.serves[slot, side] = player["serves"]
+            self.successful_serves[slot, side] = player["successful_serves"]
+            self.longest_rally[slot, side] = player["longest_rally"]
+
+    def reset_ball(self, slot):
+        self.position[slot] = 0.0
+        self.velocity[slot] = BALL_INITIAL_VELOCITY
+        self.direction[slot, 0] = random.choice([-1, 1])
+        self.direction[slot, 1] = random.choice([-1, 1])
+        self.times_hit[slot] = 0
+        self.kick_off[slot] = True
+
+    def set_running(self, slot, running):
+        self.running[slot] = running
+
+    def end_kick_off(self, slot):
+        self.kick_off[slot] = False
+
+    def move_paddle(self, slot, side, direction, distance=PADDLE_SPEED):
+        position = float(self.paddles[slot, side])
+        if direction == "up" and position + PADDLE_HEIGHT / 2 < FIELD_HEIGHT / 2:
+            self.paddles[slot, side] = position + distance
+        elif direction == "down" and position - PADDLE_HEIGHT / 2 > -FIELD_HEIGHT / 2:
+            self.paddles[slot, side] = position - distance
+
+    def set_serve(self, slot, direction):
+        """
+        Forces the direction of the ball served at the next kick-off (e.g. to replay a recorded match).
+        """
+        self.direction[slot] = direction
+
+    def hits(self, slot):
+        """
+        Total paddle hits of each side, cheap enough to be polled every tick.
+        """
+        return int(self.total_hits[slot, LEFT]), int(self.total_hits[slot, RIGHT])
+
+    def ball_state(self, slot):
+        return {
+            "position": self.position[slot].tolist(),
+            "velocity": self.velocity[slot].tolist(),
+            "direction": [int(d) for d in self.direction[slot]],
+            "timesHit": int(self.times_hit[slot]),
+            "kick_off": bool(self.kick_off[slot]),
+        }
+
+    def player_state(self, slot, side):
+        return {
+            "position": float(self.paddles[slot, side]),
+            "score": int(self.score[slot, side]),
+            "total_hits": int(self.total_hits[slot, side]),
+            "serves": int(self.serves[slot, side]),
+            "successful_serves": int(self.successful_serves[slot, side]),
+            "longest_rally": int(self.longest_rally[slot, side]),
+        }
+
+    def step(self):
+        """
+        Advances every running match by one frame in a single vectorized pass.
+        :return: list of (slot, side) for each goal scored during the frame.
+        """
+        n = self.used
+        if n == 0:
+            return []
+
+        running = self.running[:n]
+        position = self.position[:n]
+        direction = self.direction[:n]
+        paddles = self.paddles[:n]
+
+        # Move the balls (multiplying by 0 keeps the position unchanged for stopped balls)
+        x0 = position[:, 0].copy()
+        z0 = position[:, 1].copy()
+        moving = running & ~self.kick_off[:n]
+        position += self.velocity[:n] * direction * moving[:, None] * self.time_scale
+
+        # Top and bottom walls, the part of the move beyond the wall is bounced back into the field
+        wall = running & (np.abs(position[:, 1]) + BALL_RADIUS >= FIELD_HEIGHT / 2)
+        direction[wall, 1] *= -1
+        over = wall & (np.abs(position[:, 1]) > BALL_Z_LIMIT)
+        position[over, 1] = np.copysign(2 * BALL_Z_LIMIT - np.abs(position[over, 1]), position[over, 1])
+
+        # Paddles, swept along the path of the ball during the tick:
+        # the left paddle is checked first, the right one only if the left one wasn't hit
+        x = position[:, 0]
+        left_entry_x, left_entry_z, left = self.sweep_paddle(
+            x0, z0, running & ~(direction[:, 0] > 0) & (x <= LEFT_PADDLE_X + BALL_RADIUS)
+            & (x0 >= LEFT_PADDLE_X - BALL_RADIUS), np.minimum(x0, LEFT_PADDLE_X + BALL_RADIUS), paddles[:, LEFT])
+        right_entry_x, right_entry_z, right = self.sweep_paddle(
+            x0, z0, running & ~left & ~(direction[:, 0] < 0) & (x >= RIGHT_PADDLE_X - BALL_RADIUS)
+            & (x0 <= RIGHT_PADDLE_X + BALL_RADIUS), np.maximum(x0, RIGHT_PADDLE_X - BALL_RADIUS), paddles[:, RIGHT])
+        hit = np.flatnonzero(left | right)
+        if hit.size:
+            sides = right[hit].astype(np.int64)
+            self.handle_paddle_hits(hit, sides, np.where(sides == RIGHT, right_entry_z[hit], left_entry_z[hit]))
+            # Bounce the part of the move beyond the contact point back towards the field
+            entry_x = np.where(sides == RIGHT, right_entry_x[hit], left_entry_x[hit])
+            position[hit, 0] = 2 * entry_x - position[hit, 0]
+
+        # Goals are rare, the resulting score updates and ball resets are done per match
+        goals = []
+        for slot in np.flatnonzero(running & (np.abs(position[:, 0]) > FIELD_WIDTH / 2)).tolist():
+            side = LEFT if self.position[slot, 0] > 0 else RIGHT
+            self.score[slot, side] += 1
+            self.reset_ball(slot)
+            goals.append((slot, side))
+        return goals
+
+    def sweep_paddle(self, x0, z0, crossing, entry_x, paddle):
+        """
+        Checks where the path of each ball enters the hit window of a paddle.
+        :param x0, z0: positions of the balls before the move of this tick.
+        :param crossing: rows where the path of the ball overlaps the hit window along x.
+        :param entry_x: x where each path enters the hit window.
+        :param paddle: position of the paddle of each row.
+        :return: entry_x, z where each path enters the hit window, rows where the paddle is hit.
+        """
+        n = self.used
+        x = self.position[:n, 0]
+        t = np.zeros(n)
+        np.divide(entry_x - x0, x - x0, out=t, where=x != x0)
+        entry_z = z0 + (self.position[:n, 1] - z0) * t
+        hit = crossing & (paddle - PADDLE_HEIGHT / 2 <= entry_z) & (entry_z <= paddle + PADDLE_HEIGHT / 2)
+        return entry_x, entry_z, hit
+
+    def handle_paddle_hits(self, slots, sides, entry_z):
+        """
+        Applies the paddle hit rules to the given matches.
+        :param slots: rows of the matches where the ball hit a paddle.
+        :param sides: side of the paddle hit for each of these rows.
+        :param entry_z: z of each ball where its path entered the hit window of the paddle.
+        """
+        self.direction[slots, 0] *= -1
+        distance_from_center = entry_z - self.paddles[slots, sides]
+
+        # Update ball velocity based on distance from paddle center
+        self.velocity[slots, 1] += distance_from_center * SPIN_FACTOR
+        self.times_hit[slots] += 1
+        times_hit = self.times_hit[slots]
+
+        self.total_hits[slots, sides] += 1
+
+        # Count serve attempts and successful serves on the first hit of the rally
+        first = times_hit == 1
+        self.serves[slots[first], sides[first]] += 1
+        successful = first & (((sides == LEFT) & (self.direction[slots, 0] > 0))
+                              | ((sides == RIGHT) & (self.direction[slots, 0] < 0)))
+        self.successful_serves[slots[successful], sides[successful]] += 1
+
+        # Update rally length
+        self.longest_rally[slots, sides] = np.maximum(self.longest_rally[slots, sides], times_hit)
+
+        # Increase ball velocity every 3 hits
+        boosted = slots[times_hit % 3 == 0]
+        self.velocity[boosted] *= VELOCITY_MULTIPLIER
@@ -0,0 +1,294 @@
+import math
+import random
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FIELD_WIDTH = 10.0  # Horizontal field (x)
+FIELD_HEIGHT = 6.0  # Vertical field (z)
+PADDLE_HEIGHT = 1.0
+PADDLE_WIDTH = 0.2
+PADDLE_SPEED = 0.12
+PADDLE_SPEED_PER_SECOND = PADDLE_SPEED * 60 # while a direction is held (one PADDLE_SPEED step per 60 FPS client frame)
+BALL_RADIUS = FIELD_HEIGHT / 30
+BALL_INITIAL_VELOCITY = 0.03
+VELOCITY_MULTIPLIER = 1.3
+SPIN_FACTOR = 0.02 # vertical velocity added per unit of distance from the paddle center
+# Ball velocities above are distances per tick at this tick rate, they're scaled to the configured GAME_TICK_RATE
+PHYSICS_REFERENCE_RATE = 120
+
+# Collisions are swept along the path of the ball during the tick: a hit is detected when the path
+# crosses the hit window of a paddle, however far the ball moves in one tick
+BALL_Z_LIMIT = FIELD_HEIGHT / 2 - BALL_RADIUS # highest z of the ball center before it bounces on a wall
+LEFT_PADDLE_X = -FIELD_WIDTH / 2 + PADDLE_WIDTH
+RIGHT_PADDLE_X = FIELD_WIDTH / 2 - PADDLE_WIDTH
+
+LEFT = 0   # player1 side
+RIGHT = 1  # player2 side
+
+class Paddle:
+    """
+    Paddle of one player: position plus the score and stats sent to the API at the end of the match.
+    """
+    __slots__ = ("position", "score", "total_hits", "serves", "successful_serves", "longest_rally")
+
+    def __init__(self):
+        self.position = 0.0
+        self.score = 0
+        self.total_hits = 0
+        self.serves = 0
+        self.successful_serves = 0
+        self.longest_rally = 0
+
+    def to_dict(self):
+        return {
+            "position": self.position,
+            "score": self.score,
+            "total_hits": self.total_hits,
+            "serves": self.serves,
+            "successful_serves": self.successful_serves,
+            "longest_rally": self.longest_rally,
+        }
+
+class Ball:
+    """
+    Ball of a match, reset in place after every goal.
+    (x, z): position, (vx, vz): speed along each axis, (dx, dz): direction along each axis (-1 or 1).
+    """
+    __slots__ = ("x", "z", "vx", "vz", "dx", "dz", "times_hit", "kick_off")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.x = 0.0
+        self.z = 0.0
+        self.vx = BALL_INITIAL_VELOCITY
+        self.vz = BALL_INITIAL_VELOCITY
+        self.dx = random.choice([-1, 1])
+        self.dz = random.choice([-1, 1])
+        self.times_hit = 0
+        self.kick_off = True
+
+    def to_dict(self):
+        return {
+            "position": [self.x, self.z],
+            "velocity": [self.vx, self.vz],
+            "direction": [self.dx, self.dz],
+            "timesHit": self.times_hit,
+            "kick_off": self.kick_off,
+        }
+
+class MatchState:
+    __slots__ = ("running", "ball", "paddles")
+
+    def __init__(self):
+        self.running = False
+        self.ball = Ball()
+        self.paddles = (Paddle(), Paddle())
+
+class PythonPhysicsEngine:
+    """
+    Scalar physics backend: the state of each match is kept in small slotted objects
+    and matches are stepped one after the other.
+    """
+
+    def __init__(self):
+        self.matches = {}
+        self.next_slot = 0
+        self.time_scale = PHYSICS_REFERENCE_RATE / getattr(settings, "GAME_TICK_RATE", PHYSICS_REFERENCE_RATE)
+
+    def add_match(self):
+        """
+        Allocates the physics state of a new match.
+        :return: slot identifying the match in the engine.
+        """
+        slot = self.next_slot
+        self.next_slot += 1
+        self.matches[slot] = MatchState()
+        return slot
+
+    def remove_match(self, slot):
+        self.matches.pop(slot, None)
+
+    def restore_match(self, slot, ball, players):
+        """
+        Restores the state of a match (e.g. from a checkpoint).
+        :param ball: state returned by ball_state().
+        :param players: states returned by player_state() for each side.
+        """
+        state = self.matches[slot]
+        state.ball.x, state.ball.z = ball["position"]
+        state.ball.vx, state.ball.vz = ball["velocity"]
+        state.ball.dx, state.ball.dz = ball["direction"]
+        state.ball.times_hit = ball["timesHit"]
+        state.ball.kick_off = ball["kick_off"]
+        for paddle, player in zip(state.paddles, players):
+            for field in Paddle.__slots__:
+                setattr(paddle, field, player[field])
+
+    def set_running(self, slot, running):
+        """
+        Matches are only stepped once their start kick-off is over.
+        """
+        self.matches[slot].running = running
+
+    def end_kick_off(self, slot):
+        self.matches[slot].ball.kick_off = False
+
+    def move_paddle(self, slot, side, direction, distance=PADDLE_SPEED):
+        paddle = self.matches[slot].paddles[side]
+        if direction == "up" and paddle.position + PADDLE_HEIGHT / 2 < FIELD_HEIGHT / 2:
+            paddle.position += distance
+        elif direction == "down" and paddle.position - PADDLE_HEIGHT / 2 > -FIELD_HEIGHT / 2:
+            paddle.position -= distance
+
+    def set_serve(self, slot, direction):
+        """
+        Forces the direction of the ball served at the next kick-off (e.g. to replay a recorded match).
+        """
+        ball = self.matches[slot].ball
+        ball.dx, ball.dz = direction
+
+    def hits(self, slot):
+        """
+        Total paddle hits of each side, cheap enough to be polled every tick.
+        """
+        paddles = self.matches[slot].paddles
+        return paddles[LEFT].total_hits, paddles[RIGHT].total_hits
+
+    def ball_state(self, slot):
+        return self.matches[slot].ball.to_dict()
+
+    def player_state(self, slot, side):
+        return self.matches[slot].paddles[side].to_dict()
+
+    def step(self):
+        """
+        Advances every running match by one frame.
+        :return: list of (slot, side) for each goal scored during the frame.
+        """
+        goals = []
+        for slot, state in self.matches.items():
+            if not state.running:
+                continue
+            ball = state.ball
+            x0, z0 = ball.x, ball.z
+            self.update_ball(ball)
+            self.check_collisions(state, x0, z0)
+            side = self.check_goal(state)
+            if side is not None:
+                goals.append((slot, side))
+        return goals
+
+    def update_ball(self, ball):
+        if ball.kick_off:
+            return
+
+        ball.x += ball.vx * ball.dx * self.time_scale
+        ball.z += ball.vz * ball.dz * self.time_scale
+
+    def check_collisions(self, state, x0, z0):
+        """
+        :param x0, z0: position of the ball before the move of this tick.
+        """
+        ball = state.ball
+        if abs(ball.z) + BALL_RADIUS >= FIELD_HEIGHT / 2:
+            ball.dz *= -1
+            # Bounce the part of the move beyond the wall back into the field
+            if abs(ball.z) > BALL_Z_LIMIT:
+                ball.z = math.copysign(2 * BALL_Z_LIMIT - abs(ball.z), ball.z)
+
+        for paddle, left in ((state.paddles[LEFT], True), (state.paddles[RIGHT], False)):
+            contact = self.check_paddle_collision(ball, paddle, left, x0, z0)
+            if contact is not None:
+                entry_x, entry_z = contact
+                self.handle_paddle_hit(ball, paddle, left, entry_z)
+                # Bounce the part of the move beyond the contact point back towards the field
+                ball.x = 2 * entry_x - ball.x
+                break
+
+    def check_paddle_collision(self, ball, paddle, left, x0, z0):
+        """
+        Sweeps the path of the ball from (x0, z0) to its current position against the hit window of the paddle.
+        :return: (x, z) where the path enters the hit window if the paddle is hit, None otherwise.
+        """
+        if left:
+            if ball.dx > 0 or ball.x > LEFT_PADDLE_X + BALL_RADIUS or x0 < LEFT_PADDLE_X - BALL_RADIUS:
+                return None
+            entry_x = min(x0, LEFT_PADDLE_X + BALL_RADIUS)
+        else:
+            if ball.dx < 0 or ball.x < RIGHT_PADDLE_X - BALL_RADIUS or x0 > RIGHT_PADDLE_X + BALL_RADIUS:
+                return None
+            entry_x = max(x0, RIGHT_PADDLE_X - BALL_RADIUS)
+
+        t = (entry_x - x0) / (ball.x - x0) if ball.x != x0 else 0.0
+        entry_z = z0 + (ball.z - z0) * t
+        if paddle.position - PADDLE_HEIGHT / 2 <= entry_z <= paddle.position + PADDLE_HEIGHT / 2:
+            return entry_x, entry_z
+        return None
+
+    def handle_paddle_hit(self, ball, paddle, left, entry_z):
+        ball.dx *= -1
+        distance_from_center = entry_z - paddle.position
+
+        # Update ball velocity based on distance from paddle center
+        ball.vz += distance_from_center * SPIN_FACTOR
+        ball.times_hit += 1
+
+        # Increment total hits for the paddle
+        paddle.total_hits += 1
+
+        # Count serve attempts and successful serves
+        if ball.times_hit == 1:  # First hit in rally
+            paddle.serves += 1
+            if (left and ball.dx > 0) or (not left and ball.dx < 0):
+                paddle.successful_serves += 1
+
+        # Update rally length
+        if ball.times_hit > paddle.longest_rally:
+            paddle.longest_rally = ball.times_hit
+
+        # Increase ball velocity every 3 hits
+        if ball.times_hit % 3 == 0:
+            ball.vx *= VELOCITY_MULTIPLIER
+            ball.vz *= VELOCITY_MULTIPLIER
+
+    def check_goal(self, state):
+        """
+        Updates the score and resets the ball in place if it left the field.
+        :return: side of the player who scored, None if no goal.
+        """
+        ball = state.ball
+        if abs(ball.x) <= FIELD_WIDTH / 2:
+            return None
+
+        side = LEFT if ball.x > 0 else RIGHT
+        state.paddles[side].score += 1
+        ball.reset()
+        return side
+
+_engine = None
+
+def create_physics_engine(engine_name):
+    """
+    Creates a physics engine ("python" or "numpy"), e.g. a private one to replay a recorded match.
+    """
+    if engine_name == "numpy":
+        from .numpy_physics_engine import NumpyPhysicsEngine
+        return NumpyPhysicsEngine()
+    if engine_name != "python":
+        logger.warning(f"Unknown physics engine '{engine_name}', falling back to 'python'.")
+    return PythonPhysicsEngine()
+
+def get_physics_engine():
+    """
+    Returns the physics engine shared by every match of the process.
+    The backend is selected per deployment with the GAME_PHYSICS_ENGINE setting ("python" or "numpy").
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_physics_engine(getattr(settings, "GAME_PHYSICS_ENGINE", "python"))
+        logger.info(f"Physics engine: {type(_engine).__name__}")
+    return _engine
@@ -5,12 +5,32 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Deletes the recovery key of a match and the active match index of its players,
+# unless a player already points to another match.
+# KEYS: recovery key, active match index of each player. ARGV: match group.
+DELETE_RECOVERY_KEY_SCRIPT = """
+local deleted = redis.call('del', KEYS[1])
+for i = 2, #KEYS do
+    if redis.call('get', KEYS[i]) == ARGV[1] then
+        redis.call('del', KEYS[i])
+    end
+end
+return deleted
+"""
+
+def recovery_key(match_group):
+    return f"match:{match_group}:recovery"
+
+def active_match_key(user_id):
+    return f"user:{user_id}:active_match"
+
 class RecoveryKeyManager:
     """
     Manages Redis-based recovery keys for active matches.
     """
 
     _redis = None
+    _delete_recovery_key_script = None
 
     @classmethod
     async def get_redis(cls):
@@ -32,7 +52,7 @@ class RecoveryKeyManager:
         Creates a recovery key for the match with a specified TTL.
         """
         redis = await cls.get_redis()
-        key = f"match:{match_group}:recovery"
+        key = recovery_key(match_group)
         value = {
             "match_group": match_group,
             "player1_id": player1_id,
@@ -42,7 +62,12 @@ class RecoveryKeyManager:
             "player1_avatar": avatar1,
             "player2_avatar": avatar2,
         }
-        await redis.set(key, json.dumps(value), ex=ttl)
+        # The players are indexed with the key, in the same transaction and with the same TTL
+        pipe = redis.pipeline(transaction=True)
+        pipe.set(key, json.dumps(value), ex=ttl)
+        pipe.set(active_match_key(player1_id), match_group, ex=ttl)
+        pipe.set(active_match_key(player2_id), match_group, ex=ttl)
+        await pipe.execute()
 
     @classmethod
     async def get_recovery_key(cls, match_group):
@@ -50,18 +75,65 @@ class RecoveryKeyManager:
         Retrieves a recovery key for the given match_group
         """
         redis = await cls.get_redis()
-        key = f"match:{match_group}:recovery"
+        key = recovery_key(match_group)
         value = await redis.get(key)
         return json.loads(value) if value else None
 
+    @classmethod
+    async def get_active_match(cls, user_id):
+        """
+        Retrieves the recovery key of the match the user is playing, through the active match index.
+        :return: match data, None if the user isn't in a match.
+        """
+        redis = await cls.get_redis()
+        match_group = await redis.get(active_match_key(user_id))
+        if not match_group:
+            return None
+        match_data = await cls.get_recovery_key(match_group)
+        if not match_data or str(user_id) not in (str(match_data["player1_id"]), str(match_data["player2_id"])):
+            return None
+        return match_data
+
     @classmethod
     async def delete_recovery_key(cls, match_group):
         """
         Deletes the recovery key for the given match_group.
         """
         redis = await cls.get_redis()
-        key = f"match:{match_group}:recovery"
-        await redis.delete(key)
+        if cls._delete_recovery_key_script is None:
+            cls._delete_recovery_key_script = redis.register_script(DELETE_RECOVERY_KEY_SCRIPT)
+        # The index keys are passed to the script, which only deletes them if they still point to this match
+        match_data = await cls.get_recovery_key(match_group)
+        keys = [recovery_key(match_group)]
+        if match_data:
+            keys += [active_match_key(match_data["player1_id"]), active_match_key(match_data["player2_id"])]
+        await cls._delete_recovery_key_script(keys=keys, args=[match_group])
+
+    @classmethod
+    async def rebuild_active_match_index(cls):
+        """
+        Rebuilds the active match index from the existing recovery keys (e.g., keys created before the index existed).
+        Scans all the recovery keys: meant to be run once, not on a request path.
+        Existing index entries are kept, they may point to newer matches than the scanned keys.
+        :return: number of matches indexed.
+        """
+        redis = await cls.get_redis()
+        indexed = 0
+        async for key in redis.scan_iter(recovery_key("*")):
+            pipe = redis.pipeline()
+            pipe.get(key)
+            pipe.ttl(key)
+            value, ttl = await pipe.execute()
+            if not value or ttl == -2:
+                continue
+            match_data = json.loads(value)
+            pipe = redis.pipeline(transaction=True)
+            for player_id in (match_data["player1_id"], match_data["player2_id"]):
+                pipe.set(active_match_key(player_id), match_data["match_group"], ex=ttl if ttl > 0 else None, nx=True)
+            await pipe.execute()
+            indexed += 1
+        logger.info(f"Active match index rebuilt: {indexed} matches indexed.")
+        return indexed
 
     @classmethod
     async def create_tournament_recovery_key(cls, user_id, tournament_id):
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .local_delivery import LocalGroupDelivery
+
+logger = logging.getLogger(__name__)
+
+SPECTATOR_DELAY = settings.GAME_SPECTATOR_DELAY
+
+def spectate_group(match_id):
+    return f"spectate_{match_id}"
+
+class SpectatorFeed:
+    """
+    Snapshot stream of one match for the spectators connected to this process.
+    The feed is the only member of the spectate group in this process: the match sends each snapshot
+    once per process watching it, whatever the number of spectators, and never through the player group.
+    Snapshots are held SPECTATOR_DELAY seconds before being handed to the spectators.
+    """
+
+    def __init__(self, match_id):
+        self.match_id = match_id
+        self.group_name = spectate_group(match_id)
+        self.channel_name = None
+        self.spectators = set()
+        self.frames = deque()  # (reception time, text, binary, last frame of the match)
+        self._pending = asyncio.Event()
+        self._tasks = ()
+
+    async def start(self):
+        self.channel_name = await get_channel_layer().new_channel("spectator_feed.")
+        self._tasks = (asyncio.create_task(self._receive()), asyncio.create_task(self._deliver()))
+        await LocalGroupDelivery.attach(self.group_name, self)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        try:
+            await LocalGroupDelivery.detach(self.group_name, self)
+        except Exception as e:
+            logger.error(f"Error detaching spectator feed of match {self.match_id}: {e}")
+
+    async def websocket_message(self, message):
+        """
+        Queues a frame of the match, handed directly by LocalGroupDelivery or received on the feed channel.
+        Game states always come with their binary encoding, the other frames are match events.
+        """
+        text = message["text"]
+        binary = message.get("bytes")
+        final = binary is None and json.loads(text).get("event") == "match_over"
+        self.frames.append((asyncio.get_running_loop().time(), text, binary, final))
+        self._pending.set()
+
+    async def _receive(self):
+        channel_layer = get_channel_layer()
+        while True:
+            message = await channel_layer.receive(self.channel_name)
+            if message.get("type") == "websocket_message":
+                await self.websocket_message(message)
+
+    async def _deliver(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._pending.wait()
+            self._pending.clear()
+            while self.frames:
+                received, text, binary, final = self.frames[0]
+                delay = received + SPECTATOR_DELAY - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.frames.popleft()
+                await self.broadcast(text, binary)
+                if final:
+                    await asyncio.gather(*(spectator.close() for spectator in list(self.spectators)),
+                                         return_exceptions=True)
+
+    async def broadcast(self, text, binary):
+        results = await asyncio.gather(*(spectator.send_frame(text, binary) for spectator in list(self.spectators)),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error sending frame to a spectator of match {self.match_id}: {result}")
+
+class SpectatorRelay:
+    """
+    Spectators of the live matches.
+    Matches publish a down-sampled snapshot stream (GAME_SPECTATOR_RATE) to the processes with spectators,
+    each process relays it to its own spectators through one SpectatorFeed per match.
+    Matches nobody watches don't publish anything: a match stops looking for spectators once it has none,
+    until a spectator_joined event (sent by the SpectatorConsumer) tells it someone joined.
+    """
+
+    _feeds = {}  # match id -> SpectatorFeed of this process
+
+    @classmethod
+    async def add_spectator(cls, match_id, consumer):
+        """
+        :param consumer: WebSocket consumer with a send_frame(text, binary) method.
+        """
+        feed = cls._feeds.get(match_id)
+        if feed is None:
+            feed = cls._feeds[match_id] = SpectatorFeed(match_id)
+            feed.spectators.add(consumer)
+            await feed.start()
+        else:
+            feed.spectators.add(consumer)
+
+    @classmethod
+    async def remove_spectator(cls, match_id, consumer):
+        feed = cls._feeds.get(match_id)
+        if feed is None:
+            return
+        feed.spectators.discard(consumer)
+        if not feed.spectators:
+            del cls._feeds[match_id]
+            await feed.stop()
+
+    @staticmethod
+    def spectator_joined(match_id):
+        """
+        Called in the process hosting the match when a spectator joined, so the next publish sees its feed.
+        """
+        LocalGroupDelivery.forget(spectate_group(match_id))
+
+    @staticmethod
+    async def publish(match_id, encode_frame):
+        """
+        Sends a frame of a match to the feeds watching it.
+        :param encode_frame: returns the text and binary encoding of the frame, only called if anyone is watching.
+        :return: whether anyone is watching the match.
+        """
+        group_name = spectate_group(match_id)
+        if not await LocalGroupDelivery.has_members(group_name):
+            return False
+        text, binary = encode_frame()
+        await LocalGroupDelivery.send(group_name, text, binary)
+        return True
+
+    @staticmethod
+    async def end(match_id):
+        """
+        Forgets the feeds of a match which is over.
+        """
+        await LocalGroupDelivery.clear(spectate_group(match_id))
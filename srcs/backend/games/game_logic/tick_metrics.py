@@ -0,0 +1,67 @@
+import bisect
+
+# Upper bounds (ms) of the tick duration histogram buckets, the last bucket catches everything above
+HISTOGRAM_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33)
+
+class TickHistogram:
+    """
+    Fixed-bucket histogram of tick durations, cheap enough to be fed every frame.
+    :param bounds_ms: upper bounds of the buckets, for durations on another scale than ticks.
+    """
+
+    def __init__(self, bounds_ms=HISTOGRAM_BUCKETS_MS):
+        self.bounds_ms = bounds_ms
+        self.buckets = [0] * (len(bounds_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms):
+        self.buckets[bisect.bisect_left(self.bounds_ms, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+
+    def percentile(self, percent):
+        """
+        Approximate percentile: upper bound of the bucket holding it (max duration for the last bucket).
+        """
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return self.bounds_ms[index] if index < len(self.bounds_ms) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms,
+            "buckets": dict(zip([f"<={bound}" for bound in self.bounds_ms] + ["inf"], self.buckets)),
+        }
+
+class TickMetrics:
+    """
+    Tick duration histogram plus overrun counters.
+    overruns: ticks which started late and were run as catch-up sub-steps.
+    dropped: ticks skipped because the catch-up limit was reached.
+    """
+
+    def __init__(self):
+        self.durations = TickHistogram()
+        self.overruns = 0
+        self.dropped = 0
+
+    def snapshot(self):
+        return {
+            "durations": self.durations.snapshot(),
+            "overruns": self.overruns,
+            "dropped": self.dropped,
+        }
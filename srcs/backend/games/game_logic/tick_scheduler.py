@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from django.conf import settings
+from .physics_engine import get_physics_engine
+from .tick_metrics import TickMetrics
+
+logger = logging.getLogger(__name__)
+
+TICK_RATE = settings.GAME_TICK_RATE
+RATE = 1 / TICK_RATE
+MAX_CATCH_UP_STEPS = 5  # ticks run back to back at most when the loop fell behind
+STATS_LOG_INTERVAL = 30  # seconds between two tick cost reports
+
+class MatchTickScheduler:
+    """
+    Drives every live MatchHandler of the process from a single asyncio task.
+    Each frame advances all registered matches in one batch, instead of every
+    match sleeping on its own timers, and the physics of all of them is stepped
+    with a single call to the shared physics engine.
+
+    Ticks are scheduled against a monotonic deadline (fixed timestep): the simulation
+    speed doesn't depend on the processing time of a tick. When the loop falls behind,
+    missed ticks are caught up with at most MAX_CATCH_UP_STEPS back to back sub-steps,
+    the remaining ones are dropped and counted.
+    """
+
+    _matches = {}
+    _task = None
+    _ticks = 0
+    _metrics = TickMetrics()
+    autostart = True  # False when run_tick is driven by hand (e.g. the simulate_matches command)
+
+    @classmethod
+    def register(cls, match_handler):
+        """
+        Adds a match to the batch and starts the scheduler task if needed.
+        :param match_handler: MatchHandler instance, identified in the physics engine by its slot.
+        :raises ValueError: if the match runs on a private engine, which the scheduler wouldn't step
+        (e.g. a replay, driven by ReplayHandler.play).
+        """
+        if match_handler.engine is not get_physics_engine():
+            raise ValueError(f"Match {match_handler.group_name} doesn't run on the shared physics engine, "
+                             f"it can't be driven by the tick scheduler.")
+        cls._matches[match_handler.slot] = match_handler
+        if cls.autostart and (cls._task is None or cls._task.done()):
+            cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    def unregister(cls, match_handler):
+        """
+        Removes a match from the batch. The scheduler stops by itself once no match is left.
+        """
+        if cls._matches.get(match_handler.slot) is match_handler:
+            del cls._matches[match_handler.slot]
+
+    @classmethod
+    def get_stats(cls):
+        """
+        Returns the tick duration histogram and overrun counters of the scheduler.
+        """
+        return {"ticks": cls._ticks, "matches": len(cls._matches), **cls._metrics.snapshot()}
+
+    @classmethod
+    async def _run(cls):
+        """
+        Main loop: one wakeup per frame for all the matches of the process.
+        """
+        loop = asyncio.get_event_loop()
+        last_report = loop.time()
+        next_tick = loop.time()
+
+        while cls._matches:
+            steps = 0
+            while loop.time() >= next_tick and steps < MAX_CATCH_UP_STEPS and cls._matches:
+                tick_start = time.perf_counter()
+                await cls.run_tick()
+                cls._metrics.durations.observe((time.perf_counter() - tick_start) * 1000)
+                next_tick += RATE
+                steps += 1
+
+            if steps > 1:
+                cls._record_overrun(overruns=steps - 1, dropped=0)
+
+            behind = loop.time() - next_tick
+            if behind >= RATE:
+                # Too late to catch up: skip the missed ticks, the simulation slows down for this frame only
+                dropped = int(behind / RATE)
+                next_tick += dropped * RATE
+                cls._record_overrun(overruns=0, dropped=dropped)
+
+            if loop.time() - last_report >= STATS_LOG_INTERVAL:
+                last_report = loop.time()
+                stats = cls.get_stats()
+                logger.info("Tick scheduler: %d matches, p50 %.3f ms, p99 %.3f ms, max %.3f ms, %d overruns, %d dropped",
+                            stats["matches"], stats["durations"]["p50_ms"], stats["durations"]["p99_ms"],
+                            stats["durations"]["max_ms"], stats["overruns"], stats["dropped"])
+
+            await asyncio.sleep(max(0, next_tick - loop.time()))
+
+    @classmethod
+    async def run_tick(cls):
+        """
+        Advances every registered match by one frame:
+        inputs of every match, one physics step for all of them, then the broadcasts.
+        """
+        cls._ticks += 1
+        matches = list(cls._matches.values())
+        cls._log_errors(matches, await asyncio.gather(*(match.prepare_tick() for match in matches),
+                                                      return_exceptions=True))
+
+        for slot, side in get_physics_engine().step():
+            match = cls._matches.get(slot)
+            if match:
+                match.on_goal(side)
+
+        cls._log_errors(matches, await asyncio.gather(*(match.finish_tick() for match in matches),
+                                                      return_exceptions=True))
+
+    @staticmethod
+    def _log_errors(matches, results):
+        for match, result in zip(matches, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error during tick of {match.group_name}: {result}")
+
+    @classmethod
+    def _record_overrun(cls, overruns, dropped):
+        """
+        Counts late ticks globally and for every live match.
+        """
+        for metrics in [cls._metrics] + [match.metrics for match in cls._matches.values()]:
+            metrics.overruns += overruns
+            metrics.dropped += dropped
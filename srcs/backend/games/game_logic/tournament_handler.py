@@ -1,10 +1,11 @@
-from .channel_handling import (remove_player_from_group, send_group_message, 
-                               send_error_to_players, add_player_to_group)
+from .channel_handling import send_group_message, send_error_to_players, add_player_to_group
 from .utils import (check_players_online_statuses, get_tournament_participants,
                     determine_matches_in_round, create_tournament_matches,
-                    generate_bracket, finish_match, get_round_winners, determine_number_of_participants_including_bye)
+                    finish_match, determine_number_of_participants_including_bye)
+from .bracket import TournamentBracket
 from .match_handler import MatchHandler
 from .match_event_queue import MatchEventQueueManager
+from .game_worker import GameWorker
 from .recovery_key_manager import RecoveryKeyManager
 from .api_calls import update_tournament_status_api
 import logging, asyncio, copy, json
@@ -12,72 +13,158 @@ import logging, asyncio, copy, json
 logger = logging.getLogger(__name__)
 
 class TournamentHandler:
+    """
+    Runs a single elimination tournament on its bracket tree (see TournamentBracket).
+    A match starts as soon as both its feeder matches are over, so winners don't wait for the slowest match
+    of their round. Clients get the whole bracket once, then a match_update event for every change.
+    """
+
     def __init__(self, tournament_id, group_name):
         self.tournament_id = tournament_id
         self.group_name = group_name
-        self.future_matches = {}
-        self.round_number = 1
-        self.bracket = []
         self.participants = []
+        self.bracket = None
         self.total_participants_including_bye = 0
-        self.match_created_count = 0
+        self.winner = None
 
     async def handle_tournament(self):
         """
         Start the tournament logic.
+        The tournament is leased by this worker while it runs: if the worker dies, another one closes it.
         """
-        await update_tournament_status_api(self.tournament_id, "in_progress")
-        await self.tournament_loop()
+        if not await GameWorker.host_tournament(self.tournament_id):
+            return
+        try:
+            await update_tournament_status_api(self.tournament_id, "in_progress")
+            await self.tournament_loop()
+        finally:
+            await GameWorker.release_tournament(self.tournament_id)
 
     async def tournament_loop(self):
         """
-        Main loop for the tournament.
+        Starts the first round, then waits for the final: every other match is started
+        by the results of its feeders (see advance).
         """
         self.participants = await get_tournament_participants(self.tournament_id)
-        self.total_participants_including_bye = determine_number_of_participants_including_bye(len(self.participants))
-        remaining_participants = copy.deepcopy(self.participants)
-
-        while len(remaining_participants) > 1:
-            round_matches = determine_matches_in_round(remaining_participants)
-            matches = await create_tournament_matches(round_matches, self.tournament_id, self.round_number)
-            current_bracket = generate_bracket(matches, self.round_number, self.participants, self.match_created_count)
-            self.match_created_count += len(matches)
-
-            self.bracket.append(current_bracket)
-
-            tournamentBracketEvent = {"event": "tournament_bracket", "data": {"total_participants_including_bye": self.total_participants_including_bye, "bracket": self.bracket}}
-            await RecoveryKeyManager.create_tournament_bracket_recovery_key(self.tournament_id, json.dumps(tournamentBracketEvent))
+        self.winner = asyncio.get_event_loop().create_future()
 
-            await send_group_message(self.group_name, tournamentBracketEvent)
-            
-            await self.notify_incoming_matches(matches)
-
-            # Two lines used to wait all ongoing matches to finish
-            future_matches = [self.future_matches[match["id"]] for match in matches if match.get("id") is not None]
-            await asyncio.gather(*future_matches)
-
-            remaining_participants = get_round_winners(self.bracket, self.round_number)
+        if len(self.participants) > 1:
+            self.total_participants_including_bye = determine_number_of_participants_including_bye(len(self.participants))
+            self.bracket = TournamentBracket(self.total_participants_including_bye)
+            first_round = determine_matches_in_round(copy.deepcopy(self.participants))
+            for match, pair in zip(self.bracket.rounds[0], first_round):
+                match.players = [pair["player1"], pair["player2"]]
+            await self.start_matches(self.bracket.rounds[0], full_bracket=True)
+        else:
+            self.winner.set_result(self.participants[0] if self.participants else None)
 
-            if not remaining_participants:
-                logger.error("No winners found for round %s", self.round_number)
-                break
-            else:
-                logger.info("Tounament %s Round %s winners: %s", self.tournament_id, self.round_number, remaining_participants)
-            self.round_number += 1
+        winner = await self.winner
+        logger.info("Tournament %s winner: %s", self.tournament_id, winner)
 
         await send_group_message(
             self.group_name,
             {
                 "event": "tournament_end",
                 "data": {
-                    "winner": remaining_participants[0]["username"] if remaining_participants else None,
-                    "winner_id": remaining_participants[0]["id"] if remaining_participants else None,
+                    "winner": winner["username"] if winner else None,
+                    "winner_id": winner["id"] if winner else None,
                 }
             }
         )
-        await update_tournament_status_api(self.tournament_id, "completed", remaining_participants[0]["id"] if remaining_participants else None)
+        await update_tournament_status_api(self.tournament_id, "completed", winner["id"] if winner else None)
         await RecoveryKeyManager.delete_tournament_bracket_recovery_key(self.tournament_id)
 
+    async def start_matches(self, matches, full_bracket=False):
+        """
+        Starts bracket matches whose players are known. Matches with two players are created in one request
+        and their players are notified, a match with a single player (bye) is won by that player at once.
+
+        :param matches: BracketMatch list, all from the same round.
+        :param full_bracket: send the whole bracket instead of an update per match (first round).
+        """
+        pairs = [match for match in matches if all(match.players)]
+        walkovers = [match for match in matches if not all(match.players)]
+        failed = []
+        created = []
+        if pairs:
+            matches_data, failed_matches = await create_tournament_matches(
+                [{"player1": match.players[0], "player2": match.players[1]} for match in pairs],
+                self.tournament_id, matches[0].round_number)
+            for player1, player2, error in failed_matches:
+                await send_error_to_players(str(player1["id"]), str(player2["id"]), "Failed to create your tournament match.")
+            for match, match_data in zip(pairs, matches_data):
+                if match_data is None:
+                    failed.append(match)
+                else:
+                    self.bracket.set_match(match, match_data)
+                    created.append(match_data)
+        for match in walkovers:
+            match.entry = TournamentBracket.make_entry(match, "completed")
+
+        if full_bracket:
+            await self.send_bracket()
+        else:
+            for match in matches:
+                await self.send_match_update(match)
+        await self.notify_incoming_matches(created)
+
+        # Nobody advances from a match which couldn't be created
+        for match in walkovers:
+            await self.advance(match, match.players[0] or match.players[1])
+        for match in failed:
+            await self.advance(match, None)
+
+    async def advance(self, match, winner, score=None):
+        """
+        Records the result of a bracket match and starts the next match if its other feeder is over too.
+
+        :param winner: participant advancing to the next match, None if nobody advances.
+        :param score: The final score of the match (e.g., "11-5").
+        """
+        next_match = self.bracket.resolve(match, winner, score)
+        await self.send_match_update(match)
+        if match is self.bracket.final:
+            self.winner.set_result(winner)
+        elif next_match:
+            await self.start_matches([next_match])
+        else:
+            await self.send_match_update(self.bracket.next_match(match))
+
+    async def finish_bracket_match(self, match_id, winner_id, score=None):
+        """
+        Advances the winner of a finished match.
+        :param winner_id: ID of the winner, None if nobody advances.
+        """
+        match = self.bracket.get(match_id)
+        if match is None:
+            logger.error(f"Match {match_id} isn't in the bracket of tournament {self.tournament_id}, result ignored.")
+            return
+        try:
+            winner = None
+            if winner_id is not None:
+                winner = next((player for player in match.players if player["id"] == int(winner_id)), None)
+            await self.advance(match, winner, score)
+        except Exception as e:
+            logger.error(f"Error advancing the winner of match {match_id} in the bracket: {e}")
+
+    def bracket_event(self):
+        return {"event": "tournament_bracket", "data": {"total_participants_including_bye": self.total_participants_including_bye,
+                                                        "bracket": self.bracket.to_list()}}
+
+    async def send_bracket(self):
+        event = self.bracket_event()
+        await RecoveryKeyManager.create_tournament_bracket_recovery_key(self.tournament_id, json.dumps(event))
+        await send_group_message(self.group_name, event)
+
+    async def send_match_update(self, match):
+        """
+        Sends the card of a bracket match to the clients and saves the bracket for the reconnecting ones.
+        """
+        if match is None or match.entry is None:
+            return
+        await RecoveryKeyManager.create_tournament_bracket_recovery_key(self.tournament_id, json.dumps(self.bracket_event()))
+        await send_group_message(self.group_name, {"event": "match_update", "data": match.entry})
+
     async def notify_incoming_matches(self, matches):
         """
         For each match where a pair is defined (player2 != None),
@@ -91,7 +178,14 @@ class TournamentHandler:
                 first_player = str(match["first_player"])
                 second_player = str(match["second_player"])
 
-                self.future_matches[match_id] = asyncio.Future()
+                # The ready signals and inputs of the match are routed to this worker from any process
+                if not await GameWorker.host_match(f"match_{match_id}"):
+                    # Nobody would get the ready signals: the match is abandoned, like a match which can't start
+                    logger.error(f"Match {match_id} of tournament {self.tournament_id} is leased by another worker, "
+                                 f"abandoning it.")
+                    await send_error_to_players(first_player, second_player, "Failed to start the match.")
+                    await self.handle_match_timeout(match_id, match["first_player"])
+                    continue
 
                 await send_group_message(f"player_{first_player}", 
                                          {"event": "incoming_match", "match_id": match_id, "playerId": first_player})
@@ -147,6 +241,7 @@ class TournamentHandler:
             else:
                 await self.handle_match_timeout(match_id, match["first_player"])
             MatchEventQueueManager.delete_queue(match_group)
+            await GameWorker.release_match(match_group)
     
     async def handle_match_timeout(self, match_id, winner_id):
         """
@@ -155,11 +250,9 @@ class TournamentHandler:
         logger.info("Timeout: Not enough ready players for match %s", match_id)
         try:
             await finish_match(winner_id, match_id)
-            await self.update_bracket(self.round_number, match_id, winner_id, "0-0")
-            self.future_matches[match_id].set_result(True)
         except Exception as e:
             logger.error(f"Error during match timeout handling: {e}")
-            self.future_matches[match_id].set_result(True)
+        await self.finish_bracket_match(match_id, winner_id, "0-0")
 
     async def start_match(self, match_data, eventQueue, match_group):
         """
@@ -182,14 +275,16 @@ class TournamentHandler:
 
             def done_callback(task):
                 async def wrapper():
+                    winner, score = None, None
                     try:
                         result = task.result()
                         logger.info("Match %s result: %s", match_data["id"], result)
-                        await self.update_bracket(self.round_number, match_data["id"], result["winner"], result["score"])
+                        winner, score = result["winner"], result["score"]
                     except Exception as e:
                         logger.error("Error obtaining match result: %s", e)
                     finally:
-                        self.future_matches[match_data["id"]].set_result(True)
+                        await GameWorker.release_match(match_group)
+                    await self.finish_bracket_match(match_data["id"], winner, score)
                 asyncio.create_task(wrapper())
                 
             match_task.add_done_callback(done_callback)
@@ -198,48 +293,5 @@ class TournamentHandler:
         except Exception as e:
             logger.error(f"Error during match handling: {e}")
             await send_error_to_players(player1, player2, "Failed to start the match.")
+            await GameWorker.release_match(match_group)
             await self.handle_match_timeout(match_data["id"], match_data["first_player"])
-            self.future_matches[match_data["id"]].set_result(True)
-
-    async def update_bracket(self, round_number, match_id, winner, score):
-        """
-        Update the match data in the tournament bracket for the specified round.
-
-        :param round_number: Round number where the match took place.
-        :param match_id: Match ID that has ended.
-        :param winner: identifier of the winner to be recorded in the bracket.
-        :param score: The final score of the match (e.g., "11-5").
-        :return: True if the update was successful, otherwise False (e.g., if the round or match was not found).
-        """
-
-        for round_entry in self.bracket:
-            if round_entry.get("round") == round_number:
-                for match_entry in round_entry.get("matches", []):
-                    if match_entry.get("match_id") == match_id:
-                        match_entry["winner"] = winner
-                        score_player1, score_player2 = score.split('-')
-                        match_entry["score_player1"] = score_player1
-                        match_entry["score_player2"] = score_player2
-                        match_entry["status"] = "completed"
-
-                        # Check event handled by js
-                        match_update = {
-                            "match_id": match_id,
-                            "bracket_index": match_entry["bracket_index"],
-                            "player1_alias": match_entry["player1_alias"],
-                            "player1_avatar": match_entry["player1_avatar"],
-                            "player1_id": match_entry["player1_id"],
-                            "player1_username": match_entry["player1_username"],
-                            "player2_alias": match_entry["player2_alias"],
-                            "player2_avatar": match_entry["player2_avatar"],
-                            "player2_id": match_entry["player2_id"],
-                            "player2_username": match_entry["player2_username"],
-                            "status": "completed",
-                            "score_player1": score_player1,
-                            "score_player2": score_player2,
-                            "winner": winner
-                        }
-
-                        await send_group_message(self.group_name, {"event": "match_update", "data": match_update})
-                        return True
-        return False
\ No newline at end of file
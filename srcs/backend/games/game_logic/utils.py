@@ -1,8 +1,9 @@
 from .recovery_key_manager import RecoveryKeyManager
-from users.models import User
+from users.models import UserStats, INITIAL_RATING
+from users.presence import UserPresence
 from games.models import TournamentParticipant, Tournament
 from channels.db import database_sync_to_async
-from games.game_logic.api_calls import create_match_api, create_round_api, finish_match_api
+from games.game_logic.api_calls import create_round_matches_api, finish_match_api
 from typing import List, Dict
 import math, random, logging, asyncio
 
@@ -19,20 +20,16 @@ async def check_active_match(user):
         dict: If match exists, returns a dictionary with match details, otherwise None.
     """
     try:
-        redis = await RecoveryKeyManager.get_redis()
-        async for key in redis.scan_iter("match:*:recovery"):
-            match_id = key.split(":")[1]
-            match_data = await RecoveryKeyManager.get_recovery_key(match_id)
-            logger.info("match_data: %s", match_data)
-            if match_data and (str(user.id) == match_data["player1_id"] or str(user.id) == match_data["player2_id"]):
-                return {
-                    'active': True,
-                    'match_group': match_data["match_group"],
-                    'player1_id': match_data["player1_id"],
-                    'player2_id': match_data["player2_id"],
-                    'player1_username': match_data["player1_username"],
-                    'player2_username': match_data["player2_username"],
-                }
+        match_data = await RecoveryKeyManager.get_active_match(user.id)
+        if match_data:
+            return {
+                'active': True,
+                'match_group': match_data["match_group"],
+                'player1_id': match_data["player1_id"],
+                'player2_id': match_data["player2_id"],
+                'player1_username': match_data["player1_username"],
+                'player2_username': match_data["player2_username"],
+            }
         logger.info(f"No active match found for user {user.id}")
         return {'active': False}
     except Exception as e:
@@ -48,34 +45,24 @@ async def check_players_online_statuses(player_id_1, player_id_2, eventQueue, ma
             logger.info(f"Match {match_group} key is no longer available. Task ending.")
             break
 
-        player_1_online = await is_player_online(player_id_1)
-        if not player_1_online:
-            await eventQueue.put({
-                "event": "player_disconnected",
-                "player_id": player_id_1
-            })
-            break
-        
-        player_2_online = await is_player_online(player_id_2)
-        if not player_2_online:
+        online = await UserPresence.are_online([player_id_1, player_id_2])
+        offline = next((player_id for player_id in (player_id_1, player_id_2) if str(player_id) not in online), None)
+        if offline is not None:
             await eventQueue.put({
                 "event": "player_disconnected",
-                "player_id": player_id_2
+                "player_id": offline
             })
             break
         await asyncio.sleep(10)
 
 @database_sync_to_async
-def is_player_online(player_id):
+def get_player_rating(player_id):
     """
-    Check if a player is online.
+    Returns the matchmaking rating of a player.
     """
-    try:
-        user = User.objects.get(id=player_id)
-        return user.online_status
-    except User.DoesNotExist:
-        return False
-    
+    rating = UserStats.objects.filter(user_id=player_id).values_list("rating", flat=True).first()
+    return rating if rating is not None else INITIAL_RATING
+
 @database_sync_to_async
 def is_participant(tournament_id, user):
     """
@@ -182,13 +169,22 @@ def determine_matches_in_round(participants: List[Dict]) -> List[Dict]:
 
 async def create_tournament_matches(matches, tournament_id, round_number):
     """
-    Create matches for the tournament round and return their data.
+    Create matches for the tournament round, all at once, and return their data.
 
     :param matches: List of matches (player1, player2) from determine_matches_in_round()
-    :return: List of dictionaries with match data
+    :return: List of dictionaries with match data, in the order of the matches (None for a match which
+        couldn't be created), and list of the matches (player1, player2, error) which couldn't be created
     """
-    created_matches = []
+    pairs = [match for match in matches if match["player2"] is not None]
+    try:
+        results = await create_round_matches_api(tournament_id, round_number,
+                                                 [(match["player1"]["id"], match["player2"]["id"]) for match in pairs])
+    except Exception as e:
+        results = [{"error": str(e)}] * len(pairs)
+    pair_results = iter(results)
 
+    created_matches = []
+    failed_matches = []
     for match in matches:
         player1 = match["player1"]
         player2 = match["player2"]
@@ -211,68 +207,17 @@ async def create_tournament_matches(matches, tournament_id, round_number):
                 "finished_at": None,
             }
         else:
-            try:
-                match_data = await create_match_api(player1["id"], player2["id"], match_type="tournament")
-                round_data = await create_round_api(match_data["id"], tournament_id, round_number)
-            except Exception as e:
-                logger.error(f"Error creating match for {player1['username']} vs {player2['username']}: {e}")
-                continue
+            result = next(pair_results)
+            if "error" in result:
+                logger.error(f"Error creating match for {player1['username']} vs {player2['username']}: {result['error']}")
+                failed_matches.append((player1, player2, result["error"]))
+                match_data = None
+            else:
+                match_data = result["match"]
 
         created_matches.append(match_data)
 
-    return created_matches
-
-def generate_bracket(matches, round_number=1, participants=None, bracket_index=0):
-    """
-    Form the structure of the tournament bracket for the specified round.
-
-    :param matches: List of matches created through create_tournament_matches()
-    :param round_number: Current round number (default 1)
-    :param participants: All participants participating in the tournament
-    :return: Dictionary with tournament bracket data
-    """
-
-    bracket = {
-        "round": round_number,
-        "matches": []
-    }
-
-    for match in matches:
-
-        # TODO: Have to optimize this part by modifying data structures
-        player1_alias = "BYE"
-        player1_id = match["first_player"]
-        player2_alias = "BYE"
-        player2_id = match["second_player"]
-
-        for participant_entry in participants:
-            if player1_id and participant_entry["id"] == player1_id:
-                player1_alias = participant_entry["alias"]
-            elif player2_id and participant_entry["id"] == player2_id:
-                player2_alias = participant_entry["alias"]
-        # -------------------------------------------------------------
-
-        match_entry = {
-            "match_id": match["id"],
-            "bracket_index": bracket_index,
-            "player1_id": match["first_player"],
-            "player1_username": match["player1_username"] if match["player1_username"] else "BYE",
-            "player1_alias": player1_alias,
-            "player1_avatar": match["player1_avatar"],
-            "player2_id": match["second_player"],
-            "player2_username": match["player2_username"] if match["player2_username"] else "BYE",
-            "player2_alias": player2_alias,
-            "player2_avatar": match["player2_avatar"],
-            "status": match["match_status"],
-            "winner": None if match["winner"] is None else match["winner"],
-            "score_player1": "0",
-            "score_player2": "0"
-        }
-        bracket["matches"].append(match_entry)
-
-        bracket_index += 1
-
-    return bracket
+    return created_matches, failed_matches
 
 async def finish_match(winner, match_id):
     """
@@ -296,36 +241,3 @@ async def finish_match(winner, match_id):
         await finish_match_api(finish_data)
     except Exception as e:
         logger.error(f"Error during match finishing: {e}")
-
-def get_round_winners(bracket, round_number):
-    """
-    Returns a list of winners (as dictionaries with id and username) for the specified round.
-
-    :param bracket: List of rounds formed by generate_bracket.
-    :param round_number: Round number for which we get the winners.
-    :return: List of dictionaries in the form {"id": <id>, "username": <username>} for each winner.
-    """
-    winners = []
-    for round_entry in bracket:
-        if round_entry.get("round") == round_number:
-            for match in round_entry.get("matches", []):
-                if match.get("status") == "completed" and match.get("winner") is not None:
-                    if match.get("winner") == match.get("player1_id"):
-                        winners.append({
-                            "id": match.get("player1_id"),
-                            "username": match.get("player1_username"),
-                            "alias": match.get("player1_alias"),
-                            "avatar": match.get("player1_avatar")
-                        })
-                    elif match.get("winner") == match.get("player2_id"):
-                        winners.append({
-                            "id": match.get("player2_id"),
-                            "username": match.get("player2_username"),
-                            "alias": match.get("player2_alias"),
-                            "avatar": match.get("player2_avatar")
-                        })
-            break
-    return winners
-
-
-
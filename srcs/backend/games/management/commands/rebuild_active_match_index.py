@@ -0,0 +1,11 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from games.game_logic.recovery_key_manager import RecoveryKeyManager
+
+class Command(BaseCommand):
+    help = ("Rebuilds the per-user active match index (user:<id>:active_match) from the match recovery keys. "
+            "Run once when upgrading with matches in progress; the index is then kept up to date by the recovery keys.")
+
+    def handle(self, *args, **options):
+        indexed = asyncio.run(RecoveryKeyManager.rebuild_active_match_index())
+        self.stdout.write(f"{indexed} matches indexed.")
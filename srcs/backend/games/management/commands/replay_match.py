@@ -0,0 +1,56 @@
+import asyncio
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from games.game_logic.match_recorder import read_recording
+from games.game_logic.match_replay import ReplayHandler
+from games.game_logic.tick_scheduler import TICK_RATE
+
+class Command(BaseCommand):
+    help = ("Replays a recorded match through the physics step as fast as possible "
+            "and checks the replay against the recording.")
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("match_id", type=int, help="ID of the recorded match.")
+        parser.add_argument("--engine", choices=["python", "numpy"], default=settings.GAME_PHYSICS_ENGINE,
+                            help="Physics engine of the replay.")
+
+    def handle(self, *args, **options):
+        try:
+            header, records = read_recording(options["match_id"])
+        except FileNotFoundError:
+            raise CommandError(f"Match {options['match_id']} wasn't recorded.")
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        frames = 0
+
+        async def count_frame(text, binary=None):
+            nonlocal frames
+            frames += 1
+
+        async def replay():
+            handler = ReplayHandler(header, records, count_frame, options["engine"])
+            started = time.perf_counter()
+            result = await handler.play()
+            return handler.tick, time.perf_counter() - started, result
+
+        try:
+            ticks, elapsed, result = asyncio.run(replay())
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        report = {
+            "match": header["match_id"],
+            "records": len(records),
+            "ticks": ticks,
+            "ticks/s": round(ticks / elapsed, 1),
+            "realtime factor": round(ticks / TICK_RATE / elapsed, 2),
+            "frames": frames,
+            "winner": result["winner"],
+            "score": result["score"],
+            "matches recording": not result["diverged"],
+        }
+        for key, value in report.items():
+            self.stdout.write(f"{key}: {value}")
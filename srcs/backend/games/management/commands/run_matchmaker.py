@@ -0,0 +1,16 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from games.game_logic.matchmaker import Matchmaker, MATCHMAKER_INTERVAL, MAX_PAIRS_PER_PASS
+
+class Command(BaseCommand):
+    help = ("Runs the matchmaker: pairs the players of the matchmaking queue in bulk "
+            "and starts their matches on the least loaded game worker.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=MATCHMAKER_INTERVAL,
+                            help="Seconds between two passes when no player joins the queue.")
+        parser.add_argument("--max-pairs", type=int, default=MAX_PAIRS_PER_PASS,
+                            help="Maximum number of matches started per pass.")
+
+    def handle(self, *args, **options):
+        asyncio.run(Matchmaker(options["interval"], options["max_pairs"]).run())
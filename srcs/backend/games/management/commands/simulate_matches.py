@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+import tracemalloc
+from unittest import mock
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from games.game_logic import match_handler
+from games.game_logic.match_handler import MatchHandler
+from games.game_logic.tick_scheduler import MatchTickScheduler, TICK_RATE
+from games.game_logic.physics_engine import get_physics_engine, PADDLE_SPEED, LEFT, RIGHT
+
+class StubTransport:
+    """
+    Stands in for the channel layer, Redis and the internal API during a simulation:
+    frames are only counted and match results are kept for the replay digest.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.text_bytes = 0
+        self.binary_bytes = 0
+        self.results = []
+
+    async def send_match_frame(self, group_name, text, binary=None):
+        self.frames += 1
+        self.text_bytes += len(text)
+        if binary is not None:
+            self.binary_bytes += len(binary)
+
+    async def finish_match_api(self, finish_data):
+        self.results.append(finish_data)
+        return finish_data
+
+    async def noop(self, *args, **kwargs):
+        return None
+
+class Command(BaseCommand):
+    help = ("Runs N matches headless (stub channel layer, Redis and API) and reports "
+            "ticks/s, tick latency, broadcast bytes/s and memory per match. "
+            "Runs with the same seed and engine are reproducible: compare their digests.")
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--matches", type=int, default=100, help="Number of concurrent matches.")
+        parser.add_argument("--ticks", type=int, default=TICK_RATE * 60, help="Number of ticks to simulate.")
+        parser.add_argument("--seed", type=int, default=42, help="Seed of the ball serves and of the inputs.")
+        parser.add_argument("--engine", choices=["python", "numpy"], default=settings.GAME_PHYSICS_ENGINE,
+                            help="Physics engine to benchmark.")
+        parser.add_argument("--inputs", choices=["tracking", "random"], default="tracking",
+                            help="tracking: paddles follow the ball, random: random up/down/none inputs.")
+        parser.add_argument("--input-rate", type=float, default=0.05,
+                            help="Probability for each player to reconsider its held direction on a tick.")
+        parser.add_argument("--record", action="store_true",
+                            help="Record the matches in GAME_RECORDINGS_DIR (see the replay_match command).")
+
+    def handle(self, *args, **options):
+        settings.GAME_PHYSICS_ENGINE = options["engine"]
+        random.seed(options["seed"])
+        transport = StubTransport()
+        patches = [
+            mock.patch.object(match_handler, "send_match_frame", transport.send_match_frame),
+            mock.patch.object(match_handler, "finish_match_api", transport.finish_match_api),
+            mock.patch.object(match_handler, "remove_player_from_group", transport.noop),
+            mock.patch.object(match_handler.RecoveryKeyManager, "delete_recovery_key", transport.noop),
+            mock.patch.object(match_handler.LocalGroupDelivery, "clear", transport.noop),
+            mock.patch.object(match_handler.SpectatorRelay, "publish", transport.noop),
+            mock.patch.object(MatchTickScheduler, "autostart", False),
+        ]
+        for patch in patches:
+            patch.start()
+        try:
+            report = asyncio.run(self.simulate(transport, options))
+        finally:
+            for patch in reversed(patches):
+                patch.stop()
+
+        for key, value in report.items():
+            self.stdout.write(f"{key}: {value}")
+
+    async def simulate(self, transport, options):
+        input_rng = random.Random(options["seed"])
+        engine = get_physics_engine()
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        matches = []
+        for match_id in range(options["matches"]):
+            handler = MatchHandler(2 * match_id + 1, 2 * match_id + 2, f"match_{match_id}",
+                                   {"id": match_id}, asyncio.Queue(), record=options["record"])
+            matches.append(handler)
+            asyncio.create_task(handler.start_match())
+        memory_per_match = (tracemalloc.get_traced_memory()[0] - before) / max(1, len(matches))
+        tracemalloc.stop()
+        await asyncio.sleep(0)
+
+        durations = []
+        sent_inputs = {}  # player id -> (held direction, last input seq)
+        started = time.perf_counter()
+        for _ in range(options["ticks"]):
+            for handler in matches:
+                if handler.running:
+                    self.send_inputs(handler, engine, input_rng, options, sent_inputs)
+            tick_start = time.perf_counter()
+            await MatchTickScheduler.run_tick()
+            durations.append(time.perf_counter() - tick_start)
+            # Lets the end_match tasks of the finished matches run
+            await asyncio.sleep(0)
+            if not any(handler.running for handler in matches):
+                break
+        elapsed = time.perf_counter() - started
+
+        for handler in matches:
+            handler.finish()
+        await asyncio.gather(*(handler.match_over for handler in matches))
+
+        durations.sort()
+        ticks = len(durations)
+        simulated_seconds = ticks / TICK_RATE
+        results = sorted(transport.results, key=lambda result: result["match_id"])
+        digest = hashlib.sha256(json.dumps(results, sort_keys=True).encode()).hexdigest()
+        return {
+            "engine": type(engine).__name__,
+            "matches": len(matches),
+            "ticks": ticks,
+            "ticks/s": round(ticks / elapsed, 1),
+            "match ticks/s": round(ticks * len(matches) / elapsed, 1),
+            "tick p50 (ms)": round(durations[ticks // 2] * 1000, 3) if ticks else 0,
+            "tick p99 (ms)": round(durations[min(ticks - 1, int(ticks * 0.99))] * 1000, 3) if ticks else 0,
+            "tick max (ms)": round(durations[-1] * 1000, 3) if ticks else 0,
+            "realtime factor": round(simulated_seconds / elapsed, 2),
+            "frames sent": transport.frames,
+            "broadcast JSON bytes/s (simulated)": round(transport.text_bytes / simulated_seconds) if ticks else 0,
+            "broadcast binary bytes/s (simulated)": round(transport.binary_bytes / simulated_seconds) if ticks else 0,
+            "memory per match (bytes)": round(memory_per_match),
+            "matches over by score": sum(1 for result in results if max(result["score_player1"], result["score_player2"]) >= match_handler.MAX_SCORE),
+            "digest": digest,
+        }
+
+    @staticmethod
+    def send_inputs(handler, engine, rng, options, sent_inputs):
+        """
+        Queues the paddle inputs of both players of a match for the next tick.
+        Like the real clients, players only send an input when their held direction changes.
+        """
+        ball_z = engine.ball_state(handler.slot)["position"][1]
+        for side, player in ((LEFT, handler.player1), (RIGHT, handler.player2)):
+            if rng.random() >= options["input_rate"]:
+                continue
+            if options["inputs"] == "random":
+                direction = rng.choice(["up", "down", "none"])
+            else:
+                paddle_z = engine.player_state(handler.slot, side)["position"]
+                if abs(ball_z - paddle_z) < PADDLE_SPEED:
+                    direction = "none"
+                else:
+                    direction = "up" if ball_z > paddle_z else "down"
+            held, seq = sent_inputs.get(player.id, ("none", 0))
+            if direction != held:
+                sent_inputs[player.id] = (direction, seq + 1)
+                handler.event_queue.put_nowait({"event": "player_action", "player_id": player.id,
+                                                "direction": direction, "seq": seq + 1})
@@ -0,0 +1,289 @@
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from django.utils import timezone
+from games.models import Tournament, TournamentParticipant, MatchHistory, MatchPlayerStats, Round, Match
+from games.serializers import MatchSerializer, RoundSerializer
+from users.models import User, UserStats
+from games.blockchain_score_storage.interactions import add_score
+from games.errors import ServiceError
+from games.game_logic.recovery_key_manager import RecoveryKeyManager
+import logging
+
+logger = logging.getLogger(__name__)
+
+def create_match(first_player_id, second_player_id, match_type):
+    """
+    Creates a match in progress between two players.
+
+    :param first_player_id: ID of the first player
+    :param second_player_id: ID of the second player
+    :param match_type: Type of the match ("1v1" or "tournament")
+    :return: Match data as returned by MatchSerializer
+    """
+    if match_type not in dict(Match.MATCH_TYPES):
+        raise ServiceError("Invalid match type.")
+    try:
+        first_player_id = int(first_player_id)
+        second_player_id = int(second_player_id)
+    except (TypeError, ValueError):
+        raise ServiceError("Invalid ID format.")
+    if first_player_id == second_player_id:
+        raise ServiceError("Players must be different.")
+
+    players = User.objects.in_bulk([first_player_id, second_player_id])
+    for player_id in (first_player_id, second_player_id):
+        if player_id not in players:
+            raise ServiceError(f"User with ID {player_id} does not exist.", status_code=404)
+
+    match = Match.objects.create(
+        first_player=players[first_player_id],
+        second_player=players[second_player_id],
+        match_status="in_progress",
+        match_type=match_type,
+        started_at=timezone.now(),
+    )
+    return dict(MatchSerializer(match).data)
+
+@transaction.atomic
+def finish_match(results):
+    """
+    Completes a match: final score and winner, player stats and ratings, match history
+    and detailed match statistics, in a single transaction.
+    Tournament scores are saved to the blockchain once the transaction is committed.
+
+    :param results: match_id, score_player1, score_player2, winner_id,
+        player1_total_hits, player2_total_hits, player1_serves,
+        player2_serves, player1_successful_serves, player2_successful_serves,
+        player1_longest_rally, player2_longest_rally
+    """
+    try:
+        match_id = int(results["match_id"])
+        winner_id = int(results["winner_id"])
+        score_player1 = int(results["score_player1"])
+        score_player2 = int(results["score_player2"])
+    except (TypeError, ValueError):
+        raise ServiceError("Invalid data format.")
+
+    # The match row is locked, so a match can't be completed twice
+    try:
+        match = (Match.objects.select_for_update(of=("self",))
+                 .select_related("first_player", "second_player").get(id=match_id))
+    except Match.DoesNotExist:
+        raise ServiceError("Match not found.", status_code=404)
+
+    if match.match_status == "completed":
+        raise ServiceError("Match has already been completed.")
+
+    player1 = match.first_player
+    player2 = match.second_player
+    if winner_id == player1.id:
+        match.winner = player1
+    elif winner_id == player2.id:
+        match.winner = player2
+    else:
+        raise ServiceError("Invalid winner ID.")
+
+    if match.match_type == "tournament":
+        try:
+            tournament = Round.objects.select_related("tournament").get(match=match).tournament
+        except Round.DoesNotExist:
+            raise ServiceError("Round not found.", status_code=404)
+        transaction.on_commit(lambda: save_scores_to_blockchain(
+            tournament, match_id, ((player1.id, score_player1), (player2.id, score_player2))))
+
+    match.score_player1 = score_player1
+    match.score_player2 = score_player2
+    match.finished_at = timezone.now()
+    match.match_status = "completed"
+    match.save()
+
+    # Update individual player stats, ratings are updated from the ratings before the match
+    player1_stats = get_player_stats(player1)
+    player2_stats = get_player_stats(player2)
+    player1_rating = player1_stats.rating
+    update_player_stats(player1_stats, score_player1, score_player2, winner_id == player1.id, player2_stats.rating)
+    update_player_stats(player2_stats, score_player2, score_player1, winner_id == player2.id, player1_rating)
+
+    MatchHistory.objects.bulk_create([
+        MatchHistory(user=player1, match=match),
+        MatchHistory(user=player2, match=match),
+    ])
+
+    MatchPlayerStats.objects.bulk_create([
+        MatchPlayerStats(
+            match=match,
+            player=player,
+            points_scored=points_scored,
+            total_hits=results.get(f"{prefix}_total_hits", 0),
+            serves=results.get(f"{prefix}_serves", 0),
+            successful_serves=results.get(f"{prefix}_successful_serves", 0),
+            longest_rally=results.get(f"{prefix}_longest_rally", 0),
+        )
+        for player, points_scored, prefix in ((player1, score_player1, "player1"), (player2, score_player2, "player2"))
+    ])
+    return {"detail": "Match has been successfully completed."}
+
+def save_scores_to_blockchain(tournament, match_id, scores):
+    try:
+        for user_id, score in scores:
+            add_score(contract_address=tournament.smartContractAddr, match_id=match_id, user_id=user_id, score=score)
+    except Exception as e:
+        logger.error(f"Error saving match results to the blockchain: {e}")
+
+def get_player_stats(player):
+    """
+    Returns the stats of a player, locked until the end of the transaction.
+    """
+    stats, _ = UserStats.objects.select_for_update().get_or_create(user=player)
+    return stats
+
+def update_player_stats(user_stats, points_scored, points_against, is_winner, opponent_rating):
+    """
+    Updates UserStats (rating included) for a given player based on match results.
+    """
+    user_stats.update_rating(opponent_rating, is_winner)
+    user_stats.record_match(
+        points_scored=points_scored,
+        points_against=points_against,
+        is_win=is_winner,
+    )
+
+def create_round(match_id, tournament_id, round_number):
+    """
+    Adds a match to a round of a tournament.
+    :return: Round data as returned by RoundSerializer
+    """
+    try:
+        match_id = int(match_id)
+        tournament_id = int(tournament_id)
+        round_number = int(round_number)
+    except (TypeError, ValueError):
+        raise ServiceError("Invalid ID format.")
+    if round_number <= 0:
+        raise ServiceError("Round number must be a positive integer.")
+    if not Match.objects.filter(id=match_id).exists():
+        raise ServiceError("Match not found.", status_code=404)
+    if not Tournament.objects.filter(id=tournament_id).exists():
+        raise ServiceError("Tournament not found.", status_code=404)
+    if Round.objects.filter(match_id=match_id).exists():
+        raise ServiceError("The match already belongs to a round.")
+
+    round_match = Round.objects.create(match_id=match_id, tournament_id=tournament_id, round_number=round_number)
+    return dict(RoundSerializer(round_match).data)
+
+@transaction.atomic
+def create_round_matches(tournament_id, round_number, pairs):
+    """
+    Creates the matches of a tournament round and their rounds, with one bulk insert each, in a single transaction.
+    Invalid pairs are reported and don't prevent the other matches from being created.
+
+    :param pairs: list of (first player ID, second player ID)
+    :return: {"results": one result per pair, in order: {"match": match data as returned by MatchSerializer}
+        or {"error": reason}}
+    """
+    try:
+        tournament_id = int(tournament_id)
+        round_number = int(round_number)
+    except (TypeError, ValueError):
+        raise ServiceError("Invalid ID format.")
+    if round_number <= 0:
+        raise ServiceError("Round number must be a positive integer.")
+    if not Tournament.objects.filter(id=tournament_id).exists():
+        raise ServiceError("Tournament not found.", status_code=404)
+
+    player_ids = []
+    for pair in pairs:
+        try:
+            player_ids.append(tuple(int(player_id) for player_id in pair) if len(pair) == 2 else None)
+        except (TypeError, ValueError):
+            player_ids.append(None)
+    players = User.objects.in_bulk({player_id for pair in player_ids if pair for player_id in pair})
+
+    results = []
+    matches = []
+    playing = set()
+    started_at = timezone.now()
+    for pair in player_ids:
+        if pair is None:
+            results.append({"error": "Invalid ID format."})
+        elif pair[0] == pair[1]:
+            results.append({"error": "Players must be different."})
+        elif any(player_id not in players for player_id in pair):
+            missing = next(player_id for player_id in pair if player_id not in players)
+            results.append({"error": f"User with ID {missing} does not exist."})
+        elif any(player_id in playing for player_id in pair):
+            results.append({"error": "A player already has a match in this round."})
+        else:
+            playing.update(pair)
+            match = Match(first_player=players[pair[0]], second_player=players[pair[1]], match_status="in_progress",
+                          match_type="tournament", started_at=started_at)
+            matches.append(match)
+            results.append(match)
+
+    Match.objects.bulk_create(matches)
+    Round.objects.bulk_create([Round(match=match, tournament_id=tournament_id, round_number=round_number)
+                               for match in matches])
+    return {"results": [{"match": dict(MatchSerializer(result).data)} if isinstance(result, Match) else result
+                        for result in results]}
+
+@transaction.atomic
+def update_tournament_status(tournament_id, tournament_status, winner_id=None):
+    """
+    Updates the status of a tournament, and the tournament wins of the winner once completed.
+    The tournament recovery keys of the participants of a completed tournament are deleted once committed.
+    """
+    if tournament_status not in ['in_progress', 'completed']:
+        raise ServiceError("Invalid status. Must be 'in_progress' or 'completed'.")
+    try:
+        tournament = Tournament.objects.select_for_update().get(id=tournament_id)
+    except (Tournament.DoesNotExist, TypeError, ValueError):
+        raise ServiceError("Tournament not found.", status_code=404)
+
+    if tournament_status == 'completed':
+        try:
+            winner_stats = UserStats.objects.select_for_update().get(user_id=winner_id)
+        except (UserStats.DoesNotExist, TypeError, ValueError):
+            raise ServiceError("Winner not found.", status_code=404)
+        winner_stats.record_tournament_win()
+        finished_participants = list(TournamentParticipant.objects.filter(tournament=tournament)
+                                     .values_list("user_id", flat=True))
+        transaction.on_commit(lambda: delete_tournament_recovery_keys(finished_participants))
+
+    tournament.status = tournament_status
+    tournament.save()
+    return {"message": "Tournament status updated successfully."}
+
+@transaction.atomic
+def abandon_tournament(tournament_id):
+    """
+    Closes a tournament whose game worker died: its unfinished matches and the tournament are completed
+    without a winner. The tournament recovery keys of the participants are deleted once committed.
+    :return: IDs of the matches which were abandoned.
+    """
+    try:
+        tournament = Tournament.objects.select_for_update().get(id=tournament_id)
+    except (Tournament.DoesNotExist, TypeError, ValueError):
+        raise ServiceError("Tournament not found.", status_code=404)
+    if tournament.status == 'completed':
+        raise ServiceError("Tournament has already been completed.")
+
+    abandoned = list(Match.objects.filter(round__tournament=tournament, match_status='in_progress')
+                     .values_list("id", flat=True))
+    Match.objects.filter(id__in=abandoned).update(match_status='completed', finished_at=timezone.now())
+    participants = list(TournamentParticipant.objects.filter(tournament=tournament)
+                        .values_list("user_id", flat=True))
+    transaction.on_commit(lambda: delete_tournament_recovery_keys(participants))
+
+    tournament.status = 'completed'
+    tournament.save()
+    return {"abandoned_matches": abandoned}
+
+def delete_tournament_recovery_keys(user_ids):
+    """
+    Deletes the tournament recovery keys of users, e.g. the participants of a finished tournament.
+    """
+    try:
+        for user_id in user_ids:
+            async_to_sync(RecoveryKeyManager.delete_tournament_recovery_key)(user_id)
+    except Exception as e:
+        logger.error(f"Error deleting tournament recovery keys: {e}")
@@ -1,3 +1,557 @@
-from django.test import TestCase
+import asyncio
+import io
+import random
+import tempfile
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from games import services
+from games.errors import ServiceError
+from games.models import Match, MatchHistory, MatchPlayerStats, Round, Tournament, TournamentParticipant
+from games.game_logic import game_worker, physics_engine, matchmaker, matchmaking_queue, tournament_handler
+from games.game_logic.bracket import TournamentBracket
+from games.game_logic.game_worker import (GameWorker, LIVE_TOURNAMENTS_KEY, RESUMABLE_MATCHES_KEY,
+                                          match_owner_key, tournament_owner_key)
+from games.game_logic.matchmaker import Matchmaker
+from games.game_logic.match_recorder import read_recording, RECORD_GOAL
+from games.game_logic.match_replay import ReplayHandler
+from games.game_logic.matchmaking_queue import MatchmakingQueue
+from games.game_logic.recovery_key_manager import RecoveryKeyManager
+from games.game_logic.tournament_handler import TournamentHandler
+from games.game_logic.utils import determine_number_of_participants_including_bye
+from games.game_logic.physics_engine import create_physics_engine, PADDLE_SPEED, LEFT, RIGHT
+from games.management.commands import simulate_matches
+from users.models import User, UserStats
 
-# Create your tests here.
\ No newline at end of file
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def simulate(engine_name, **options):
+    """
+    Runs seeded matches (simulate_matches) on an engine.
+    :return: finish payloads of the matches, ordered by match id.
+    """
+    transports = []
+
+    class RecordingTransport(simulate_matches.StubTransport):
+        def __init__(self):
+            super().__init__()
+            transports.append(self)
+
+    with mock.patch.object(simulate_matches, "StubTransport", RecordingTransport), \
+            mock.patch.object(physics_engine, "_engine", None), override_settings():
+        call_command("simulate_matches", engine=engine_name, stdout=io.StringIO(), **options)
+    return sorted(transports[0].results, key=lambda result: result["match_id"])
+
+
+class PhysicsEngineParityTests(SimpleTestCase):
+    """
+    The numpy engine must stay bit-identical to the python engine: same scores, hits and rally stats.
+    """
+
+    def test_same_results_on_both_engines(self):
+        for seed in (1, 2):
+            with self.subTest(seed=seed):
+                options = {"matches": 4, "ticks": 12000, "seed": seed, "inputs": "random"}
+                python_results = simulate("python", **options)
+                numpy_results = simulate("numpy", **options)
+                self.assertEqual(len(python_results), 4)
+                # Matches played to the end, with paddle hits, so every stat is compared
+                self.assertTrue(all(max(result["score_player1"], result["score_player2"]) >= 11
+                                    for result in python_results))
+                self.assertGreater(sum(result["player1_total_hits"] + result["player2_total_hits"]
+                                       for result in python_results), 0)
+                self.assertEqual(python_results, numpy_results)
+
+    @staticmethod
+    def play(engine, slot, ticks):
+        """
+        Steps a match with both paddles following the ball, so the ball is hit and the rallies last.
+        :return: (tick, side) of each goal.
+        """
+        goals = []
+        for tick in range(ticks):
+            ball_z = engine.ball_state(slot)["position"][1]
+            for side in (LEFT, RIGHT):
+                paddle_z = engine.player_state(slot, side)["position"]
+                if abs(ball_z - paddle_z) > PADDLE_SPEED:
+                    engine.move_paddle(slot, side, "up" if ball_z > paddle_z else "down")
+            for _, side in engine.step():
+                goals.append((tick, side))
+                engine.end_kick_off(slot)
+        return goals
+
+    def test_restore_match_same_state_on_both_engines(self):
+        random.seed(7)
+        source = create_physics_engine("python")
+        slot = source.add_match()
+        source.set_running(slot, True)
+        source.end_kick_off(slot)
+        self.play(source, slot, 3000)
+        ball = source.ball_state(slot)
+        players = [source.player_state(slot, LEFT), source.player_state(slot, RIGHT)]
+
+        states = []
+        for engine_name in ("python", "numpy"):
+            engine = create_physics_engine(engine_name)
+            engine.add_match()  # the restored match isn't in the first slot
+            restored = engine.add_match()
+            engine.restore_match(restored, ball, players)
+            engine.set_running(restored, True)
+            self.assertEqual(engine.ball_state(restored), ball)
+            self.assertEqual([engine.player_state(restored, LEFT), engine.player_state(restored, RIGHT)], players)
+
+            # Both engines keep stepping the restored match the same way, serves included
+            random.seed(11)
+            goals = self.play(engine, restored, 6000)
+            states.append((goals, engine.ball_state(restored),
+                           [engine.player_state(restored, LEFT), engine.player_state(restored, RIGHT)]))
+        self.assertTrue(states[0][0], "no goal scored after the restore")
+        self.assertGreater(states[0][2][LEFT]["total_hits"], players[LEFT]["total_hits"])
+        self.assertEqual(states[0], states[1])
+
+
+class ScoringReplayHandler(ReplayHandler):
+    """
+    Keeps the hits of the replayed match, read before its slot is freed.
+    """
+
+    async def _end_match(self, winner):
+        self.hits = self.engine.hits(self.slot)
+        await super()._end_match(winner)
+
+
+class MatchReplayTests(SimpleTestCase):
+    """
+    A recorded match (MatchRecorder) replayed through the physics step (ReplayHandler) ends like the match.
+    """
+
+    def setUp(self):
+        recordings_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(recordings_dir.cleanup)
+        patch = override_settings(GAME_RECORDINGS_DIR=recordings_dir.name)
+        patch.enable()
+        self.addCleanup(patch.disable)
+
+    async def replay(self, header, records, engine_name):
+        async def send(text, binary=None):
+            pass
+        handler = ScoringReplayHandler(header, records, send, engine_name)
+        return await handler.play(), handler.hits
+
+    def test_replay_matches_recording(self):
+        results = simulate("python", matches=3, ticks=12000, seed=5, inputs="random", record=True)
+        self.assertEqual(len(results), 3)
+        for result in results:
+            header, records = read_recording(result["match_id"])
+            for engine_name in ("python", "numpy"):
+                with self.subTest(match=result["match_id"], engine=engine_name):
+                    replayed, hits = asyncio.run(self.replay(header, records, engine_name))
+                    self.assertFalse(replayed["diverged"])
+                    self.assertEqual(replayed["winner"], result["winner_id"])
+                    self.assertEqual(replayed["score"], f"{result['score_player1']}-{result['score_player2']}")
+                    self.assertEqual(hits, (result["player1_total_hits"], result["player2_total_hits"]))
+
+    def test_replay_detects_divergence(self):
+        results = simulate("python", matches=1, ticks=12000, seed=5, inputs="random", record=True)
+        header, records = read_recording(results[0]["match_id"])
+        goal = next(index for index, record in enumerate(records) if record[1] == RECORD_GOAL)
+        replayed, _ = asyncio.run(self.replay(header, records[:goal] + records[goal + 1:], "python"))
+        self.assertTrue(replayed["diverged"])
+
+
+@skipUnless(fakeredis, "fakeredis isn't installed")
+class MatchmakingQueueTests(SimpleTestCase):
+    """
+    Pairing script of the queue (POP_PAIR_SCRIPT), run against fakeredis with a fake clock.
+    """
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.Mock(time=lambda: self.now)
+        for patch in (mock.patch.object(RecoveryKeyManager, "_redis", fakeredis.FakeAsyncRedis(decode_responses=True)),
+                      mock.patch.object(matchmaking_queue, "time", clock)):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.queue = MatchmakingQueue()
+
+    async def add_players(self, *players):
+        """
+        :param players: (player id, rating, seconds waited so far)
+        """
+        for player_id, rating, waited in players:
+            await self.queue.add_player(player_id, rating, enqueued_at=self.now - waited)
+
+    async def test_out_of_range_players_paired_once_the_window_widened(self):
+        await self.add_players(("1", 1000, 0), ("2", 1250, 0))
+        self.assertIsNone(await self.queue.get_next_match())
+
+        self.now += 5  # window of 100 + 5 * 20 = 200
+        self.assertIsNone(await self.queue.get_next_match())
+
+        self.now += 3  # window of 260
+        player1, player2 = await self.queue.get_next_match()
+        self.assertEqual({player1.player_id, player2.player_id}, {"1", "2"})
+        self.assertEqual(await self.queue.get_queue(), [])
+
+    async def test_window_is_capped(self):
+        await self.add_players(("1", 1000, 0), ("2", 2001, 0))
+        self.now += 3600
+        self.assertIsNone(await self.queue.get_next_match())
+
+    async def test_closest_opponent_chosen(self):
+        await self.add_players(("1", 1000, 10), ("2", 1090, 5), ("3", 1030, 4), ("4", 955, 3))
+        player1, player2 = await self.queue.get_next_match()
+        # The longest waiting player looks for its opponent, among both lower and higher ratings
+        self.assertEqual((player1.player_id, player1.rating, player1.enqueued_at), ("1", 1000, self.now - 10))
+        self.assertEqual((player2.player_id, player2.rating), ("3", 1030))
+
+        metrics = await self.queue.get_metrics()
+        self.assertEqual(metrics["matches"], 1)
+        self.assertEqual(metrics["waiting"], 2)
+        self.assertEqual(metrics["avg_rating_difference"], 30)
+        self.assertEqual(metrics["avg_time_to_match"], 7)
+
+    async def test_player_never_popped_twice(self):
+        await self.add_players(*[(str(player_id), 1000 + 10 * player_id, player_id) for player_id in range(20)])
+        # Concurrent attempts, like several matchmakers sharing the queue
+        pairs = [pair for pair in await asyncio.gather(*(self.queue.get_next_match() for _ in range(15))) if pair]
+        players = [player.player_id for pair in pairs for player in pair]
+        self.assertEqual(len(pairs), 10)
+        self.assertEqual(len(players), len(set(players)))
+        self.assertEqual(await self.queue.get_queue(), [])
+        self.assertFalse(await self.queue.is_player_in_queue("0"))
+
+    async def test_requeued_players_keep_their_enqueue_time(self):
+        await self.add_players(("1", 1000, 30), ("2", 1010, 20), ("3", 1500, 10))
+        self.now += 1
+
+        async def are_online(player_ids):
+            return {"1"}
+
+        async def noop(*args, **kwargs):
+            return None
+
+        with mock.patch.object(matchmaker.UserPresence, "are_online", are_online), \
+                mock.patch.object(matchmaker, "disconnect_user", noop):
+            self.assertEqual(await Matchmaker().match_players(), 0)
+
+        # The online player is back in the queue ahead of the players who joined after it, the offline one is gone
+        self.assertEqual(await self.queue.get_queue(), ["1", "3"])
+        redis = await RecoveryKeyManager.get_redis()
+        self.assertEqual(await redis.zscore(self.queue.queue_key, "1"), self.now - 31)
+
+        # Adding a player already in the queue doesn't reset its enqueue time
+        await self.queue.add_player("1", 1000)
+        self.assertEqual(await redis.zscore(self.queue.queue_key, "1"), self.now - 31)
+
+
+class FinishMatchServiceTests(TestCase):
+    """
+    Match lifecycle of the service layer, behind MatchStartAPIView and MatchEndAPIView.
+    """
+
+    def setUp(self):
+        self.player1 = User.objects.create(username="player1", email="player1@example.com")
+        self.player2 = User.objects.create(username="player2", email="player2@example.com")
+        UserStats.objects.filter(user=self.player1).update(rating=1200)
+        UserStats.objects.filter(user=self.player2).update(rating=1000)
+
+    def create_match(self, match_type="1v1"):
+        return services.create_match(self.player1.id, self.player2.id, match_type)["id"]
+
+    def results(self, match_id, winner, score_player1, score_player2):
+        return {
+            "match_id": match_id, "winner_id": winner.id, "score_player1": score_player1,
+            "score_player2": score_player2, "player1_total_hits": 12, "player2_total_hits": 9,
+            "player1_serves": 6, "player2_serves": 5, "player1_successful_serves": 6,
+            "player2_successful_serves": 4, "player1_longest_rally": 4, "player2_longest_rally": 4,
+        }
+
+    def test_create_match_rejects_invalid_players(self):
+        with self.assertRaises(ServiceError) as error:
+            services.create_match(self.player1.id, self.player1.id, "1v1")
+        self.assertEqual(error.exception.status_code, 400)
+        with self.assertRaises(ServiceError) as error:
+            services.create_match(self.player1.id, 999999, "1v1")
+        self.assertEqual(error.exception.status_code, 404)
+        self.assertFalse(Match.objects.exists())
+
+    def test_finish_match_twice(self):
+        match_id = self.create_match()
+        services.finish_match(self.results(match_id, self.player1, 11, 5))
+        with self.assertRaisesMessage(ServiceError, "Match has already been completed."):
+            services.finish_match(self.results(match_id, self.player2, 3, 11))
+
+        match = Match.objects.get(id=match_id)
+        self.assertEqual((match.winner, match.score_player1, match.score_player2), (self.player1, 11, 5))
+        self.assertEqual(MatchHistory.objects.filter(match=match).count(), 2)
+        self.assertEqual(MatchPlayerStats.objects.filter(match=match).count(), 2)
+        self.assertEqual(UserStats.objects.get(user=self.player1).total_matches, 1)
+
+    def test_invalid_winner(self):
+        match_id = self.create_match()
+        outsider = User.objects.create(username="outsider", email="outsider@example.com")
+        with self.assertRaisesMessage(ServiceError, "Invalid winner ID."):
+            services.finish_match(self.results(match_id, outsider, 11, 5))
+
+        self.assertEqual(Match.objects.get(id=match_id).match_status, "in_progress")
+        self.assertFalse(MatchHistory.objects.exists())
+        self.assertEqual(UserStats.objects.get(user=self.player1).total_matches, 0)
+
+    def test_elo_from_pre_match_ratings(self):
+        match_id = self.create_match()
+        services.finish_match(self.results(match_id, self.player2, 9, 11))
+
+        # Both updates use the ratings before the match (1200 and 1000): the underdog wins
+        # round(32 * (1 - 1 / (1 + 10 ** (200 / 400)))) = 24 points, and the favorite loses as many
+        self.assertEqual(UserStats.objects.get(user=self.player1).rating, 1176)
+        self.assertEqual(UserStats.objects.get(user=self.player2).rating, 1024)
+
+    def test_tournament_scores_saved_to_blockchain_on_commit(self):
+        tournament = Tournament.objects.create(title="Cup", creator=self.player1, smartContractAddr="0x1")
+        match_id = self.create_match("tournament")
+        Round.objects.create(match_id=match_id, tournament=tournament, round_number=1)
+
+        with mock.patch.object(services, "add_score") as add_score:
+            with self.captureOnCommitCallbacks() as callbacks:
+                services.finish_match(self.results(match_id, self.player1, 11, 7))
+            add_score.assert_not_called()
+            self.assertEqual(len(callbacks), 1)
+
+            callbacks[0]()
+            add_score.assert_has_calls([
+                mock.call(contract_address="0x1", match_id=match_id, user_id=self.player1.id, score=11),
+                mock.call(contract_address="0x1", match_id=match_id, user_id=self.player2.id, score=7),
+            ])
+
+    def test_one_versus_one_scores_not_saved_to_blockchain(self):
+        match_id = self.create_match()
+        with self.captureOnCommitCallbacks() as callbacks:
+            services.finish_match(self.results(match_id, self.player1, 11, 7))
+        self.assertEqual(callbacks, [])
+
+    def test_completed_tournament_recovery_keys_deleted_on_commit(self):
+        tournament = Tournament.objects.create(title="Cup", creator=self.player1)
+        for player in (self.player1, self.player2):
+            TournamentParticipant.objects.create(tournament=tournament, user=player)
+
+        with mock.patch.object(services, "delete_tournament_recovery_keys") as delete_keys:
+            with self.captureOnCommitCallbacks(execute=True):
+                services.update_tournament_status(tournament.id, "completed", self.player2.id)
+        delete_keys.assert_called_once()
+        self.assertCountEqual(delete_keys.call_args.args[0], [self.player1.id, self.player2.id])
+        self.assertEqual(UserStats.objects.get(user=self.player2).tournaments_won, 1)
+
+    def test_abandon_tournament(self):
+        tournament = Tournament.objects.create(title="Cup", creator=self.player1, status="in_progress")
+        finished_id, stranded_id = self.create_match("tournament"), self.create_match("tournament")
+        for round_number, match_id in enumerate((finished_id, stranded_id), start=1):
+            Round.objects.create(match_id=match_id, tournament=tournament, round_number=round_number)
+        Match.objects.filter(id=finished_id).update(match_status="completed", winner=self.player1)
+
+        self.assertEqual(services.abandon_tournament(tournament.id), {"abandoned_matches": [stranded_id]})
+        stranded = Match.objects.get(id=stranded_id)
+        self.assertEqual((stranded.match_status, stranded.winner), ("completed", None))
+        self.assertEqual(Tournament.objects.get(id=tournament.id).status, "completed")
+        with self.assertRaisesMessage(ServiceError, "Tournament has already been completed."):
+            services.abandon_tournament(tournament.id)
+
+
+@skipUnless(fakeredis, "fakeredis isn't installed")
+class GameWorkerRecoveryTests(SimpleTestCase):
+    """
+    What another worker does with the matches and tournaments of a dead worker, against fakeredis.
+    """
+
+    def setUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        for patch in (mock.patch.object(RecoveryKeyManager, "_redis", self.redis),
+                      mock.patch.object(RecoveryKeyManager, "_delete_recovery_key_script", None),
+                      mock.patch.multiple(GameWorker, channel_name="game_worker.alive", _matches=set(),
+                                          _handlers={}, _tournaments=set(), _scripts={}),
+                      mock.patch.object(GameWorker, "get_channel_name", mock.AsyncMock(return_value="game_worker.alive"))):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_orphaned_tournament_closed_once(self):
+        await self.redis.sadd(LIVE_TOURNAMENTS_KEY, "7", "8")
+        await self.redis.set(tournament_owner_key("8"), "game_worker.other")
+        with mock.patch.object(GameWorker, "abandon_tournament", mock.AsyncMock()) as abandon:
+            await GameWorker.abandon_orphaned_tournaments()
+            await GameWorker.abandon_orphaned_tournaments()
+            await asyncio.sleep(0)
+        abandon.assert_awaited_once_with("7")
+        self.assertEqual(await self.redis.get(tournament_owner_key("7")), "game_worker.alive")
+
+    async def test_abandon_tournament(self):
+        await RecoveryKeyManager.create_recovery_key("match_12", 1, "player1", 2, "player2", None, None)
+        await RecoveryKeyManager.create_tournament_bracket_recovery_key(7, "{}")
+        self.assertTrue(await GameWorker.host_tournament(7))
+        with mock.patch.object(game_worker, "abandon_tournament_api", mock.AsyncMock(return_value=[12])), \
+                mock.patch.object(game_worker, "send_group_message", mock.AsyncMock()) as send_group_message:
+            await GameWorker.abandon_tournament("7")
+
+        send_group_message.assert_awaited_once_with("tournament_7", {"event": "tournament_cancelled"})
+        self.assertIsNone(await RecoveryKeyManager.get_active_match(1))
+        self.assertIsNone(await RecoveryKeyManager.get_tournament_bracket_recovery_key(7))
+        self.assertFalse(await self.redis.sismember(LIVE_TOURNAMENTS_KEY, "7"))
+        self.assertIsNone(await self.redis.get(tournament_owner_key("7")))
+
+    async def test_orphaned_match_without_checkpoint_not_restarted(self):
+        await RecoveryKeyManager.create_recovery_key("match_12", 1, "player1", 2, "player2", None, None)
+        await self.redis.sadd(RESUMABLE_MATCHES_KEY, "match_12")
+        self.assertTrue(await GameWorker.host_match("match_12"))
+        with mock.patch.object(game_worker, "send_error_to_players", mock.AsyncMock()) as send_error, \
+                mock.patch.object(game_worker, "MatchHandler") as match_handler:
+            await GameWorker.resume_match("match_12")
+
+        match_handler.assert_not_called()
+        send_error.assert_awaited_once()
+        self.assertIsNone(await RecoveryKeyManager.get_active_match(1))
+        self.assertFalse(await self.redis.sismember(RESUMABLE_MATCHES_KEY, "match_12"))
+        self.assertIsNone(await self.redis.get(match_owner_key("match_12")))
+
+
+def participant(player_id):
+    return {"id": player_id, "username": f"player{player_id}", "alias": f"alias{player_id}", "avatar": None}
+
+
+class TournamentBracketTests(SimpleTestCase):
+    """
+    Bracket tree of the tournaments: a match is only started once both its feeders are resolved.
+    """
+
+    def setUp(self):
+        self.players = [participant(player_id) for player_id in range(1, 9)]
+
+    def test_rounds(self):
+        bracket = TournamentBracket(8)
+        self.assertEqual([len(matches) for matches in bracket.rounds], [4, 2, 1])
+        self.assertEqual([match.bracket_index for matches in bracket.rounds for match in matches], list(range(7)))
+        self.assertIs(bracket.next_match(bracket.rounds[0][3]), bracket.rounds[1][1])
+        self.assertIs(bracket.next_match(bracket.rounds[1][0]), bracket.final)
+        self.assertIsNone(bracket.next_match(bracket.final))
+
+    def test_next_match_starts_once_both_feeders_resolved(self):
+        bracket = TournamentBracket(4)
+        first, second = bracket.rounds[0]
+        first.players, second.players = self.players[0:2], self.players[2:4]
+
+        # The winner of the second feeder is player2 of the final, whichever feeder ends first
+        self.assertIsNone(bracket.resolve(second, self.players[3], "4-11"))
+        self.assertEqual(bracket.final.players, [None, self.players[3]])
+        entry = bracket.final.entry
+        self.assertEqual((entry["status"], entry["player1_username"], entry["player2_id"]), ("pending", "TBD", 4))
+
+        self.assertIs(bracket.resolve(first, self.players[0], "11-2"), bracket.final)
+        self.assertEqual(bracket.final.players, [self.players[0], self.players[3]])
+        self.assertIsNone(bracket.resolve(bracket.final, self.players[0], "11-9"))
+
+    def test_odd_player_count_with_bye(self):
+        bracket = TournamentBracket(determine_number_of_participants_including_bye(3))
+        pair, bye = bracket.rounds[0]
+        pair.players, bye.players = self.players[0:2], [self.players[2], None]
+        bracket.set_match(pair, {"id": 101, "match_status": "in_progress"})
+        bye.entry = TournamentBracket.make_entry(bye, "completed")
+        self.assertEqual((bye.entry["player2_username"], bye.entry["player2_id"]), ("BYE", None))
+
+        # The bye is a walkover: its player waits in the final for the winner of the other match
+        self.assertIsNone(bracket.resolve(bye, self.players[2]))
+        self.assertIs(bracket.resolve(pair, self.players[1], "7-11"), bracket.final)
+        self.assertEqual(bracket.final.players, [self.players[1], self.players[2]])
+        self.assertEqual((pair.entry["winner"], pair.entry["score_player1"], pair.entry["score_player2"]), (2, "7", "11"))
+
+    def test_nobody_advances_from_failed_match(self):
+        bracket = TournamentBracket(4)
+        first, second = bracket.rounds[0]
+        first.players, second.players = self.players[0:2], self.players[2:4]
+        bracket.resolve(first, None)
+        final = bracket.resolve(second, self.players[2], "11-0")
+        self.assertEqual(final.players, [None, self.players[2]])
+
+    def test_matches_found_by_id(self):
+        bracket = TournamentBracket(4)
+        match = bracket.rounds[0][1]
+        match.players = self.players[0:2]
+        bracket.set_match(match, {"id": 101, "match_status": "in_progress"})
+        self.assertIs(bracket.get(101), match)
+        self.assertIsNone(bracket.get(102))
+        self.assertEqual(bracket.to_list(), [{"round": 1, "matches": [match.entry]}, {"round": 2, "matches": []}])
+
+
+class TournamentHandlerBracketTests(SimpleTestCase):
+    """
+    Walkovers, failed match creations and unknown results in the tournament handler, with its I/O mocked.
+    """
+
+    def setUp(self):
+        self.players = [participant(player_id) for player_id in range(1, 4)]
+        self.next_match_id = 100
+        self.create_matches = mock.AsyncMock(side_effect=self.created_matches)
+        for patch in (mock.patch.object(tournament_handler, "create_tournament_matches", self.create_matches),
+                      mock.patch.object(tournament_handler, "send_group_message", mock.AsyncMock()),
+                      mock.patch.object(tournament_handler, "send_error_to_players", mock.AsyncMock()),
+                      mock.patch.object(RecoveryKeyManager, "create_tournament_bracket_recovery_key", mock.AsyncMock()),
+                      mock.patch.object(TournamentHandler, "notify_incoming_matches", mock.AsyncMock())):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.failures = 0
+
+    async def created_matches(self, matches, tournament_id, round_number):
+        """
+        Stands in for create_tournament_matches: the first self.failures matches can't be created.
+        """
+        results, failed = [], []
+        for match in matches:
+            if self.failures:
+                self.failures -= 1
+                results.append(None)
+                failed.append((match["player1"], match["player2"], "error"))
+            else:
+                self.next_match_id += 1
+                results.append({"id": self.next_match_id, "match_status": "in_progress"})
+        return results, failed
+
+    async def start_tournament(self):
+        """
+        Starts a tournament of 3 players: players 1 and 2 meet, player 3 has a bye.
+        """
+        handler = TournamentHandler(7, "tournament_7")
+        handler.winner = asyncio.get_running_loop().create_future()
+        handler.bracket = TournamentBracket(4)
+        pair, bye = handler.bracket.rounds[0]
+        pair.players, bye.players = self.players[0:2], [self.players[2], None]
+        await handler.start_matches(handler.bracket.rounds[0], full_bracket=True)
+        return handler
+
+    async def test_final_starts_once_both_feeders_resolved(self):
+        handler = await self.start_tournament()
+        self.create_matches.assert_awaited_once()
+        self.assertEqual(handler.bracket.final.players, [None, self.players[2]])
+
+        await handler.finish_bracket_match(101, "2", "5-11")
+        self.assertEqual(self.create_matches.await_count, 2)
+        self.assertEqual(self.create_matches.await_args.args[0], [{"player1": self.players[1], "player2": self.players[2]}])
+        self.assertIs(handler.bracket.get(102), handler.bracket.final)
+
+        await handler.finish_bracket_match(102, "3", "9-11")
+        self.assertEqual(handler.winner.result(), self.players[2])
+
+    async def test_unknown_match_result_ignored(self):
+        handler = await self.start_tournament()
+        await handler.finish_bracket_match(999, "1", "11-0")
+        self.assertFalse(handler.bracket.rounds[0][0].resolved)
+        self.assertEqual(self.create_matches.await_count, 1)
+
+    async def test_failed_match_creation(self):
+        self.failures = 1
+        handler = await self.start_tournament()
+
+        # Nobody advances from the failed match: the final is a walkover for the player with the bye
+        tournament_handler.send_error_to_players.assert_awaited_once_with("1", "2", "Failed to create your tournament match.")
+        self.assertEqual(handler.winner.result(), self.players[2])
+        self.assertEqual(handler.bracket.final.players, [None, self.players[2]])
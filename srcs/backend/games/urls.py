@@ -4,7 +4,8 @@ from .views.recovery_views import CheckActiveMatchAPIView, CheckActiveTournament
 from .views.tournament_views import (CreateTournamentAPIView, JoinTournamentAPIView, InviteTournamentAPIView, 
                     StartTournamentAPIView, CancelTournamentAPIView, SearchTournamentAPIView,
                     GetOnlineFriendsAPIView, LeaveTournamentAPIView, 
-                    InvitationListTournamentAPIView, CreateMatchRoundAPIView, TournamentUpdateStatusAPIView)
+                    InvitationListTournamentAPIView, CreateMatchRoundAPIView, CreateRoundMatchesAPIView,
+                    TournamentUpdateStatusAPIView, AbandonTournamentAPIView)
 from .views.stats_views import (UserMatchHistoryAPIView, MatchStatsAPIView)
 
 urlpatterns = [
@@ -25,7 +26,9 @@ urlpatterns = [
     path('tournament/cancel/', CancelTournamentAPIView.as_view(), name='cancel-tournament'),
     path('tournament/search/', SearchTournamentAPIView.as_view(), name='search-tournament'),
     path('tournament/round/create-match/', CreateMatchRoundAPIView.as_view(), name='create-match-round'),
+    path('tournament/round/create-matches/', CreateRoundMatchesAPIView.as_view(), name='create-round-matches'),
     path('tournament/update-status/', TournamentUpdateStatusAPIView.as_view(), name='create-match-round'),
+    path('tournament/abandon/', AbandonTournamentAPIView.as_view(), name='abandon-tournament'),
     path('check-active-match/', CheckActiveMatchAPIView.as_view(), name='check-active-match'),
     path('check-active-tournament/', CheckActiveTournamentAPIView.as_view(), name='check-active-tournament')
 ]
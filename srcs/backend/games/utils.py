@@ -16,3 +16,10 @@ def validate_required_fields(data, required_fields):
         )
     return None
 
+
+
+def service_error_response(error):
+    """
+    Converts an error of the service layer (games.services.ServiceError) into a response.
+    """
+    return Response({"detail": error.detail}, status=error.status_code)
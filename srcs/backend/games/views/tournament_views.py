@@ -9,10 +9,12 @@ from games.models import Tournament, TournamentParticipant, TournamentInvitation
 from users.models import User, Friend, UserStats
 from django.utils import timezone
 from django.core.cache import cache
-from games.serializers import TournamentSerializer, InvitationTournamentSerializer, RoundSerializer
+from games.serializers import TournamentSerializer, InvitationTournamentSerializer
 from games.WebSocket_authentication import WebSocketTokenAuthentication, IsAuthenticatedWebSocket
 from users.serializers import UserProfileSearchSerializer
-from games.utils import validate_required_fields
+from users.presence import UserPresence
+from games.utils import validate_required_fields, service_error_response
+from games import services
 import logging
 from asgiref.sync import async_to_sync
 from games.blockchain_score_storage.deployment import deploy_smart_contract
@@ -160,8 +162,9 @@ class GetOnlineFriendsAPIView(APIView):
         ]
 
         # Filter online friends
+        online_ids = UserPresence.online_among([friend.id for friend in friends_not_in_tournament])
         online_friends = [
-            friend for friend in friends_not_in_tournament if friend.online_status
+            friend for friend in friends_not_in_tournament if str(friend.id) in online_ids
         ]
 
         if not online_friends:
@@ -418,41 +421,47 @@ class CreateMatchRoundAPIView(APIView):
         if validation_error:
             return validation_error
 
-        match_id = request.data.get("match_id")
-        tournament_id = request.data.get("tournament_id")
-        round_number = request.data.get("round_number")
-        
         try:
-            match_id = int(match_id)
-            tournament_id = int(tournament_id)
-            round_number = int(round_number)
-        except ValueError:
-            return Response({"detail": "Invalid ID format."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Check if players exist
-        match = get_object_or_404(Match, id=match_id)
-        tournament = get_object_or_404(Tournament, id=tournament_id)
-        # Create the match record
-        round_data = {
-            "match": match.id,
-            "tournament": tournament.id,
-            "round_number": round_number,
-        }
-
-        serializer = RoundSerializer(data=round_data)
-
-        if serializer.is_valid():
-            try:
-                round_match = serializer.save()
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-        
-            except IntegrityError as e:
-                logger.error(f"Database error during round match creation: {e}")
-                return Response({"detail": "Failed to create round match due to a database error."},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            round_data = services.create_round(request.data.get("match_id"), request.data.get("tournament_id"),
+                                               request.data.get("round_number"))
+            return Response(round_data, status=status.HTTP_201_CREATED)
+        except services.ServiceError as e:
+            return service_error_response(e)
+        except IntegrityError as e:
+            logger.error(f"Database error during round match creation: {e}")
+            return Response({"detail": "Failed to create round match due to a database error."},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class CreateRoundMatchesAPIView(APIView):
+    """
+    Creates all the matches of a tournament round at once.
+    Answers with one result per pair: the match data, or the reason the pair was rejected.
+    This View could be executed only by the WebSocket server.
+    """
+    authentication_classes = [WebSocketTokenAuthentication]
+    permission_classes = [IsAuthenticatedWebSocket]
+
+    def post(self, request):
+        validation_error = validate_required_fields(request.data, ["tournament_id", "round_number", "pairs"])
+        if validation_error:
+            return validation_error
+
+        pairs = request.data.get("pairs")
+        if not isinstance(pairs, list) or not all(isinstance(pair, list) for pair in pairs):
+            return Response({"detail": "pairs must be a list of [first_player_id, second_player_id]."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = services.create_round_matches(request.data.get("tournament_id"),
+                                                    request.data.get("round_number"), pairs)
+            return Response(results, status=status.HTTP_201_CREATED)
+        except services.ServiceError as e:
+            return service_error_response(e)
+        except IntegrityError as e:
+            logger.error(f"Database error during round matches creation: {e}")
+            return Response({"detail": "Failed to create round matches due to a database error."},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
 class TournamentUpdateStatusAPIView(APIView):
     """
     Update the status of a tournament.
@@ -465,25 +474,29 @@ class TournamentUpdateStatusAPIView(APIView):
         if validation_error:
             return validation_error
 
-        tournament_id = request.data.get("tournament_id")
-        tournament = get_object_or_404(Tournament, id=tournament_id)
-        tournament_status = request.data.get("status")
-
-        if tournament_status == 'completed':
-            winner_id = request.data.get("winner_id")
-            user = get_object_or_404(User, id=winner_id)
-            userStats = get_object_or_404(UserStats, user=user)
-            userStats.record_tournament_win()
-
-            participants = TournamentParticipant.objects.filter(tournament=tournament)
-            for participant in participants:
-                async_to_sync(RecoveryKeyManager.delete_tournament_recovery_key)(participant.user.id)
-
-        if tournament_status not in ['in_progress', 'completed']:
-            return Response({"error": "Invalid status. Must be 'in_progress' or 'completed'."},
-                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(services.update_tournament_status(request.data.get("tournament_id"),
+                                                              request.data.get("status"),
+                                                              request.data.get("winner_id")),
+                            status=status.HTTP_200_OK)
+        except services.ServiceError as e:
+            return service_error_response(e)
+
+class AbandonTournamentAPIView(APIView):
+    """
+    Closes a tournament whose game worker died, with its unfinished matches.
+    This View could be executed only by the WebSocket server.
+    """
+    authentication_classes = [WebSocketTokenAuthentication]
+    permission_classes = [IsAuthenticatedWebSocket]
 
-        tournament.status = tournament_status
-        tournament.save()
+    def post(self, request):
+        validation_error = validate_required_fields(request.data, ["tournament_id"])
+        if validation_error:
+            return validation_error
 
-        return Response({"message": "Tournament status updated successfully."}, status=status.HTTP_200_OK)
\ No newline at end of file
+        try:
+            return Response(services.abandon_tournament(request.data.get("tournament_id")),
+                            status=status.HTTP_200_OK)
+        except services.ServiceError as e:
+            return service_error_response(e)
\ No newline at end of file
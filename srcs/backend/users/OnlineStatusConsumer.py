@@ -3,6 +3,7 @@ import asyncio
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from .presence import UserPresence
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,6 +21,7 @@ class OnlineStatusConsumer(AsyncWebsocketConsumer):
             return
 
         await self.set_user_online()
+        UserPresence.start_flusher()
         self.ping_task = asyncio.create_task(self.ping_client())  # Start the ping-pong mechanism
         await self.accept()
 
@@ -39,6 +41,7 @@ class OnlineStatusConsumer(AsyncWebsocketConsumer):
             data = json.loads(text_data)
             if data.get("type") == "pong":
                 self.last_pong_received = True  # Mark that a pong was received
+                await UserPresence.heartbeat(self.user.id)
                 await self.update_last_activity()
         except json.JSONDecodeError:
             pass
@@ -78,21 +81,19 @@ class OnlineStatusConsumer(AsyncWebsocketConsumer):
             # Handle the case where the ping task is cancelled during disconnect
             logger.info("Ping loop cancelled for user: %s", self.user.username)
 
-    @database_sync_to_async
-    def set_user_online(self):
+    async def set_user_online(self):
         """
-        Set the user's online status to True.
+        Set the user's online status to True (in Redis, written to the database by the presence flusher).
         """
         if self.user and not isinstance(self.user, AnonymousUser):
-            self.user.set_online()
+            await UserPresence.set_online(self.user.id)
 
-    @database_sync_to_async
-    def set_user_offline(self):
+    async def set_user_offline(self):
         """
-        Set the user's online status to False.
+        Set the user's online status to False (in Redis, written to the database by the presence flusher).
         """
         if self.user and not isinstance(self.user, AnonymousUser):
-            self.user.set_offline()
+            await UserPresence.set_offline(self.user.id)
 
     @database_sync_to_async
     def update_last_activity(self):
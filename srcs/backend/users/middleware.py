@@ -4,6 +4,7 @@ from django.contrib.auth.models import AnonymousUser
 from channels.middleware import BaseMiddleware
 from django.http import JsonResponse
 from .models import User
+from .presence import UserPresence
 from channels.db import database_sync_to_async
 from .jwt_logic import decode_jwt
 import logging
@@ -70,7 +71,7 @@ class UpdateLastActivityMiddleware:
         """Checks the online status and updates the user's activity."""
         if request.path not in self.EXEMPT_PATHS:
             if request.user.is_authenticated:
-                if not getattr(request.user, 'online_status', False):
+                if not UserPresence.is_online(request.user.id):
                     return JsonResponse(
                         {"detail": "Network error. Please try again later."},
                         status=403
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='rating',
+            field=models.IntegerField(default=1000),
+        ),
+    ]
@@ -94,6 +94,9 @@ class User(AbstractUser):
         self.chat_id = None
         self.save()
 
+INITIAL_RATING = 1000
+RATING_K_FACTOR = 32 # maximum rating change after one match (Elo)
+
 class UserStats(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats')
     total_matches = models.IntegerField(default=0)
@@ -105,6 +108,7 @@ class UserStats(models.Model):
     last_match_date = models.DateField(null=True, blank=True)
     registered_at = models.DateField(auto_now_add=True)
     tournaments_won = models.IntegerField(default=0)
+    rating = models.IntegerField(default=INITIAL_RATING)
 
     class Meta:
         indexes = [
@@ -127,6 +131,14 @@ class UserStats(models.Model):
         self.last_match_date = timezone.now().date()
         self.save()
     
+    def update_rating(self, opponent_rating, is_win):
+        """
+        Elo rating update, saved by the following record_match.
+        :param opponent_rating: rating of the opponent before the match.
+        """
+        expected = 1 / (1 + 10 ** ((opponent_rating - self.rating) / 400))
+        self.rating = round(self.rating + RATING_K_FACTOR * ((1 if is_win else 0) - expected))
+
     def record_tournament_win(self):
         self.tournaments_won += 1
         self.save()
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from redis.asyncio import Redis
+from channels.db import database_sync_to_async
+from django.conf import settings
+from .models import User
+from .redis_manager import redis_client
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_KEY = "presence:online"  # sorted set: user id -> expiry time of the presence
+DIRTY_KEY = "presence:dirty"      # user ids whose presence changed since the last flush to the database
+FLUSH_LOCK_KEY = "presence:flush_lock"
+PRESENCE_TTL = 25           # seconds, covers two ping intervals of OnlineStatusConsumer
+FLUSH_INTERVAL = 5          # seconds between two writes of the presence to User.online_status
+FLUSH_BATCH_SIZE = 1000
+
+class UserPresence:
+    """
+    Online presence of the users, kept in Redis.
+    A user is online while its presence hasn't expired: it is set on connection of the status
+    WebSocket and renewed on every pong. Checks never hit the database.
+    User.online_status is only updated periodically (write-behind) by the flusher task.
+    """
+
+    _redis = None
+    _flusher = None
+
+    @classmethod
+    def get_redis(cls):
+        if not cls._redis:
+            cls._redis = Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=0,
+                decode_responses=True
+            )
+        return cls._redis
+
+    @classmethod
+    async def set_online(cls, user_id):
+        """
+        Marks the user online for PRESENCE_TTL seconds. Also used as heartbeat.
+        """
+        pipe = cls.get_redis().pipeline()
+        pipe.zadd(PRESENCE_KEY, {str(user_id): time.time() + PRESENCE_TTL})
+        pipe.sadd(DIRTY_KEY, str(user_id))
+        await pipe.execute()
+
+    @classmethod
+    async def heartbeat(cls, user_id):
+        await cls.get_redis().zadd(PRESENCE_KEY, {str(user_id): time.time() + PRESENCE_TTL}, xx=True)
+
+    @classmethod
+    async def set_offline(cls, user_id):
+        pipe = cls.get_redis().pipeline()
+        pipe.zrem(PRESENCE_KEY, str(user_id))
+        pipe.sadd(DIRTY_KEY, str(user_id))
+        await pipe.execute()
+
+    @classmethod
+    async def are_online(cls, user_ids):
+        """
+        Bulk presence check.
+        :param user_ids: ids of the users to check.
+        :return: set of the ids (as strings) of the users who are online.
+        """
+        user_ids = [str(user_id) for user_id in user_ids]
+        if not user_ids:
+            return set()
+        expiries = await cls.get_redis().zmscore(PRESENCE_KEY, user_ids)
+        now = time.time()
+        return {user_id for user_id, expiry in zip(user_ids, expiries) if expiry is not None and expiry > now}
+
+    @staticmethod
+    def is_online(user_id):
+        """
+        Synchronous presence check, for the HTTP middleware and views.
+        """
+        expiry = redis_client.zscore(PRESENCE_KEY, str(user_id))
+        return expiry is not None and expiry > time.time()
+
+    @staticmethod
+    def online_among(user_ids):
+        """
+        Synchronous bulk presence check.
+        :return: set of the ids (as strings) of the users who are online.
+        """
+        user_ids = [str(user_id) for user_id in user_ids]
+        if not user_ids:
+            return set()
+        expiries = redis_client.zmscore(PRESENCE_KEY, user_ids)
+        now = time.time()
+        return {user_id for user_id, expiry in zip(user_ids, expiries) if expiry is not None and expiry > now}
+
+    @classmethod
+    def start_flusher(cls):
+        """
+        Starts the write-behind task of this process, if not done yet.
+        Every process runs one, a Redis lock makes sure only one of them flushes per interval.
+        """
+        if cls._flusher is None or cls._flusher.done():
+            cls._flusher = asyncio.create_task(cls._run_flusher())
+
+    @classmethod
+    async def _run_flusher(cls):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                if await cls.get_redis().set(FLUSH_LOCK_KEY, 1, nx=True, ex=FLUSH_INTERVAL):
+                    await cls.flush()
+            except Exception as e:
+                logger.error(f"Error flushing user presence: {e}")
+
+    @classmethod
+    async def flush(cls):
+        """
+        Writes the presence changes (and the expired presences) to User.online_status.
+        """
+        redis = cls.get_redis()
+        now = time.time()
+        pipe = redis.pipeline()
+        pipe.zrangebyscore(PRESENCE_KEY, "-inf", now)
+        pipe.zremrangebyscore(PRESENCE_KEY, "-inf", now)
+        expired, _ = await pipe.execute()
+
+        changed = set(expired)
+        while True:
+            batch = await redis.spop(DIRTY_KEY, FLUSH_BATCH_SIZE)
+            if not batch:
+                break
+            changed.update(batch)
+        if not changed:
+            return
+
+        online = await cls.are_online(changed)
+        await cls.write_statuses(online, changed - online)
+
+    @staticmethod
+    @database_sync_to_async
+    def write_statuses(online, offline):
+        if online:
+            User.objects.filter(id__in=online, online_status=False).update(online_status=True)
+        if offline:
+            User.objects.filter(id__in=offline, online_status=True).update(online_status=False)
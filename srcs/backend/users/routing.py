@@ -2,10 +2,14 @@ from django.urls import re_path
 from .OnlineStatusConsumer import OnlineStatusConsumer
 from games.game_logic.MatchmakingConsumer import MatchmakingConsumer
 from games.game_logic.TournamentConsumer import TournamentConsumer
+from games.game_logic.ReplayConsumer import ReplayConsumer
+from games.game_logic.SpectatorConsumer import SpectatorConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/status/$", OnlineStatusConsumer.as_asgi()),
     re_path(r"ws/matchmaking/$", MatchmakingConsumer.as_asgi()),
     re_path(r"ws/tournament/(?P<tournament_id>\d+)/$", TournamentConsumer.as_asgi()),
+    re_path(r"ws/replay/(?P<match_id>\d+)/$", ReplayConsumer.as_asgi()),
+    re_path(r"ws/spectate/(?P<match_id>\d+)/$", SpectatorConsumer.as_asgi()),
 ]
 
@@ -109,7 +109,7 @@ class UserStatsSerializer(serializers.ModelSerializer):
         model = UserStats
         fields = ['user', 'total_matches', 'total_wins', 'total_points_scored', 
                   'total_points_against', 'current_win_streak', 'longest_win_streak',
-                  'last_match_date', 'registered_at', 'tournaments_won']
+                  'last_match_date', 'registered_at', 'tournaments_won', 'rating']
 
 class UserShortSerializer(serializers.ModelSerializer):
     class Meta:
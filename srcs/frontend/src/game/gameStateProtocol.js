@@ -0,0 +1,45 @@
+// Decoder of the binary game_state frames sent by the server (see games/game_logic/game_state_protocol.py)
+// Frames are requested at connect time with the "format=binary" query parameter.
+
+export const WIRE_FORMAT_QUERY = 'format=binary';
+
+const FRAME_FULL_STATE = 1;
+const FRAME_BALL_STATE = 2;
+const FLAG_KICK_OFF = 1;
+
+export function decodeGameState(buffer)
+{
+    const view = new DataView(buffer);
+    const frameType = view.getUint8(0);
+
+    if (frameType !== FRAME_FULL_STATE && frameType !== FRAME_BALL_STATE)
+        return null;
+
+    const message = {
+        event: "game_state",
+        tick: view.getUint32(1, true),
+        timestamp: view.getFloat64(5, true),
+        ball: {
+            position: [view.getFloat32(13, true), view.getFloat32(17, true)],
+            kick_off: (view.getUint8(21) & FLAG_KICK_OFF) !== 0
+        }
+    };
+
+    if (frameType === FRAME_FULL_STATE)
+    {
+        message.player1 = {
+            id: view.getUint32(34, true),
+            position: view.getFloat32(22, true),
+            score: view.getUint16(30, true),
+            last_input_seq: view.getUint32(42, true)
+        };
+        message.player2 = {
+            id: view.getUint32(38, true),
+            position: view.getFloat32(26, true),
+            score: view.getUint16(32, true),
+            last_input_seq: view.getUint32(46, true)
+        };
+    }
+
+    return message;
+}
@@ -7,6 +7,7 @@ import { Paddle } from './paddle.js';
 import { Score } from './score.js';
 import { Countdown } from './Countdown.js'; 
 import showToast from "../utils/toast.js";
+import { decodeGameState } from './gameStateProtocol.js';
 
 export const FIELD_DIMENSION_Z = 6;
 
@@ -18,6 +19,8 @@ const MIN_RENDERED_DISTANCE = 0.1;
 const MAX_RENDERED_DISTANCE = 1000;
 const FPS = 60;
 const INTERVAL = 1000 / FPS;
+const INTERPOLATION_DELAY = 100; // ms behind the latest snapshot, covers the gap between two server snapshots
+const MAX_BUFFERED_SNAPSHOTS = 32;
 
 const STADIUM_MODEL_PATH = './src/assets/3d-models/game/scene.glb';
 const STADIUM_SCALE = 0.5;
@@ -41,6 +44,8 @@ const BALL_VELOCITY_MULTIPLIER = 1.3;
 
 const PADDLE_COLOR = 0xffffff;
 const PADDLE_SPEED = 0.12;
+const PADDLE_SPEED_PER_SECOND = PADDLE_SPEED * 60; // same as the server while a direction is held
+const FIELD_DIMENSION_HALF_Z = FIELD_DIMENSION_Z / 2;
 export const PADDLE_DIMENSION_X = 0.2;
 export const PADDLE_DIMENSION_Y = 0.2;
 export const PADDLE_DIMENSION_Z = 1;
@@ -76,9 +81,15 @@ export class Game {
     #playerId;
     #withCountdown;
     #interpolationTargets;
+    #snapshots;
+    #serverTimeOffset;
     #keyPressed;
     #keyDownHandler;
     #keyUpHandler;
+    #heldDirection;
+    #inputSeq;
+    #ownPaddle;
+    #predictedPosZ;
 
     constructor(socket, playerId, withCountdown = true) {
         this.#socket = socket;
@@ -86,7 +97,18 @@ export class Game {
         this.#withCountdown = withCountdown;
         this.#matchOver = false;
         this.#interpolationTargets = { ball: null, paddleLeft: null, paddleRight: null };
-        this.#socket.onmessage = (event) => this.handleServerMessage(JSON.parse(event.data));
+        this.#snapshots = [];
+        this.#serverTimeOffset = null;
+        this.#heldDirection = "none";
+        this.#inputSeq = 0;
+        this.#ownPaddle = null;
+        this.#predictedPosZ = null;
+        this.#socket.binaryType = 'arraybuffer';
+        this.#socket.onmessage = (event) => {
+            const message = event.data instanceof ArrayBuffer ? decodeGameState(event.data) : JSON.parse(event.data);
+            if (message)
+                this.handleServerMessage(message);
+        };
         this.initScene();
 
         this.#paddleLeft = new Paddle({
@@ -185,31 +207,67 @@ export class Game {
         });
     }
 
-    refreshPaddlePos(bindUp, bindDown)
+    refreshPaddlePos(bindUp, bindDown, deltaTime)
     {
-        const now = performance.now();
-    
-        if (this.lastActionSentTime === undefined || now - this.lastActionSentTime >= 5)
+        let direction = "none";
+        if (this.#keyPressed.has(bindUp))
+            direction = "up";
+        else if (this.#keyPressed.has(bindDown))
+            direction = "down";
+
+        // The server keeps moving the paddle while a direction is held: only changes are sent
+        if (direction !== this.#heldDirection)
         {
-            if (this.#keyPressed.has(bindUp))
-            {
-                this.sendPlayerAction("up");
-            }
-            else if (this.#keyPressed.has(bindDown))
-            {
-                this.sendPlayerAction("down");
-            }
-            this.lastActionSentTime = now;
+            this.#heldDirection = direction;
+            this.sendPlayerAction(direction);
         }
+
+        this.predictPaddle(deltaTime);
     }
 
     sendPlayerAction(direction)
     {
+        this.#inputSeq++;
         this.#socket.send(JSON.stringify({
             event: "player_action",
-            direction: direction
+            direction: direction,
+            seq: this.#inputSeq
         }));
     }
+
+    predictPaddle(deltaTime)
+    {
+        // Moves our own paddle locally with the same rules as the server, without waiting for the snapshots
+        if (this.#predictedPosZ === null || this.#heldDirection === "none")
+            return;
+
+        const distance = PADDLE_SPEED_PER_SECOND * deltaTime / 1000;
+        if (this.#heldDirection === "up" && this.#predictedPosZ + PADDLE_DIMENSION_Z / 2 < FIELD_DIMENSION_HALF_Z)
+            this.#predictedPosZ += distance;
+        else if (this.#heldDirection === "down" && this.#predictedPosZ - PADDLE_DIMENSION_Z / 2 > -FIELD_DIMENSION_HALF_Z)
+            this.#predictedPosZ -= distance;
+        this.#ownPaddle.setPosZ(this.#predictedPosZ);
+    }
+
+    reconcilePaddle(player, paddle)
+    {
+        // Our own paddle is predicted once the server told which side is ours
+        if (this.#ownPaddle === null && player.id !== undefined && String(player.id) === String(this.#playerId))
+        {
+            this.#ownPaddle = paddle;
+            this.#predictedPosZ = player.position;
+        }
+        if (paddle !== this.#ownPaddle)
+            return false;
+
+        // Once every input has been processed by the server and the paddle is at rest, the server position is exact
+        if (player.last_input_seq >= this.#inputSeq && this.#heldDirection === "none")
+        {
+            this.#predictedPosZ = player.position;
+            paddle.setPosZ(player.position);
+        }
+        return true;
+    }
     
     handleServerMessage(message)
     {
@@ -219,28 +277,36 @@ export class Game {
     
             if (player1 && player1.position !== undefined)
             {
-                this.#interpolationTargets.paddleLeft = player1.position;
-                if (this.#paddleLeft.getPosZ() !== player1.position)
-                    this.#paddleLeft.setPosZ(player1.position);
+                if (!this.reconcilePaddle(player1, this.#paddleLeft))
+                {
+                    this.#interpolationTargets.paddleLeft = player1.position;
+                    if (this.#paddleLeft.getPosZ() !== player1.position)
+                        this.#paddleLeft.setPosZ(player1.position);
+                }
                 if (this.#score.getScoreLeft() !== player1.score)
                     this.#score.scoreLeft();
             }
 
             if (player2 && player2.position !== undefined)
             {
-                this.#interpolationTargets.paddleRight = player2.position;
-                if (this.#paddleRight.getPosZ() !== player2.position)
-                    this.#paddleRight.setPosZ(player2.position);
+                if (!this.reconcilePaddle(player2, this.#paddleRight))
+                {
+                    this.#interpolationTargets.paddleRight = player2.position;
+                    if (this.#paddleRight.getPosZ() !== player2.position)
+                        this.#paddleRight.setPosZ(player2.position);
+                }
                 if (this.#score.getScoreRight() !== player2.score)
                     this.#score.scoreRight();
             }
     
-            if (ball && ball.position && ball.direction)
+            if (ball && ball.position)
             {
                 this.#interpolationTargets.ball = {
                     position: ball.position,
                     direction: ball.direction
                 };
+                if (message.timestamp !== undefined)
+                    this.bufferSnapshot(message.timestamp, ball);
             }
         }
         else if (message.event === "match_over")
@@ -259,12 +325,54 @@ export class Game {
         }
     }
 
+    bufferSnapshot(timestamp, ball)
+    {
+        // Smallest observed offset between server and local clocks, so network jitter doesn't move the render time
+        const offset = timestamp - performance.now();
+        if (this.#serverTimeOffset === null || offset < this.#serverTimeOffset)
+            this.#serverTimeOffset = offset;
+
+        // A ball in kick-off has been reset after a goal: don't interpolate across the field
+        if (ball.kick_off)
+            this.#snapshots = [];
+        this.#snapshots.push({ time: timestamp, position: ball.position });
+        if (this.#snapshots.length > MAX_BUFFERED_SNAPSHOTS)
+            this.#snapshots.shift();
+    }
+
+    interpolateBall()
+    {
+        // Render the ball slightly in the past, between the two snapshots surrounding that time
+        const renderTime = performance.now() + this.#serverTimeOffset - INTERPOLATION_DELAY;
+        const snapshots = this.#snapshots;
+
+        while (snapshots.length > 2 && snapshots[1].time <= renderTime)
+            snapshots.shift();
+
+        const [from, to] = snapshots;
+        if (!to || renderTime <= from.time)
+            return from.position;
+        if (renderTime >= to.time)
+            return to.position;
+
+        const t = (renderTime - from.time) / (to.time - from.time);
+        return [
+            from.position[0] + (to.position[0] - from.position[0]) * t,
+            from.position[1] + (to.position[1] - from.position[1]) * t
+        ];
+    }
+
     updateInterpolation(deltaTime) {
         const lerp = (start, end, t) => start + (end - start) * t;
 
         const t = Math.min(deltaTime / INTERVAL, 1);
 
-        if (this.#interpolationTargets.ball)
+        if (this.#snapshots.length > 0)
+        {
+            const position = this.interpolateBall();
+            this.#ball.setPosition(position[0], position[1]);
+        }
+        else if (this.#interpolationTargets.ball)
         {
             const target = this.#interpolationTargets.ball.position;
 
@@ -305,7 +413,7 @@ export class Game {
             while (accumulator >= INTERVAL)
             {
                 this.updateInterpolation(accumulator);
-                this.refreshPaddlePos(BIND_UP, BIND_DOWN);
+                this.refreshPaddlePos(BIND_UP, BIND_DOWN, INTERVAL);
                 accumulator -= INTERVAL;
             }
     
@@ -1,12 +1,13 @@
 import { renderErrorPage, renderMatch, renderSearchingPage } from './renderPages.js';
 import renderGame from '../pages/game.js';
 import showToast from '../utils/toast.js';
+import { WIRE_FORMAT_QUERY } from '../game/gameStateProtocol.js';
 
 export async function findMatch()
 {
     let playerId = null;
 
-    const   wsUrl = `wss://transcendence-pong:7443/ws/matchmaking/?token=${encodeURIComponent(localStorage.getItem('access_token'))}`;
+    const   wsUrl = `wss://transcendence-pong:7443/ws/matchmaking/?token=${encodeURIComponent(localStorage.getItem('access_token'))}&${WIRE_FORMAT_QUERY}`;
     let     socket;
 
     try
@@ -1,5 +1,6 @@
 import { fetchWithAuth } from '../utils/fetchWithAuth.js';
 import { renderErrorPage, renderMatch, handleMatchOver } from './renderPages.js';
+import { WIRE_FORMAT_QUERY } from '../game/gameStateProtocol.js';
 
 export async function checkActiveMatch()
 {
@@ -53,7 +54,7 @@ export async function checkActiveTournament()
 
 export async function connectToWebSocket(matchGroup)
 {
-    const wsUrl = `wss://transcendence-pong:7443/ws/matchmaking/?token=${encodeURIComponent(localStorage.getItem('access_token'))}`;
+    const wsUrl = `wss://transcendence-pong:7443/ws/matchmaking/?token=${encodeURIComponent(localStorage.getItem('access_token'))}&${WIRE_FORMAT_QUERY}`;
     const socket = new WebSocket(wsUrl);
 
     socket.onopen = () => {
@@ -12,6 +12,9 @@ export default async function renderTournamentBracketPage(socket, tournamentId,
     fillBracketInfos(data["bracket"]);
 
     socket.addEventListener("message", (event) => {
+        // Binary frames are game states, handled by the game
+        if (typeof event.data !== "string")
+            return;
         const data = JSON.parse(event.data);
         switch (data.event) {
             case "match_update":
@@ -3,10 +3,11 @@ import showToast from "../utils/toast.js";
 import renderHeader from '../components/header.js';
 import renderTournaments from '../pages/tournaments/tournaments.js';
 import renderTournamentBracketPage from "./pages/bracket.js";
+import { WIRE_FORMAT_QUERY } from '../game/gameStateProtocol.js';
 
 export async function tournamentHandler(WebSocketUrl, tournamentId)
 {
-    const url = WebSocketUrl + `?token=${encodeURIComponent(localStorage.getItem('access_token'))}`;
+    const url = WebSocketUrl + `?token=${encodeURIComponent(localStorage.getItem('access_token'))}&${WIRE_FORMAT_QUERY}`;
 
     let socket, title, description, isAdmin;
     let tournamentDataPromise = new Promise((resolve) => {